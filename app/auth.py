@@ -1,107 +1,379 @@
+import argparse
+import csv
+import datetime
 import hashlib
+import hmac
 import os
 import base64
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert, select
 from sqlalchemy.exc import IntegrityError
 
-from app.database import User, get_session
+from app.budget import default_category_rows
+from app.database import Category, DataVersion, User, session_scope
+from app.encryption import DEFAULT_KEY, repeat_key, xor_bytes
+from app.instrumentation import track_queries
+from app.writer import submit_write
 
 # simple key for encryption, ниче путного не придумал
-ENCRYPTION_KEY = b'ThisIsA16ByteKey'
+ENCRYPTION_KEY = DEFAULT_KEY
+
+
+# How new password hashes are made. cost is the PBKDF2 iteration count, or scrypt's N
+# (with r=8, p=1); `python -m app.auth --calibrate` picks one for this machine. Every
+# hash stores its own algorithm, salt and cost, so changing these only affects new
+# hashes, and older ones are upgraded at the next login.
+PASSWORD_KDF = os.environ.get('BUDGET_PASSWORD_KDF', 'pbkdf2_sha256')
+DEFAULT_COSTS = {'pbkdf2_sha256': 600000, 'scrypt': 2 ** 15}
+PASSWORD_COST = int(os.environ.get('BUDGET_PASSWORD_COST', 0)) or DEFAULT_COSTS.get(PASSWORD_KDF)
+
+SALT_SIZE = 16
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# what the calibration aims for by default
+TARGET_HASH_MS = 250
 
 
 def encrypt_password(password):
-    # encrypting a password using a simple hash
+    # The old unsalted SHA-256, only used to check (and then upgrade) legacy records
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+def _derive(password, algorithm, cost, salt):
+    if algorithm == 'pbkdf2_sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, cost)
+    if algorithm == 'scrypt':
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=cost, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * SCRYPT_R * cost)
+    raise ValueError(f"Unknown password hashing algorithm: {algorithm}")
+
+
+def hash_password(password, algorithm=None, cost=None):
+    """Salted hash of password as stored in users.password: algorithm$cost$salt$hash."""
+    algorithm = algorithm or PASSWORD_KDF
+    cost = cost or PASSWORD_COST
+    salt = os.urandom(SALT_SIZE)
+    digest = _derive(password, algorithm, cost, salt)
+    return "$".join([algorithm, str(cost), base64.b64encode(salt).decode('ascii'),
+                     base64.b64encode(digest).decode('ascii')])
+
+
+def verify_password(password, stored):
+    """
+    (matches, needs_rehash) for password against a stored hash. needs_rehash is True
+    when the hash is a legacy SHA-256 one or weaker than the current settings.
+    """
+    if '$' not in stored:
+        # legacy: hex SHA-256, no salt
+        return hmac.compare_digest(encrypt_password(password), stored), True
+
+    algorithm, cost, salt, digest = stored.split('$')
+    cost = int(cost)
+    matches = hmac.compare_digest(_derive(password, algorithm, cost, base64.b64decode(salt)),
+                                  base64.b64decode(digest))
+    return matches, algorithm != PASSWORD_KDF or cost < PASSWORD_COST
+
+
+# checked when the username doesn't exist, so a wrong username takes as long as a wrong password
+_dummy_hash = None
+
+
+def _check_unknown_user(password):
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password("not a password")
+    verify_password(password, _dummy_hash)
+
+
 def encrypt_data(data):
     # simple XOR-based method, NOT real secure, but works without dependencies
+    # (stored fields use app.encryption, this is kept for its output format)
     if not isinstance(data, str):
         data = str(data)
 
-    # Convert data to bytes
+    # XOR with the key (cycled), the whole buffer at once
     data_bytes = data.encode('utf-8')
-
-    # Simple XOR with the key (cycled)
-    key_len = len(ENCRYPTION_KEY)
-    encrypted = bytearray()
-
-    for i, byte in enumerate(data_bytes):
-        key_byte = ENCRYPTION_KEY[i % key_len]
-        encrypted.append(byte ^ key_byte)
+    encrypted = xor_bytes(data_bytes, repeat_key(ENCRYPTION_KEY, len(data_bytes)))
 
     # encode as base64 for safe storage
     return base64.b64encode(encrypted)
 
 
 def decrypt_data(encrypted_data):
-    # Decode base64
     encrypted = base64.b64decode(encrypted_data)
-
-    key_len = len(ENCRYPTION_KEY)
-    decrypted = bytearray()
-
-    for i, byte in enumerate(encrypted):
-        key_byte = ENCRYPTION_KEY[i % key_len]
-        decrypted.append(byte ^ key_byte)
-
-    # Convert back to string
-    return decrypted.decode('utf-8')
+    return xor_bytes(encrypted, repeat_key(ENCRYPTION_KEY, len(encrypted))).decode('utf-8')
 
 
+@track_queries
 def register_user(username, password):
-    session = get_session()
-
     try:
-        # Check if exists
-        existing_user = session.query(User).filter_by(username=username).first()
-        if existing_user:
-            session.close()
-            return False, "Username already exists"
-
-        # Encrypt password
-        encrypted_password = encrypt_password(password)
+        # Hash the password (before queueing, the writer thread shouldn't spend time hashing)
+        encrypted_password = hash_password(password)
 
-        # Create new user
-        new_user = User(username=username, password=encrypted_password)
-        session.add(new_user)
-        session.commit()
-
-        # default categories for the new user
-        from app.budget import create_default_categories
-        create_default_categories(new_user.id)
+        # the user and its default categories commit together, or not at all
+        created = submit_write(_create_users, [(username, encrypted_password)]).result()
+        if not created:
+            return False, "Username already exists"
 
-        session.close()
         return True, "User registered successfully"
 
     except IntegrityError:
-        session.rollback()
-        session.close()
         return False, "An error occurred during registration"
     except Exception as e:
-        session.rollback()
-        session.close()
         return False, f"An unexpected error occurred: {str(e)}"
 
 
-def login_user(username, password):
-    session = get_session()
+def _create_users(session, accounts):
+    """
+    Write job: insert users from (username, password_hash) pairs with their default
+    categories, a fixed number of statements however many there are. Usernames that
+    are taken are skipped. Returns {username: id} of the users created.
+    """
+    usernames = [username for username, _ in accounts]
+    taken = set(session.scalars(select(User.username).where(User.username.in_(usernames))))
+    accounts = [(username, password) for username, password in accounts if username not in taken]
+    if not accounts:
+        return {}
+
+    now = datetime.datetime.utcnow()
+    rows = session.execute(insert(User).returning(User.id, User.username),
+                           [{'username': username, 'password': password, 'created_at': now}
+                            for username, password in accounts])
+    created = {username: user_id for user_id, username in rows}
+
+    categories = []
+    for user_id in created.values():
+        categories.extend(default_category_rows(user_id))
+    session.execute(insert(Category), categories)
+    # what bump_data_version would leave for a new user
+    session.execute(insert(DataVersion), [{'user_id': user_id, 'version': 1} for user_id in created.values()])
+
+    return created
+
+
+PROVISION_BATCH_SIZE = 500
+
+
+@track_queries
+def provision_users(accounts, batch_size=PROVISION_BATCH_SIZE, cost=None, workers=None, progress=None):
+    """
+    Create many users with their default categories.
+
+    accounts is any iterable of (username, password) pairs. Passwords are hashed on a
+    thread pool (the KDF releases the GIL, so this uses every core) while the writer
+    thread inserts the previous batch, batch_size users per transaction. cost overrides
+    PASSWORD_COST, e.g. a cheap one for test environments; such hashes are upgraded at
+    the user's first login. Returns (created_count, errors) where errors is a list of
+    (index, message) for names that were empty, repeated or already taken; nothing is
+    printed. progress, if given, is called as progress(accounts_done, created_count).
+    """
+    created = 0
+    done = 0
+    errors = []
+    seen = set()
+    batch = []
+    pending = None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1, thread_name_prefix="budget-kdf") as pool:
+        def flush(batch):
+            nonlocal created, done, pending
+            hashes = pool.map(lambda account: hash_password(account[2], cost=cost), batch)
+            accounts = [(username, password_hash) for (_, username, _), password_hash in zip(batch, hashes)]
+            # hashing this batch overlapped with inserting the last one
+            created += _wait_for_users(pending, errors)
+            pending = (submit_write(_create_users, accounts), batch)
+            done += len(batch)
+            if progress:
+                progress(done, created)
 
+        for index, (username, password) in enumerate(accounts):
+            username = (username or "").strip()
+            if not username or not password:
+                errors.append((index, "Username and password are required"))
+                continue
+            if username in seen:
+                errors.append((index, "Username repeated"))
+                continue
+            seen.add(username)
+
+            batch.append((index, username, password))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+
+        if batch:
+            flush(batch)
+        created += _wait_for_users(pending, errors)
+
+    if progress:
+        progress(done, created)
+
+    return created, errors
+
+
+def _wait_for_users(pending, errors):
+    # Users created by a batch from provision_users, the rest of the batch goes to errors
+    if pending is None:
+        return 0
+
+    future, batch = pending
     try:
-        # Encrypt password
-        encrypted_password = encrypt_password(password)
+        created = future.result()
+    except Exception as e:
+        errors.extend((index, f"An error occurred: {str(e)}") for index, _, _ in batch)
+        return 0
 
-        # Find user
-        user = session.query(User).filter_by(username=username, password=encrypted_password).first()
+    errors.extend((index, "Username already exists") for index, username, _ in batch if username not in created)
+    return len(created)
 
-        if user:
-            result = (True, user)
-        else:
-            result = (False, "Invalid username or password")
 
-        session.close()
-        return result
+@track_queries
+def login_user(username, password):
+    """
+    (True, user) or (False, message). The password hash is slow on purpose (a few
+    hundred ms), so call this off the Tk thread. Legacy or weaker hashes are replaced
+    with one made with the current settings once the password is known to be right.
+    """
+    try:
+        with session_scope() as session:
+            # Find user
+            user = session.query(User).filter_by(username=username).first()
+
+        # no connection held while hashing
+        if user is None:
+            _check_unknown_user(password)
+            return False, "Invalid username or password"
+
+        matches, needs_rehash = verify_password(password, user.password)
+        if not matches:
+            return False, "Invalid username or password"
+
+        if needs_rehash:
+            new_hash = hash_password(password)
+            if submit_write(_update_password, user.id, user.password, new_hash).result():
+                user.password = new_hash
+
+        return True, user
 
     except Exception as e:
-        session.close()
-        return False, f"An error occurred during login: {str(e)}"
\ No newline at end of file
+        return False, f"An error occurred during login: {str(e)}"
+
+
+def _update_password(session, user_id, old_hash, new_hash):
+    # Write job: replace old_hash, unless the password changed in the meantime
+    updated = session.query(User).filter_by(id=user_id, password=old_hash).update({'password': new_hash})
+    return updated == 1
+
+
+def calibrate(algorithm=None, target_ms=TARGET_HASH_MS, samples=3):
+    """
+    The highest cost whose hash takes at most target_ms on this machine (median of
+    samples runs), with the time it takes. scrypt costs are powers of two.
+    """
+    algorithm = algorithm or PASSWORD_KDF
+    salt = os.urandom(SALT_SIZE)
+
+    def measure(cost):
+        times = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            _derive("calibration", algorithm, cost, salt)
+            times.append((time.perf_counter() - started) * 1000)
+        return statistics.median(times)
+
+    if algorithm == 'scrypt':
+        # time roughly doubles with N
+        cost, elapsed = 2 ** 10, measure(2 ** 10)
+        while True:
+            next_elapsed = measure(cost * 2)
+            if next_elapsed > target_ms:
+                return cost, elapsed
+            cost, elapsed = cost * 2, next_elapsed
+
+    # PBKDF2 time is linear in the iterations: extrapolate from a short run, then check
+    cost = max(1000, int(10000 * target_ms / measure(10000)))
+    elapsed = measure(cost)
+    while elapsed > target_ms and cost > 1000:
+        cost = int(cost * target_ms / elapsed * 0.95)
+        elapsed = measure(cost)
+    # round down to a readable number
+    cost = max(1000, cost // 1000 * 1000)
+    return cost, measure(cost)
+
+
+def _read_accounts(path):
+    # (username, password) rows of a CSV file without a header, "-" for stdin
+    f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        for row in csv.reader(f):
+            if row:
+                yield row[0], row[1] if len(row) > 1 else ""
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing settings and bulk user provisioning")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--calibrate', action='store_true',
+                        help="find the hashing cost for a target time on this machine")
+    action.add_argument('--provision', metavar='CSV',
+                        help="create the users in a username,password CSV file (- for stdin)")
+    action.add_argument('--generate', type=int, metavar='COUNT',
+                        help="create COUNT users <prefix>00001.. sharing --password, e.g. for test environments")
+    parser.add_argument('--algorithm', choices=['pbkdf2_sha256', 'scrypt'], default=PASSWORD_KDF)
+    parser.add_argument('--target-ms', type=float, default=TARGET_HASH_MS,
+                        help=f"time one login may spend hashing (default: {TARGET_HASH_MS})")
+    parser.add_argument('--prefix', default="user", help="username prefix for --generate")
+    parser.add_argument('--password', help="password for --generate")
+    parser.add_argument('--cost', type=int, help="hashing cost for the new users (default: the current setting)")
+    parser.add_argument('--batch-size', type=int, default=PROVISION_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, help="hashing threads (default: all cores)")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        cost, elapsed = calibrate(args.algorithm, args.target_ms)
+        print(f"{args.algorithm}: cost {cost} takes {elapsed:.0f} ms here (target {args.target_ms:.0f} ms)")
+        print(f"Current setting: {PASSWORD_KDF} with cost {PASSWORD_COST}")
+        print("To use it, set before starting the app:")
+        print(f"  BUDGET_PASSWORD_KDF={args.algorithm}")
+        print(f"  BUDGET_PASSWORD_COST={cost}")
+        print("Existing passwords are rehashed with it at their next login.")
+        return 0
+
+    if args.generate is not None:
+        if not args.password:
+            parser.error("--generate needs --password")
+        width = max(5, len(str(args.generate)))
+        accounts = ((f"{args.prefix}{i:0{width}d}", args.password) for i in range(1, args.generate + 1))
+    else:
+        accounts = _read_accounts(args.provision)
+
+    def show_progress(done, created):
+        sys.stderr.write(f"\r{done:,} accounts, {created:,} users created")
+        sys.stderr.flush()
+
+    from app.database import dispose_engine
+
+    started = time.perf_counter()
+    created, errors = provision_users(accounts, args.batch_size, args.cost, args.workers, progress=show_progress)
+    elapsed = time.perf_counter() - started
+    sys.stderr.write("\n")
+    dispose_engine()
+
+    for index, message in errors[:20]:
+        print(f"Account {index + 1}: {message}")
+    if len(errors) > 20:
+        print(f"... and {len(errors) - 20} more")
+    print(f"Provisioning: {created} users created, {len(errors)} skipped in {elapsed:.1f}s "
+          f"({created / elapsed if elapsed else 0:.1f} users/s)")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
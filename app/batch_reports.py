@@ -0,0 +1,186 @@
+"""
+Generate monthly and yearly PDF reports for every user at once, without the GUI.
+
+Reports are spread over a pool of worker processes, each with its own database
+engine (a single pooled connection), so all cores are used. Every report is written
+to a temporary file and renamed when complete: an interrupted run picks up where it
+stopped when started again, already finished PDFs are skipped unless --force is given.
+
+    python -m app.batch_reports --year 2025 [--month 12] [--kind monthly|yearly|all]
+                                [--user NAME ...] [--output DIR] [--workers N] [--force]
+
+Only periods with transactions are generated (read from the monthly rollups).
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+from multiprocessing import Pool
+
+from sqlalchemy import select
+
+from app import database
+from app.database import MonthlyRollup, User
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'reports')
+
+# One PDF to produce; month is None for a yearly report
+ReportJob = namedtuple('ReportJob', ['user_id', 'username', 'year', 'month', 'path'])
+JobResult = namedtuple('JobResult', ['job', 'success', 'seconds', 'worker'])
+
+
+def report_path(output_dir, user_id, username, year, month=None):
+    # reports/<id>-<username>/2025-03.pdf, reports/<id>-<username>/2025.pdf
+    folder = f"{user_id}-" + re.sub(r'[^\w.-]', '_', username)
+    name = f"{year}-{month:02d}.pdf" if month else f"{year}.pdf"
+    return os.path.join(output_dir, folder, name)
+
+
+def plan_jobs(year, months=None, kind='all', usernames=None, output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Every report to produce for the year: one per user and month with transactions
+    (months limits which), and one yearly report per user with any. Yearly reports
+    come first, they take longest.
+    """
+    query = (select(User.id, User.username, MonthlyRollup.month)
+             .join(MonthlyRollup, MonthlyRollup.user_id == User.id)
+             .where(MonthlyRollup.year == year, MonthlyRollup.count > 0)
+             .distinct()
+             .order_by(User.id, MonthlyRollup.month))
+    if usernames:
+        query = query.where(User.username.in_(usernames))
+
+    with database.get_engine().connect() as conn:
+        periods = conn.execute(query).all()
+
+    yearly = []
+    monthly = []
+    for user_id, username, month in periods:
+        if kind in ('all', 'yearly') and not (yearly and yearly[-1].user_id == user_id):
+            yearly.append(ReportJob(user_id, username, year, None,
+                                    report_path(output_dir, user_id, username, year)))
+        if kind in ('all', 'monthly') and (not months or month in months):
+            monthly.append(ReportJob(user_id, username, year, month,
+                                     report_path(output_dir, user_id, username, year, month)))
+
+    return yearly + monthly
+
+
+def _init_worker(options):
+    # Runs once in each worker: a fresh engine of its own, never a connection inherited from the parent
+    database.configure(**dict(options, pool_size=1, max_overflow=0))
+    database.get_engine()
+    import app.charts  # noqa: F401  (matplotlib import paid up front, not by the first report)
+
+
+def run_job(job):
+    from app.reports import BudgetReport
+
+    started = time.perf_counter()
+    report = BudgetReport(job.user_id)
+    partial = job.path + '.part'
+    try:
+        if job.month:
+            report_data = report.generate_monthly_report(job.year, job.month)
+        else:
+            report_data = report.generate_yearly_report(job.year)
+
+        # a half-written PDF never has the final name, so a rerun knows to redo it
+        os.makedirs(os.path.dirname(job.path), exist_ok=True)
+        success = report.export_to_pdf(report_data, partial)
+        if success:
+            os.replace(partial, job.path)
+    except Exception as e:
+        # one bad report shouldn't stop the batch
+        print(f"Error generating {job.path}: {str(e)}")
+        success = False
+
+    if not success and os.path.exists(partial):
+        os.remove(partial)
+
+    return JobResult(job, success, time.perf_counter() - started, os.getpid())
+
+
+def run_batch(jobs, workers=None, force=False, progress=None):
+    """
+    Produce the jobs' PDFs in a process pool. Returns (results, skipped); existing
+    PDFs are skipped unless force. progress, if given, is called as
+    progress(done, total, elapsed_seconds) after each report.
+    """
+    skipped = 0 if force else sum(1 for job in jobs if os.path.exists(job.path))
+    if not force:
+        jobs = [job for job in jobs if not os.path.exists(job.path)]
+
+    results = []
+    if not jobs:
+        return results, skipped
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    # same database and PRAGMAs as this process
+    options = dict(database.ENGINE_OPTIONS)
+    options['db_url'] = options['db_url'] or f"sqlite:///{database.DEFAULT_DB_PATH}"
+
+    # close this process's connections so no worker starts with a copy of them
+    database.dispose_engine()
+
+    started = time.perf_counter()
+    with Pool(workers, initializer=_init_worker, initargs=(options,)) as pool:
+        for result in pool.imap_unordered(run_job, jobs):
+            results.append(result)
+            if progress:
+                progress(len(results), len(jobs), time.perf_counter() - started)
+
+    return results, skipped
+
+
+def main(argv=None):
+    today = datetime.date.today()
+    last_month = today.replace(day=1) - datetime.timedelta(days=1)
+
+    parser = argparse.ArgumentParser(description="Generate PDF reports for all users")
+    parser.add_argument('--year', type=int, default=last_month.year, help=f"default: {last_month.year}")
+    parser.add_argument('--month', type=int, action='append', choices=range(1, 13), metavar='MONTH',
+                        help="only these months (repeatable), default: all months with transactions")
+    parser.add_argument('--kind', choices=['monthly', 'yearly', 'all'], default='all')
+    parser.add_argument('--user', action='append', metavar='USERNAME', help="only these users (repeatable)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help=f"default: {DEFAULT_OUTPUT_DIR}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument('--force', action='store_true', help="regenerate reports that already exist")
+    args = parser.parse_args(argv)
+
+    jobs = plan_jobs(args.year, args.month, args.kind, args.user, args.output)
+    print(f"{len(jobs)} report(s) for {args.year} in {args.output}")
+
+    def show_progress(done, total, elapsed):
+        sys.stderr.write(f"\r{done}/{total} reports  {done / elapsed:6.2f} reports/s")
+        sys.stderr.flush()
+
+    started = time.perf_counter()
+    results, skipped = run_batch(jobs, args.workers, args.force, progress=show_progress)
+    elapsed = time.perf_counter() - started
+    if results:
+        sys.stderr.write("\n")
+
+    failed = [result for result in results if not result.success]
+    for result in failed:
+        print(f"Failed: {result.job.path}")
+
+    generated = len(results) - len(failed)
+    rate = len(results) / elapsed if results else 0
+    print(f"Generated {generated} report(s), skipped {skipped} existing, {len(failed)} failed "
+          f"in {elapsed:.1f}s ({rate:.2f} reports/s)")
+
+    if results:
+        per_worker = Counter(result.worker for result in results)
+        busy = sum(result.seconds for result in results)
+        print(f"{len(per_worker)} worker(s), {min(per_worker.values())}-{max(per_worker.values())} reports each, "
+              f"{busy / len(results):.2f}s per report")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,254 +1,586 @@
 import datetime
-from sqlalchemy import extract, func
+from collections import namedtuple
+from operator import itemgetter
+from sqlalchemy import column, func, insert, literal_column, select, table, tuple_
 
-from app.database import Category, Transaction, Goal, get_session
+from app.database import Category, Transaction, Goal, MonthlyRollup, session_scope
+from app.cache import bump_data_version
+from app.encryption import decrypt_many, encrypt_many, raw
+from app.instrumentation import track_queries
+from app.rollups import apply_rollup, apply_rollups
+from app.search import index_later, index_transactions, search_query
+from app.writer import submit_write
 
 
-def create_default_categories(user_id):
-    session = get_session()
+DEFAULT_INCOME_CATEGORIES = ["Salary", "Investments", "Gifts", "Other Income"]
+DEFAULT_EXPENSE_CATEGORIES = ["Housing", "Food", "Transportation", "Utilities",
+                              "Healthcare", "Entertainment", "Education", "Shopping",
+                              "Savings", "Debt Payments", "Miscellaneous"]
 
-    income_categories = ["Salary", "Investments", "Gifts", "Other Income"]
-    for name in income_categories:
-        category = Category(name=name, is_income=True, user_id=user_id)
-        session.add(category)
 
-    expense_categories = ["Housing", "Food", "Transportation", "Utilities",
-                          "Healthcare", "Entertainment", "Education", "Shopping",
-                          "Savings", "Debt Payments", "Miscellaneous"]
-    for name in expense_categories:
-        category = Category(name=name, is_income=False, user_id=user_id)
-        session.add(category)
+# The writers below come in pairs: xxx_async() queues the write on the writer thread
+# (app/writer.py) and returns a Future of the result tuple, xxx() waits for it. Writes
+# queued together are committed in one transaction.
 
-    session.commit()
-    session.close()
+def _write_error(e):
+    return False, f"An error occurred: {str(e)}", None
 
 
-def get_categories(user_id, is_income=None):
-    session = get_session()
+def default_category_rows(user_id):
+    # Parameter dicts for inserting a user's default categories in one executemany
+    return ([{'name': name, 'is_income': True, 'user_id': user_id} for name in DEFAULT_INCOME_CATEGORIES] +
+            [{'name': name, 'is_income': False, 'user_id': user_id} for name in DEFAULT_EXPENSE_CATEGORIES])
+
+
+@track_queries
+def create_default_categories(user_id):
+    submit_write(_create_default_categories, user_id).result()
 
-    query = session.query(Category).filter_by(user_id=user_id)
-    if is_income is not None:
-        query = query.filter_by(is_income=is_income)
 
-    categories = query.all()
-    session.close()
+def _create_default_categories(session, user_id):
+    session.execute(insert(Category), default_category_rows(user_id))
+    bump_data_version(session, user_id)
 
-    return categories
 
+@track_queries
+def get_categories(user_id, is_income=None):
+    query = select(Category.id, Category.name, Category.is_income, Category.user_id).where(
+        Category.user_id == user_id)
+    if is_income is not None:
+        query = query.where(Category.is_income == is_income)
+
+    with session_scope() as session:
+        return list(map(CategoryData._make, session.connection().execute(query.order_by(Category.id))))
 
+
+@track_queries
 def add_category(user_id, name, is_income):
-    session = get_session()
+    return add_category_async(user_id, name, is_income).result()
 
-    try:
-        # Check if exists
-        existing = session.query(Category).filter_by(
-            user_id=user_id, name=name, is_income=is_income).first()
 
-        if existing:
-            session.close()
-            return False, "Category already exists"
+def add_category_async(user_id, name, is_income):
+    return submit_write(_add_category, user_id, name, is_income, on_error=_write_error)
 
-        # Create new category
-        category = Category(name=name, is_income=is_income, user_id=user_id)
-        session.add(category)
-        session.commit()
 
-        session.close()
-        return True, "Category added successfully"
+def _add_category(session, user_id, name, is_income):
+    # Check if exists
+    existing = session.query(Category).filter_by(
+        user_id=user_id, name=name, is_income=is_income).first()
 
-    except Exception as e:
-        session.rollback()
-        session.close()
-        return False, f"An error occurred: {str(e)}"
+    if existing:
+        return False, "Category already exists", None
 
+    # Create new category
+    category = Category(name=name, is_income=is_income, user_id=user_id)
+    session.add(category)
+    bump_data_version(session, user_id)
+    session.flush()
 
+    record = CategoryData(category.id, category.name, category.is_income, category.user_id)
+    return True, "Category added successfully", WriteResult(record, None)
+
+
+@track_queries
 def add_transaction(user_id, amount, description, category_id, date=None):
-    session = get_session()
+    return add_transaction_async(user_id, amount, description, category_id, date).result()
 
-    try:
-        # validate category and get type
-        category = session.query(Category).filter_by(id=category_id, user_id=user_id).first()
-        if not category:
-            session.close()
-            return False, "Invalid category"
 
-        # Ensure amount is positive (we'll use category type to determine income/expense)
-        amount = abs(amount)
+def add_transaction_async(user_id, amount, description, category_id, date=None):
+    return submit_write(_add_transaction, user_id, amount, description, category_id, date,
+                        on_error=_add_transaction_error)
 
-        # Create transaction
-        transaction = Transaction(
-            amount=amount,
-            description=description or "",
-            category_id=category_id,
-            user_id=user_id,
-            date=date or datetime.datetime.now()
-        )
 
-        session.add(transaction)
-        session.commit()
+def _add_transaction(session, user_id, amount, description, category_id, date):
+    # validate category and get type
+    category = session.query(Category).filter_by(id=category_id, user_id=user_id).first()
+    if not category:
+        return False, "Invalid category", None
 
-        print(
-            f"Transaction saved: ID={transaction.id}, Amount={amount}, Category={category.name}, Type={'Income' if category.is_income else 'Expense'}")
+    # Ensure amount is positive (we'll use category type to determine income/expense)
+    amount = abs(amount)
 
-        session.close()
-        return True, "Transaction added successfully"
+    # Create transaction
+    transaction = Transaction(
+        amount=amount,
+        description=description or "",
+        category_id=category_id,
+        user_id=user_id,
+        date=date or datetime.datetime.now()
+    )
+
+    session.add(transaction)
+    apply_rollup(session, user_id, category_id, transaction.date, amount)
+    bump_data_version(session, user_id)
+    session.flush()
+    index_transactions(session, [(transaction.id, transaction.description, user_id)])
+
+    print(
+        f"Transaction saved: ID={transaction.id}, Amount={amount}, Category={category.name}, Type={'Income' if category.is_income else 'Expense'}")
+
+    record = TransactionData(transaction.id, amount, transaction.description, transaction.date, category_id,
+                             user_id, category.name, category.is_income)
+    return True, "Transaction added successfully", WriteResult(record, summary_delta(record))
+
+
+def _add_transaction_error(e):
+    print(f"Error adding transaction: {str(e)}")
+    return _write_error(e)
+
+
+BULK_BATCH_SIZE = 50000
+
+# Plain executemany for bulk loads, skipping per-row ORM/Core parameter processing
+_BULK_INSERT_SQL = ("INSERT INTO transactions (amount, description, category_id, user_id, date) "
+                    "VALUES (?, ?, ?, ?, ?)")
+
+
+@track_queries
+def add_transactions(user_id, rows, batch_size=BULK_BATCH_SIZE):
+    """
+    Insert many transactions for a user, committing once per batch.
+
+    rows is any iterable (a generator is fine) of dicts with 'amount', 'category_id' and
+    optional 'description' and 'date'. Invalid rows are skipped and reported instead of
+    aborting the load. Returns (inserted_count, errors) where errors is a list of
+    (row_index, message); nothing is printed, reporting is up to the caller.
+
+    Each batch is encrypted and queued before waiting for the previous one, and the next
+    is read and validated while the writer thread inserts them; at most three batches
+    are held at a time. The new rows are indexed for search by app.search's indexer
+    thread once the load is done, app.search.wait_for_index() waits for that.
+    """
+    # one query for all the categories this user may use
+    with session_scope() as session:
+        valid_categories = {cat_id for (cat_id,) in session.query(Category.id).filter_by(user_id=user_id)}
+
+    now = datetime.datetime.now()
+    inserted = 0
+    errors = []
+    batch = []
+    batch_indexes = []
+    pending = None
+    ranges = []
+
+    for index, row in enumerate(rows):
+        category_id = row.get('category_id')
+        if category_id not in valid_categories:
+            errors.append((index, "Invalid category"))
+            continue
+
+        amount = row.get('amount')
+        if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+            errors.append((index, "Invalid amount format"))
+            continue
+
+        date = row.get('date') or now
+        if not isinstance(date, datetime.datetime):
+            errors.append((index, "Invalid date"))
+            continue
+
+        batch.append((abs(amount), row.get('description') or "", category_id, date))
+        batch_indexes.append(index)
+
+        if len(batch) >= batch_size:
+            queued = _insert_transaction_batch(user_id, batch, batch_indexes)
+            inserted += _wait_for_batch(pending, errors, ranges)
+            pending = queued
+            batch = []
+            batch_indexes = []
+
+    if batch:
+        queued = _insert_transaction_batch(user_id, batch, batch_indexes)
+        inserted += _wait_for_batch(pending, errors, ranges)
+        pending = queued
+    inserted += _wait_for_batch(pending, errors, ranges)
+
+    if ranges:
+        index_later(min(after for after, _ in ranges), max(up_to for _, up_to in ranges))
+    return inserted, errors
+
+
+def _insert_transaction_batch(user_id, batch, batch_indexes):
+    # executemany plus rollup deltas, committed as one DB transaction; returns
+    # (future, batch_indexes) for _wait_for_batch
+    # date order keeps inserts into the (user_id, date) index mostly appending
+    batch.sort(key=itemgetter(3))
+
+    deltas = {}
+    params = []
+    # the raw INSERT skips the column types, so descriptions are encrypted here, all at once
+    descriptions = encrypt_many([row[1] for row in batch])
+    for (amount, _, category_id, date), description in zip(batch, descriptions):
+        key = (user_id, date.year, date.month, category_id)
+        total, count = deltas.get(key, (0.0, 0))
+        deltas[key] = (total + amount, count + 1)
+        # same text format SQLAlchemy's SQLite DateTime type writes
+        params.append((amount, description, category_id, user_id, date.isoformat(' ', 'microseconds')))
+
+    return submit_write(_write_transaction_batch, params, deltas, user_id), batch_indexes
+
+
+def _write_transaction_batch(session, params, deltas, user_id):
+    # returns (rows inserted, (after, up_to)): the new rows' ids are in after < id <= up_to
+    connection = session.connection()
+    last_id = connection.exec_driver_sql("SELECT max(id) FROM transactions").scalar() or 0
+    connection.exec_driver_sql(_BULK_INSERT_SQL, params)
+    up_to = connection.exec_driver_sql("SELECT max(id) FROM transactions").scalar()
+
+    apply_rollups(session, deltas)
+    bump_data_version(session, user_id)
+    return len(params), (last_id, up_to)
+
+
+def _wait_for_batch(pending, errors, ranges):
+    # Rows inserted by a batch from _insert_transaction_batch, failures go to errors and
+    # the id range of the new rows to ranges
+    if pending is None:
+        return 0
+
+    future, batch_indexes = pending
+    try:
+        count, id_range = future.result()
 
     except Exception as e:
-        session.rollback()
-        session.close()
-        print(f"Error adding transaction: {str(e)}")
-        return False, f"An error occurred: {str(e)}"
+        errors.extend((index, f"An error occurred: {str(e)}") for index in batch_indexes)
+        return 0
 
+    ranges.append(id_range)
+    return count
 
-def get_transactions(user_id, start_date=None, end_date=None, category_id=None):
-    session = get_session()
 
-    # Use joinedload to eagerly(active) load the category relationship
-    from sqlalchemy.orm import joinedload
+# Plain row records returned by the readers below. They are filled straight from
+# Core selects, so no ORM objects or identity map entries are created per row.
+TransactionData = namedtuple('TransactionData', [
+    'id', 'amount', 'description', 'date', 'category_id', 'user_id', 'category_name', 'category_is_income'
+])
+CategoryData = namedtuple('CategoryData', ['id', 'name', 'is_income', 'user_id'])
+GoalData = namedtuple('GoalData', ['id', 'name', 'target_amount', 'current_amount', 'deadline', 'user_id'])
 
-    query = session.query(Transaction).options(joinedload(Transaction.category)).filter_by(user_id=user_id)
+# What the single-row writers (add_category, add_transaction, add_goal, update_goal) return
+# on success next to (True, message): the record as the readers would return it, and for
+# transactions the change to that month's summary, so callers can patch what they show
+# instead of reloading it.
+WriteResult = namedtuple('WriteResult', ['record', 'summary_delta'])
+SummaryDelta = namedtuple('SummaryDelta', ['year', 'month', 'income', 'expenses'])
 
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
+# descriptions are read as stored and decrypted a page at a time by _transaction_records
+_TRANSACTION_COLUMNS = (
+    Transaction.id, Transaction.amount, raw(Transaction.description).label('description'), Transaction.date,
+    Transaction.category_id, Transaction.user_id, Category.name, Category.is_income
+)
 
-    if end_date:
-        query = query.filter(Transaction.date <= end_date)
 
-    if category_id:
-        query = query.filter_by(category_id=category_id)
+def _transaction_records(rows):
+    # TransactionData for rows of _TRANSACTION_COLUMNS, decrypting every description in one go
+    rows = list(rows)
+    descriptions = decrypt_many([row[2] for row in rows])
+    return [TransactionData(row[0], row[1], description, *row[3:]) for row, description in zip(rows, descriptions)]
 
-    # newest first
-    query = query.order_by(Transaction.date.desc())
 
-    transactions = query.all()
+# Columns transaction lists can be sorted by (id always breaks ties), and the
+# TransactionData field holding the same value for building keyset cursors. Not
+# description: it is stored encrypted, so the database can't order by it.
+TRANSACTION_SORT_COLUMNS = {
+    'date': (Transaction.date, 'date'),
+    'amount': (Transaction.amount, 'amount'),
+    'category': (Category.name, 'category_name'),
+    'type': (Category.is_income, 'category_is_income'),
+}
 
-    class TransactionData:
-        def __init__(self, trans, cat):
-            self.id = trans.id
-            self.amount = trans.amount
-            self.description = trans.description
-            self.date = trans.date
-            self.category_id = trans.category_id
-            self.user_id = trans.user_id
-            # Store category data to avoid lazy loading issues
-            self.category_name = cat.name
-            self.category_is_income = cat.is_income
 
-    # Convert to TransactionData objects
-    result = []
-    for transaction in transactions:
-        result.append(TransactionData(transaction, transaction.category))
+def transaction_sort_key(transaction, sort='date'):
+    # (value, id) of a TransactionData in the given sort order; also the keyset cursor format
+    return getattr(transaction, TRANSACTION_SORT_COLUMNS[sort][1]), transaction.id
 
-    session.close()
 
-    return result
+def summary_delta(transaction):
+    # How one transaction changes its month's income/expense totals
+    amount = abs(transaction.amount)
+    if transaction.category_is_income:
+        return SummaryDelta(transaction.date.year, transaction.date.month, amount, 0.0)
+    return SummaryDelta(transaction.date.year, transaction.date.month, 0.0, amount)
 
 
-def get_monthly_summary(user_id, year, month):
-    session = get_session()
-
-    # get income based on category type
-    income_query = session.query(func.sum(Transaction.amount)).join(Category).filter(
-        Transaction.user_id == user_id,
-        Category.is_income == True,
-        extract('year', Transaction.date) == year,
-        extract('month', Transaction.date) == month
-    )
+def _transaction_filters(query, user_id, start_date=None, end_date=None, category_id=None):
+    query = query.where(Transaction.user_id == user_id)
+
+    if start_date:
+        query = query.where(Transaction.date >= start_date)
+
+    if end_date:
+        query = query.where(Transaction.date <= end_date)
+
+    if category_id:
+        query = query.where(Transaction.category_id == category_id)
+
+    return query
 
-    # get expenses based on category type
-    expense_query = session.query(func.sum(Transaction.amount)).join(Category).filter(
-        Transaction.user_id == user_id,
-        Category.is_income == False,
-        extract('year', Transaction.date) == year,
-        extract('month', Transaction.date) == month
-    )
 
-    # Category breakdown
-    category_breakdown = session.query(
-        Category.name,
-        func.sum(Transaction.amount)
-    ).join(Category).filter(
-        Transaction.user_id == user_id,
-        extract('year', Transaction.date) == year,
-        extract('month', Transaction.date) == month
-    ).group_by(Category.name).all()
+def _transaction_select(user_id, start_date=None, end_date=None, category_id=None, sort='date', descending=True):
+    # Filtered transactions joined to their category, newest first unless sorted otherwise
+    query = select(*_TRANSACTION_COLUMNS).join(Category, Category.id == Transaction.category_id)
+    query = _transaction_filters(query, user_id, start_date, end_date, category_id)
 
-    total_income = income_query.scalar() or 0
-    total_expenses = expense_query.scalar() or 0
+    column = TRANSACTION_SORT_COLUMNS[sort][0]
+    if descending:
+        return query.order_by(column.desc(), Transaction.id.desc())
+    return query.order_by(column.asc(), Transaction.id.asc())
 
-    print(f"Monthly summary: Income={total_income}, Expenses={total_expenses}")
 
-    session.close()
+@track_queries
+def get_transactions(user_id, start_date=None, end_date=None, category_id=None):
+    with session_scope() as session:
+        result = session.connection().execute(_transaction_select(user_id, start_date, end_date, category_id))
+        return _transaction_records(result)
+
+
+@track_queries
+def count_transactions(user_id, start_date=None, end_date=None, category_id=None):
+    query = _transaction_filters(select(func.count(Transaction.id)), user_id, start_date, end_date, category_id)
+
+    with session_scope() as session:
+        return session.connection().execute(query).scalar()
+
+
+@track_queries
+def get_transactions_page(user_id, start_date=None, end_date=None, category_id=None, limit=50, after=None,
+                          offset=None, sort='date', descending=True):
+    """
+    One page of transactions using keyset pagination on (sort column, id).
+
+    after is the cursor returned with the previous page (None for the first page).
+    Returns (rows, next_cursor); next_cursor is None on the last page. With the default
+    date order each page is a single index seek, so page 1000 costs the same as page 1.
+    offset is for jumping straight to a page with no cursor at hand (e.g. dragging a
+    scrollbar); it has to skip the rows before it, so prefer after when there is one.
+    """
+    column = TRANSACTION_SORT_COLUMNS[sort][0]
+    query = _transaction_select(user_id, start_date, end_date, category_id, sort, descending)
+
+    if after is not None:
+        key = tuple_(column, Transaction.id)
+        query = query.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    elif offset:
+        query = query.offset(offset)
+
+    # one extra row tells us whether another page exists
+    with session_scope() as session:
+        rows = _transaction_records(session.connection().execute(query.limit(limit + 1)))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = transaction_sort_key(rows[-1], sort)
+
+    return rows, next_cursor
+
+
+def iter_transactions(user_id, start_date=None, end_date=None, category_id=None, chunk_size=1000):
+    """
+    Yield every matching transaction, newest first, fetching chunk_size rows at a time.
+
+    Memory stays bounded by the chunk size however long the history is. The session stays
+    open until the generator is exhausted or closed.
+    """
+    query = _transaction_select(user_id, start_date, end_date, category_id)
+
+    with session_scope() as session:
+        conn = session.connection().execution_options(yield_per=chunk_size)
+        for rows in conn.execute(query).partitions():
+            yield from _transaction_records(rows)
+
+
+_FTS = table('transactions_fts', column('rowid'), column('rank'))
+
+SEARCH_LIMIT = 100
+
+
+@track_queries
+def search_transactions(user_id, query, filters=None, limit=SEARCH_LIMIT):
+    """
+    Transactions whose description matches query (see app.search.search_query), best
+    match first (FTS5 bm25 rank, then newest). filters takes the same optional filters
+    as get_transactions: {'start_date': ..., 'end_date': ..., 'category_id': ...}.
+
+    Uses the transactions_fts index (app/search.py): the cost depends on the number of
+    matches, not on the size of the history. The index only knows the first four letters
+    of each word and the whole word: a partial word longer than that only matches when it
+    is the last one typed, and then matches every word sharing its first four letters
+    ("groce" finds "Grocer" as well as "Groceries"), whole-word matches ranking first.
+    """
+    match = search_query(query)
+    if match is None:
+        return []
+
+    # the owner token narrows the match to this user's rows inside the index itself
+    expression = f'owner : "u{int(user_id)}" AND description : ({match})'
+    statement = (select(*_TRANSACTION_COLUMNS)
+                 .select_from(_FTS)
+                 .join(Transaction, Transaction.id == _FTS.c.rowid)
+                 .join(Category, Category.id == Transaction.category_id)
+                 .where(literal_column('transactions_fts').op('MATCH')(expression)))
+    statement = _transaction_filters(statement, user_id, **(filters or {}))
+    statement = statement.order_by(_FTS.c.rank, Transaction.date.desc()).limit(limit)
+
+    with session_scope() as session:
+        return _transaction_records(session.connection().execute(statement))
+
+
+def month_range(year, month):
+    # Half-open [start, end) bounds of a month, usable by the (user_id, date) index
+    start = datetime.datetime(year, month, 1)
+    if month == 12:
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        end = datetime.datetime(year, month + 1, 1)
+    return start, end
+
+
+def iter_months(start_year, start_month, end_year, end_month):
+    # (year, month) pairs from start to end, both inclusive
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+@track_queries
+def get_monthly_totals(user_id, start_year, start_month=1, end_year=None, end_month=12):
+    """
+    Income, expenses and per-category totals for every month in a range, in one query
+    over the monthly_rollups table.
+
+    Returns a list with one summary dict per month (same keys as get_monthly_summary plus
+    'year' and 'month'), in calendar order, with zeros for months that have no transactions.
+    """
+    if end_year is None:
+        end_year = start_year
+
+    # Read from the rollup table: one row per (month, category), not per transaction
+    period = MonthlyRollup.year * 100 + MonthlyRollup.month
+
+    with session_scope() as session:
+        rows = session.query(
+            MonthlyRollup.year,
+            MonthlyRollup.month,
+            Category.name,
+            Category.is_income,
+            MonthlyRollup.total
+        ).join(Category, Category.id == MonthlyRollup.category_id).filter(
+            MonthlyRollup.user_id == user_id,
+            MonthlyRollup.year >= start_year,
+            MonthlyRollup.year <= end_year,
+            period >= start_year * 100 + start_month,
+            period <= end_year * 100 + end_month,
+            MonthlyRollup.count > 0
+        ).all()
+
+    months = {}
+    for year, month in iter_months(start_year, start_month, end_year, end_month):
+        months[(year, month)] = {
+            'year': year,
+            'month': month,
+            'total_income': 0,
+            'total_expenses': 0,
+            'net': 0,
+            'category_breakdown': {}
+        }
+
+    for year, month, name, is_income, total in rows:
+        summary = months[(year, month)]
+        if is_income:
+            summary['total_income'] += total
+        else:
+            summary['total_expenses'] += total
+        breakdown = summary['category_breakdown']
+        breakdown[name] = breakdown.get(name, 0) + total
+
+    for summary in months.values():
+        summary['net'] = summary['total_income'] - summary['total_expenses']
+
+    return list(months.values())
+
+
+@track_queries
+def get_monthly_summary(user_id, year, month):
+    summary = get_monthly_totals(user_id, year, month, year, month)[0]
+
+    print(f"Monthly summary: Income={summary['total_income']}, Expenses={summary['total_expenses']}")
 
     return {
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'net': total_income - total_expenses,
-        'category_breakdown': dict(category_breakdown)
+        'total_income': summary['total_income'],
+        'total_expenses': summary['total_expenses'],
+        'net': summary['net'],
+        'category_breakdown': summary['category_breakdown']
     }
 
 
+@track_queries
 def add_goal(user_id, name, target_amount, deadline=None):
-    session = get_session()
+    return add_goal_async(user_id, name, target_amount, deadline).result()
 
-    try:
-        goal = Goal(
-            name=name,
-            target_amount=target_amount,
-            current_amount=0,
-            deadline=deadline,
-            user_id=user_id
-        )
 
-        session.add(goal)
-        session.commit()
+def add_goal_async(user_id, name, target_amount, deadline=None):
+    return submit_write(_add_goal, user_id, name, target_amount, deadline, on_error=_write_error)
 
-        session.close()
-        return True, "Goal added successfully"
 
-    except Exception as e:
-        session.rollback()
-        session.close()
-        return False, f"An error occurred: {str(e)}"
+def _add_goal(session, user_id, name, target_amount, deadline):
+    goal = Goal(
+        name=name,
+        target_amount=target_amount,
+        current_amount=0,
+        deadline=deadline,
+        user_id=user_id
+    )
 
+    session.add(goal)
+    bump_data_version(session, user_id)
+    session.flush()
 
+    return True, "Goal added successfully", WriteResult(_goal_data(goal), None)
+
+
+@track_queries
 def update_goal(goal_id, user_id, current_amount=None, target_amount=None, deadline=None):
-    session = get_session()
+    return update_goal_async(goal_id, user_id, current_amount, target_amount, deadline).result()
 
-    try:
-        # Find goal
-        goal = session.query(Goal).filter_by(id=goal_id, user_id=user_id).first()
 
-        if not goal:
-            session.close()
-            return False, "Goal not found"
+def update_goal_async(goal_id, user_id, current_amount=None, target_amount=None, deadline=None):
+    return submit_write(_update_goal, goal_id, user_id, current_amount, target_amount, deadline,
+                        on_error=_write_error)
 
-        # Update fields
-        if current_amount is not None:
-            goal.current_amount = current_amount
 
-        if target_amount is not None:
-            goal.target_amount = target_amount
+def _update_goal(session, goal_id, user_id, current_amount, target_amount, deadline):
+    # Find goal
+    goal = session.query(Goal).filter_by(id=goal_id, user_id=user_id).first()
 
-        if deadline is not None:
-            goal.deadline = deadline
+    if not goal:
+        return False, "Goal not found", None
 
-        session.commit()
+    # Update fields
+    if current_amount is not None:
+        goal.current_amount = current_amount
 
-        session.close()
-        return True, "Goal updated successfully"
+    if target_amount is not None:
+        goal.target_amount = target_amount
 
-    except Exception as e:
-        session.rollback()
-        session.close()
-        return False, f"An error occurred: {str(e)}"
+    if deadline is not None:
+        goal.deadline = deadline
 
+    bump_data_version(session, user_id)
+    session.flush()
+
+    return True, "Goal updated successfully", WriteResult(_goal_data(goal), None)
 
-def get_goals(user_id):
-    session = get_session()
 
-    goals = session.query(Goal).filter_by(user_id=user_id).all()
+def _goal_data(goal):
+    return GoalData(goal.id, goal.name, goal.target_amount, goal.current_amount, goal.deadline, goal.user_id)
 
-    session.close()
 
-    return goals
\ No newline at end of file
+@track_queries
+def get_goals(user_id):
+    query = select(Goal.id, Goal.name, Goal.target_amount, Goal.current_amount, Goal.deadline, Goal.user_id).where(
+        Goal.user_id == user_id).order_by(Goal.id)
+
+    with session_scope() as session:
+        return list(map(GoalData._make, session.connection().execute(query)))
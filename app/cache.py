@@ -0,0 +1,92 @@
+"""
+Caching of generated reports and chart images.
+
+Every write in app/budget.py bumps the user's row in data_versions inside the same
+DB transaction. Cache keys include that version, so a write makes the old entries
+unreachable (they age out of the LRU) and nothing has to be invalidated by hand.
+The version lives in the database, so writes from other processes (the importer
+CLI, batch jobs) are seen too.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import DataVersion, get_engine
+
+REPORT_CACHE_SIZE = 64
+
+_VERSION_SQL = "SELECT version FROM data_versions WHERE user_id = ?"
+
+
+def bump_data_version(session, user_id):
+    # Call inside the writing session so the bump commits with the data
+    stmt = sqlite_insert(DataVersion).values(user_id=user_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'version': DataVersion.version + 1}
+    )
+    session.execute(stmt)
+
+
+def get_data_version(user_id):
+    # Single primary key lookup on a raw pooled DBAPI connection, this runs on every cache hit
+    conn = get_engine().raw_connection()
+    try:
+        row = conn.cursor().execute(_VERSION_SQL, (user_id,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+
+class ReportCache:
+    """Thread-safe LRU of report dicts and chart PNGs with hit/miss counters.
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=REPORT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by BudgetReport in this process
+report_cache = ReportCache()
@@ -0,0 +1,193 @@
+"""
+Chart rendering with matplotlib's object-oriented API (Figure + Agg canvas).
+
+Nothing here touches pyplot's global figure state, so charts can be drawn from several
+threads at once. Each thread keeps its own figures and reuses them: a new report only
+updates the data of the existing artists (bar heights, line data) instead of building
+a figure from scratch.
+
+    png = render_report_chart(report_data)
+"""
+import io
+import threading
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+REPORT_CHART_SIZE = (10, 8)
+CHART_DPI = 100
+
+
+def new_figure(figsize, dpi=CHART_DPI):
+    # A figure with its own Agg canvas, independent of pyplot
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def figure_png(figure):
+    # Draw once and encode the Agg buffer; savefig() would draw the figure twice
+    figure.canvas.draw()
+    buf = io.BytesIO()
+    Image.frombuffer('RGBA', figure.canvas.get_width_height(), figure.canvas.buffer_rgba()).save(buf, format='png')
+    return buf.getvalue()
+
+
+# Pie axes limits, fixed so the pie doesn't move between reports
+PIE_LIMITS = (-1.1, 1.1)
+
+
+def _autoscale_y(ax, values, sticky):
+    # sticky keeps the current y range while the data still fills at least half of it,
+    # so an embedded chart can redraw just the data instead of the axes (see ChartView)
+    low, high = ax.get_ylim()
+    data_low, data_high = min(values), max(values)
+    if sticky and low <= data_low and data_high <= high and data_high - data_low >= (high - low) / 2:
+        return
+    ax.relim()
+    ax.autoscale_view()
+
+
+def _set_bar_heights(ax, bars, heights, sticky=False):
+    for bar, height in zip(bars, heights):
+        bar.set_height(height)
+    _autoscale_y(ax, [0] + list(heights), sticky)
+
+
+class ReportChart:
+    # Base for the report figures: update(report_data, sticky_limits=False) changes the
+    # data, the rest stays put
+
+    def axes(self):
+        return self.figure.axes
+
+    def view_limits(self):
+        # When these are unchanged after update(), only the data artists need redrawing
+        return [(tuple(ax.get_xlim()), tuple(ax.get_ylim())) for ax in self.axes()]
+
+    def data_artists(self):
+        raise NotImplementedError
+
+
+class MonthlyReportChart(ReportChart):
+    # Expense breakdown pie over an income vs expenses bar chart
+
+    def __init__(self):
+        self.figure = new_figure(REPORT_CHART_SIZE)
+        self.pie_ax = self.figure.add_subplot(2, 1, 1)
+        self.bar_ax = self.figure.add_subplot(2, 1, 2)
+
+        self.pie_ax.set_title('Expense Breakdown')
+        self.pie_ax.set_aspect('equal')
+        self.pie_ax.set_axis_off()
+
+        self.bars = self.bar_ax.bar(['Income', 'Expenses'], [0, 0])
+        self.bar_ax.set_title('Income vs Expenses')
+        self.bar_ax.set_ylabel('Amount ($)')
+
+        self.figure.tight_layout()
+
+    def update(self, report_data, sticky_limits=False):
+        summary = report_data['summary']
+
+        # The number of wedges changes from month to month, so the pie is redrawn
+        labels = []
+        sizes = []
+        for name, amount in summary.get('category_breakdown', {}).items():
+            if amount > 0:
+                labels.append(name)
+                sizes.append(amount)
+
+        for artist in self.pie_ax.patches + self.pie_ax.texts:
+            artist.remove()
+        self.pie_ax.set_prop_cycle(None)  # same wedge colours as a fresh figure
+        if sizes:
+            self.pie_ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
+        self.pie_ax.set(xlim=PIE_LIMITS, ylim=PIE_LIMITS)
+
+        _set_bar_heights(self.bar_ax, self.bars, [summary['total_income'], summary['total_expenses']], sticky_limits)
+
+    def data_artists(self):
+        return self.pie_ax.patches + self.pie_ax.texts + list(self.bars)
+
+
+class YearlyReportChart(ReportChart):
+    # Monthly income/expense lines over a yearly income vs expenses bar chart
+
+    def __init__(self):
+        self.figure = new_figure(REPORT_CHART_SIZE)
+        self.line_ax = self.figure.add_subplot(2, 1, 1)
+        self.bar_ax = self.figure.add_subplot(2, 1, 2)
+
+        self.months = None
+        self.income_line = None
+        self.expense_line = None
+
+        self.bars = self.bar_ax.bar(['Income', 'Expenses'], [0, 0])
+        self.bar_ax.set_title('Yearly Income vs Expenses')
+        self.bar_ax.set_ylabel('Amount ($)')
+
+    def update(self, report_data, sticky_limits=False):
+        months = [data['month'][:3] for data in report_data['monthly_data']]  # Abbreviate month names
+        income = [data['income'] for data in report_data['monthly_data']]
+        expenses = [data['expenses'] for data in report_data['monthly_data']]
+
+        if months != self.months:
+            # First render (or different months): build the lines once
+            self.months = months
+            self.line_ax.clear()
+            self.income_line, = self.line_ax.plot(months, income, label='Income', marker='o')
+            self.expense_line, = self.line_ax.plot(months, expenses, label='Expenses', marker='o')
+            self.line_ax.set_title('Monthly Income and Expenses')
+            self.line_ax.legend()
+            self.line_ax.grid(True)
+            self.figure.tight_layout()
+        else:
+            self.income_line.set_ydata(income)
+            self.expense_line.set_ydata(expenses)
+            _autoscale_y(self.line_ax, income + expenses, sticky_limits)
+
+        _set_bar_heights(self.bar_ax, self.bars, [report_data['yearly_income'], report_data['yearly_expenses']],
+                         sticky_limits)
+
+    def data_artists(self):
+        return [self.income_line, self.expense_line] + list(self.bars)
+
+
+REPORT_CHARTS = {'monthly': MonthlyReportChart, 'yearly': YearlyReportChart}
+
+
+def report_kind(report_data):
+    return 'monthly' if 'summary' in report_data else 'yearly'
+
+
+class ReportChartRenderer:
+    """
+    Renders report charts to PNG, keeping one figure per report type for reuse.
+    A renderer must only be used by one thread; render_report_chart() keeps one per thread.
+    """
+
+    def __init__(self):
+        self._charts = {}
+
+    def render(self, report_data):
+        kind = report_kind(report_data)
+
+        chart = self._charts.get(kind)
+        if chart is None:
+            chart = self._charts[kind] = REPORT_CHARTS[kind]()
+
+        chart.update(report_data)
+        return figure_png(chart.figure)
+
+
+_local = threading.local()
+
+
+def render_report_chart(report_data):
+    # PNG bytes of a monthly or yearly report's charts, safe to call from any thread
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = _local.renderer = ReportChartRenderer()
+    return renderer.render(report_data)
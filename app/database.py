@@ -1,8 +1,15 @@
 import os
 import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+import threading
+from contextlib import contextmanager
+from sqlalchemy import (
+    create_engine, event, make_url, Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, inspect
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from app.encryption import EncryptedText
 
 # base class for ORM
 Base = declarative_base()
@@ -38,6 +45,10 @@ class Category(Base):
     user = relationship("User", back_populates="categories")
     transactions = relationship("Transaction", back_populates="category", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_categories_user_income', 'user_id', 'is_income'),
+    )
+
     def __repr__(self):
         return f"<Category(name='{self.name}', type='{'Income' if self.is_income else 'Expense'}')>"
 
@@ -48,7 +59,7 @@ class Transaction(Base):
 
     id = Column(Integer, primary_key=True)
     amount = Column(Float, nullable=False)
-    description = Column(String(255))
+    description = Column(EncryptedText(255))
     date = Column(DateTime, default=datetime.datetime.utcnow)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
@@ -56,6 +67,12 @@ class Transaction(Base):
     user = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
 
+    # date filters always come with a user, so user_id leads both indexes
+    __table_args__ = (
+        Index('ix_transactions_user_date', 'user_id', 'date'),
+        Index('ix_transactions_user_category_date', 'user_id', 'category_id', 'date'),
+    )
+
     def __repr__(self):
         return f"<Transaction(amount={self.amount}, category='{self.category.name}', date='{self.date}')>"
 
@@ -65,7 +82,7 @@ class Goal(Base):
     __tablename__ = 'goals'
 
     id = Column(Integer, primary_key=True)
-    name = Column(String(100), nullable=False)
+    name = Column(EncryptedText(100), nullable=False)
     target_amount = Column(Float, nullable=False)
     current_amount = Column(Float, default=0.0)
     deadline = Column(DateTime, nullable=True)
@@ -73,28 +90,241 @@ class Goal(Base):
 
     user = relationship("User", back_populates="goals")
 
+    __table_args__ = (
+        Index('ix_goals_user', 'user_id'),
+    )
+
     def __repr__(self):
         return f"<Goal(name='{self.name}', progress={self.current_amount}/{self.target_amount})>"
 
 
-def init_db():
-    """init_db, creating tables if they don't exist"""
-    # Ensure the data directory exists
-    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
-    os.makedirs(data_dir, exist_ok=True)
+class MonthlyRollup(Base):
+    # Per-month, per-category totals kept in step with transactions (see app/rollups.py)
+    __tablename__ = 'monthly_rollups'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MonthlyRollup(user_id={self.user_id}, period={self.year}-{self.month:02d}, total={self.total})>"
+
+
+class DataVersion(Base):
+    # Counter bumped by every write to a user's data, used to key cached reports (see app/cache.py)
+    __tablename__ = 'data_versions'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion(user_id={self.user_id}, version={self.version})>"
+
+
+# Engine settings, override with configure() before the first query
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'budget.db')
+
+# SQLite PRAGMAs set on every new connection. All profiles use WAL, so report reads
+# don't block writes and writes don't block reads (the journal mode is stored in the
+# database file, switching it back and forth between processes would be worse).
+#   safe:      every commit synced to disk
+#   fast:      sync at checkpoints only; a power cut can lose the last commits but
+#              never corrupts the database (the default)
+#   bulk-load: no syncing and big caches, for imports and batch jobs you can rerun
+PRAGMA_PROFILES = {
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,  # negative = KiB, so 16 MB
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,  # ms to wait for a lock before "database is locked"
+    },
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    'bulk-load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -256000,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000,
+    },
+}
+
+ENGINE_OPTIONS = {
+    'db_url': os.environ.get('BUDGET_DB_URL'),
+    'pool_size': int(os.environ.get('BUDGET_DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('BUDGET_DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': 30,
+    'pool_recycle': -1,
+    'echo': False,
+    # a PRAGMA_PROFILES name, or None to leave SQLite's defaults alone
+    'pragma_profile': os.environ.get('BUDGET_DB_PRAGMAS', 'fast'),
+    # individual PRAGMAs overriding the profile, e.g. {'cache_size': -200000}
+    'pragmas': None,
+}
+
+_engine = None
+_Session = None
+_engine_lock = threading.Lock()
+
+
+def configure(**options):
+    """Change engine options (db_url, pool_size, ...). Drops the current engine if one exists."""
+    unknown = set(options) - set(ENGINE_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown engine options: {', '.join(sorted(unknown))}")
+
+    profile = options.get('pragma_profile')
+    if profile is not None and profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown pragma profile: {profile}")
+
+    if options.get('db_url'):
+        check_db_url(options['db_url'])
+
+    ENGINE_OPTIONS.update(options)
+    dispose_engine()
+
 
-    # Create engine
-    db_path = os.path.join(data_dir, 'budget.db')
-    engine = create_engine(f'sqlite:///{db_path}')
+def connection_pragmas():
+    # The PRAGMAs new connections get with the current options
+    pragmas = dict(PRAGMA_PROFILES.get(ENGINE_OPTIONS['pragma_profile']) or {})
+    pragmas.update(ENGINE_OPTIONS['pragmas'] or {})
+    return pragmas
+
+
+def _apply_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def check_db_url(db_url):
+    """
+    Raise ValueError unless db_url is an SQLite database file opened with the standard
+    sqlite3 driver. The writer thread (app/writer.py) turns off sqlite3's own transaction
+    handling to issue BEGIN IMMEDIATE itself, and it has a connection of its own, which
+    for an in-memory database would be a different, empty database.
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() != 'sqlite' or url.get_driver_name() != 'pysqlite':
+        raise ValueError(f"Unsupported database URL {db_url!r}: only SQLite files "
+                         f"(sqlite:///path/to/file.db) are supported")
+    database = url.database or ''
+    if database in ('', ':memory:') or 'mode=memory' in database or url.query.get('mode') == 'memory':
+        raise ValueError(f"Unsupported database URL {db_url!r}: in-memory SQLite databases can't be used, "
+                         f"the writer thread's connection wouldn't see them; use a (temporary) file")
+
+
+def _create_engine():
+    db_url = ENGINE_OPTIONS['db_url']
+    if not db_url:
+        # Ensure the data directory exists
+        os.makedirs(os.path.dirname(DEFAULT_DB_PATH), exist_ok=True)
+        db_url = f'sqlite:///{DEFAULT_DB_PATH}'
+    # BUDGET_DB_URL doesn't go through configure()
+    check_db_url(db_url)
+
+    engine = create_engine(
+        db_url,
+        echo=ENGINE_OPTIONS['echo'],
+        poolclass=QueuePool,
+        pool_size=ENGINE_OPTIONS['pool_size'],
+        max_overflow=ENGINE_OPTIONS['max_overflow'],
+        pool_timeout=ENGINE_OPTIONS['pool_timeout'],
+        pool_recycle=ENGINE_OPTIONS['pool_recycle'],
+    )
+    if engine.dialect.name == 'sqlite':
+        _apply_pragmas(engine, connection_pragmas())
 
     # Create tables
+    new_rollups = not inspect(engine).has_table(MonthlyRollup.__tablename__)
     Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+
+    if new_rollups:
+        # databases from before the rollup table need it filled once
+        from app.rollups import rebuild_rollups
+        rebuild_rollups(engine=engine)
+
+    if engine.dialect.name == 'sqlite':
+        from app.search import create_search_index
+        create_search_index(engine)
 
     return engine
 
 
-# Create a session factory
+def upgrade_schema(engine):
+    # create_all skips existing tables, so indexes added later need their own pass
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def get_engine():
+    """Process-wide engine, created on first use"""
+    global _engine, _Session
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _create_engine()
+                # objects stay usable after the session is closed, like before
+                _Session = sessionmaker(bind=engine, expire_on_commit=False)
+                _engine = engine
+
+    return _engine
+
+
+def dispose_engine():
+    # Close pooled connections, next get_engine() builds a fresh engine
+    global _engine, _Session
+
+    # the search indexer queues writes, then the writer thread holds a connection of its own
+    from app.search import close_indexer
+    from app.writer import close_writer
+    close_indexer()
+    close_writer()
+
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _Session = None
+
+
+def init_db():
+    """init_db, creating tables if they don't exist"""
+    return get_engine()
+
+
 def get_session():
-    engine = init_db()
-    Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    get_engine()
+    return _Session()
+
+
+@contextmanager
+def session_scope():
+    """Session that commits on success, rolls back on error and is always closed"""
+    session = get_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,331 @@
+"""
+Field-level encryption for text stored in the database (transaction descriptions and
+goal names).
+
+Columns declared as EncryptedText are encrypted when written and decrypted when read,
+for ORM objects and Core selects alike. Each value is stored as
+
+    enc1:<base64 of key id (4 bytes) + nonce (8 bytes) + ciphertext>
+
+where the ciphertext is the UTF-8 text XORed with a SHAKE-256 keystream of the key and a
+random per-value nonce, so equal descriptions don't give equal ciphertexts. The XOR is
+done on the whole buffer as one big integer rather than byte by byte, and
+encrypt_many/decrypt_many do it once for a whole list of values (bulk inserts, pages of
+rows). Values without the prefix are plaintext from before encryption and read as is.
+
+The key comes from BUDGET_ENCRYPTION_KEY. After changing it, list the old key(s) in
+BUDGET_RETIRED_ENCRYPTION_KEYS (comma separated) and run the re-encryption job, which
+also encrypts plaintext rows from older databases and rebuilds the search index
+(app/search.py) with the new key:
+
+    python -m app.encryption --status
+    python -m app.encryption --reencrypt [--batch-size N]
+
+Like the rest of the app this keeps casual readers of the database file out, it is not
+a substitute for proper key management.
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import os
+import threading
+
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+PREFIX = "enc1:"
+KEY_ID_SIZE = 4
+NONCE_SIZE = 8
+
+# Rows read and rewritten per write by reencrypt()
+REENCRYPT_BATCH_SIZE = 2000
+
+# the key the app has always used, for when none is configured
+DEFAULT_KEY = b'ThisIsA16ByteKey'
+
+
+def key_id(key):
+    return hashlib.sha256(key).digest()[:KEY_ID_SIZE]
+
+
+def xor_bytes(data, stream):
+    # data XOR stream (same length) in one operation on the whole buffer
+    size = len(data)
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(stream, 'little')).to_bytes(size, 'little')
+
+
+def repeat_key(key, size):
+    # key cycled to size bytes
+    return (key * (size // len(key) + 1))[:size]
+
+
+class FieldCipher:
+    """Encrypts and decrypts stored values with key, reading retired_keys' values too."""
+
+    def __init__(self, key, retired_keys=()):
+        self.key = key
+        self.retired_keys = list(retired_keys)
+        self.key_id = key_id(key)
+        # SHAKE-256 already fed with each key, copied per value instead of rehashing the key
+        self._keys = {key_id(k): hashlib.shake_256(k) for k in retired_keys}
+        self._keys[self.key_id] = self._hash = hashlib.shake_256(key)
+
+    def is_current(self, value):
+        # True if value is encrypted with the current key (nothing to re-encrypt)
+        if not value:
+            return True
+        if not value.startswith(PREFIX):
+            return False
+        try:
+            return base64.b64decode(value[len(PREFIX):len(PREFIX) + 8])[:KEY_ID_SIZE] == self.key_id
+        except (binascii.Error, ValueError):
+            return False
+
+    def encrypt(self, value):
+        return self.encrypt_many([value])[0]
+
+    def decrypt(self, value):
+        return self.decrypt_many([value])[0]
+
+    def encrypt_many(self, values):
+        """Encrypted form of each value (None and "" stay as they are), XORing all of them at once."""
+        plain = [None if value is None else str(value).encode('utf-8') for value in values]
+        random = os.urandom(NONCE_SIZE * len(plain))
+        nonces = [random[index:index + NONCE_SIZE] for index in range(0, len(random), NONCE_SIZE)]
+
+        # bound methods and locals, this runs once per row of a bulk insert
+        new_stream = self._hash.copy
+        streams = []
+        for data, nonce in zip(plain, nonces):
+            if data:
+                stream = new_stream()
+                stream.update(nonce)
+                streams.append(stream.digest(len(data)))
+        encrypted = xor_bytes(b''.join([data for data in plain if data]), b''.join(streams))
+
+        result = []
+        position = 0
+        header = self.key_id
+        b64encode = binascii.b2a_base64
+        for data, nonce in zip(plain, nonces):
+            if not data:
+                # None and "" have nothing to hide
+                result.append(None if data is None else "")
+                continue
+            end = position + len(data)
+            result.append(PREFIX + b64encode(header + nonce + encrypted[position:end], newline=False).decode('ascii'))
+            position = end
+        return result
+
+    def decrypt_many(self, values):
+        """Plaintext of each stored value; unencrypted (older) values are returned as they are."""
+        header = KEY_ID_SIZE + NONCE_SIZE
+        parts = []
+        streams = []
+        for value in values:
+            if value is None or not value.startswith(PREFIX):
+                parts.append(None)
+                continue
+            raw = base64.b64decode(value[len(PREFIX):])
+            key_hash = self._keys.get(raw[:KEY_ID_SIZE])
+            if key_hash is None:
+                raise ValueError("Value encrypted with an unknown key (is BUDGET_ENCRYPTION_KEY right?)")
+            ciphertext = raw[header:]
+            parts.append(ciphertext)
+            if ciphertext:
+                stream = key_hash.copy()
+                stream.update(raw[KEY_ID_SIZE:header])
+                streams.append(stream.digest(len(ciphertext)))
+        decrypted = xor_bytes(b''.join(part for part in parts if part), b''.join(streams))
+
+        result = []
+        position = 0
+        for value, part in zip(values, parts):
+            if part is None:
+                result.append(value)
+                continue
+            result.append(decrypted[position:position + len(part)].decode('utf-8'))
+            position += len(part)
+        return result
+
+
+def _env_key(name):
+    value = os.environ.get(name)
+    return value.encode('utf-8') if value else None
+
+
+_cipher = None
+_cipher_lock = threading.Lock()
+
+
+def configure_keys(key, retired_keys=()):
+    """Use key for new values (and re-encryption), still reading values of retired_keys."""
+    global _cipher
+    with _cipher_lock:
+        _cipher = FieldCipher(key, [k for k in retired_keys if k and k != key])
+
+
+def get_cipher():
+    global _cipher
+
+    if _cipher is None:
+        retired = os.environ.get('BUDGET_RETIRED_ENCRYPTION_KEYS', '')
+        retired = [k.encode('utf-8') for k in retired.split(',') if k]
+        key = _env_key('BUDGET_ENCRYPTION_KEY') or DEFAULT_KEY
+        with _cipher_lock:
+            if _cipher is None:
+                # values written with the default key stay readable after setting one
+                _cipher = FieldCipher(key, retired + [DEFAULT_KEY])
+
+    return _cipher
+
+
+def encrypt_many(values):
+    return get_cipher().encrypt_many(values)
+
+
+def decrypt_many(values):
+    return get_cipher().decrypt_many(values)
+
+
+class EncryptedText(TypeDecorator):
+    """String column stored encrypted, see the module docstring."""
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return get_cipher().encrypt(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return get_cipher().decrypt(value)
+
+
+def _encrypted_columns():
+    from app.database import Goal, Transaction
+    return [Transaction.description, Goal.name]
+
+
+def raw(column):
+    # An EncryptedText column as stored, without decrypting (for decrypt_many on whole pages)
+    return type_coerce(column, String)
+
+
+def encryption_status(engine=None):
+    """{'table.column': {'current': n, 'other_key': n, 'plaintext': n}} for the encrypted columns."""
+    from app.database import get_engine
+
+    engine = engine or get_engine()
+    cipher = get_cipher()
+    status = {}
+    with engine.connect() as conn:
+        for column in _encrypted_columns():
+            counts = {'current': 0, 'other_key': 0, 'plaintext': 0}
+            for (value,) in conn.execute(select(raw(column))).yield_per(REENCRYPT_BATCH_SIZE):
+                if cipher.is_current(value):
+                    counts['current'] += 1
+                elif value.startswith(PREFIX):
+                    counts['other_key'] += 1
+                else:
+                    counts['plaintext'] += 1
+            status[f"{column.table.name}.{column.name}"] = counts
+    return status
+
+
+def reencrypt(batch_size=REENCRYPT_BATCH_SIZE, progress=None):
+    """
+    Encrypt plaintext values and re-encrypt values of retired keys with the current key,
+    in one pass over each encrypted column. Rows are read batch_size at a time in id
+    order and rewritten by the writer thread while the next batch is read, so memory
+    stays flat however big the database is and the app can keep running. Safe to stop
+    and rerun. The search index, keyed with the same key, is rebuilt at the end.
+    Returns the number of values rewritten; progress, if given, is called as
+    progress(column_name, rows_scanned, rows_rewritten).
+    """
+    from app.database import get_engine
+    from app.writer import submit_write
+
+    cipher = get_cipher()
+    rewritten = 0
+    for column in _encrypted_columns():
+        table = column.table
+        name = f"{table.name}.{column.name}"
+        # only rewrite what was read, in case the row changed in the meantime
+        sql = (f"UPDATE {table.name} SET {column.name} = ? "
+               f"WHERE id = ? AND {column.name} IS ?")
+
+        scanned = 0
+        pending = None
+        last_id = 0
+        while True:
+            query = (select(table.c.id, raw(column)).where(table.c.id > last_id)
+                     .order_by(table.c.id).limit(batch_size))
+            with get_engine().connect() as conn:
+                rows = conn.execute(query).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            stale = [(row_id, value) for row_id, value in rows if not cipher.is_current(value)]
+            if stale:
+                values = cipher.encrypt_many(cipher.decrypt_many([value for _, value in stale]))
+                params = [(new, row_id, old) for new, (row_id, old) in zip(values, stale)]
+                rewritten += _wait(pending)
+                pending = submit_write(_rewrite, sql, params)
+
+            if progress:
+                progress(name, scanned, rewritten)
+
+        rewritten += _wait(pending)
+        if progress:
+            progress(name, scanned, rewritten)
+
+    if get_engine().dialect.name == 'sqlite':
+        from app.search import rebuild_search_index
+        rebuild_search_index()
+
+    return rewritten
+
+
+def _rewrite(session, sql, params):
+    session.connection().exec_driver_sql(sql, params)
+    return len(params)
+
+
+def _wait(pending):
+    return 0 if pending is None else pending.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encrypt or re-encrypt stored descriptions and goal names")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--status', action='store_true', help="count values per key / still in plaintext")
+    action.add_argument('--reencrypt', action='store_true',
+                        help="encrypt plaintext values and move retired keys' values to the current key")
+    parser.add_argument('--batch-size', type=int, default=REENCRYPT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from app.database import dispose_engine
+
+    if args.reencrypt:
+        def show_progress(name, scanned, rewritten):
+            print(f"\r{name}: {scanned:,} rows scanned, {rewritten:,} rewritten in total", end="", flush=True)
+
+        rewritten = reencrypt(args.batch_size, progress=show_progress)
+        print(f"\nRe-encryption done: {rewritten:,} values rewritten")
+
+    for name, counts in encryption_status().items():
+        print(f"{name}: {counts['current']:,} current key, {counts['other_key']:,} retired key, "
+              f"{counts['plaintext']:,} plaintext")
+
+    dispose_engine()
+
+
+if __name__ == '__main__':
+    main()
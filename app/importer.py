@@ -0,0 +1,334 @@
+"""
+Streaming importer for bank statement exports (CSV and OFX).
+
+The import is a generator pipeline, so only one batch of rows is held in memory
+at a time no matter how large the file is:
+
+    read_csv_records / read_ofx_records -> parse_records -> map_categories -> add_transactions
+
+Command line:
+
+    python -m app.importer --username alice statement.csv
+    python -m app.importer --user-id 3 --format ofx --batch-size 20000 export.ofx
+"""
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+
+from app.budget import add_transactions, get_categories, BULK_BATCH_SIZE
+from app.database import PRAGMA_PROFILES, configure
+from app.search import wait_for_index
+from app.utils import validate_amount, validate_date
+
+# Header names recognised in CSV exports (compared lower-cased)
+CSV_COLUMNS = {
+    'date': ['date', 'transaction date', 'posting date', 'posted', 'booking date'],
+    'amount': ['amount', 'value', 'sum'],
+    'description': ['description', 'memo', 'payee', 'name', 'details', 'narrative'],
+    'category': ['category'],
+    'type': ['type', 'transaction type'],
+}
+
+# Categories used when a row doesn't name one of the user's categories
+DEFAULT_INCOME_CATEGORY = "Other Income"
+DEFAULT_EXPENSE_CATEGORY = "Miscellaneous"
+
+# Keep only the first errors, a broken file shouldn't grow memory
+MAX_REPORTED_ERRORS = 100
+
+OFX_CHUNK_SIZE = 64 * 1024
+
+_COMPACT_DATE = re.compile(r'^(\d{4})(\d{2})(\d{2})(?![-/.])')
+_DATE_SEPARATORS = re.compile(r'[-/.\s]')
+
+
+class ImportFileError(Exception):
+    # The file as a whole can't be imported (unknown format, missing columns)
+    pass
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.ofx', '.qfx'):
+        return 'ofx'
+    if extension in ('.csv', '.txt'):
+        return 'csv'
+    raise ImportFileError(f"Unsupported file type: {extension or path}")
+
+
+def read_csv_records(stream):
+    # yields (line_number, {field: text}) using the CSV_COLUMNS aliases
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        raise ImportFileError("CSV file is empty")
+
+    positions = {}
+    lowered = [name.strip().lower() for name in header]
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in lowered:
+                positions[field] = lowered.index(alias)
+                break
+
+    missing = [field for field in ('date', 'amount') if field not in positions]
+    if missing:
+        raise ImportFileError(f"CSV file has no {' or '.join(missing)} column")
+
+    for values in reader:
+        if not any(values):
+            continue
+        record = {field: values[pos] if pos < len(values) else "" for field, pos in positions.items()}
+        yield reader.line_num, record
+
+
+def _ofx_tokens(stream):
+    # (tag, value) pairs from SGML or XML OFX, read in fixed-size chunks
+    buffer = ""
+    while True:
+        chunk = stream.read(OFX_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        parts = buffer.split('<')
+        # the last part may be cut mid-tag, keep it for the next chunk
+        buffer = parts.pop()
+        for part in parts:
+            if '>' in part:
+                tag, _, value = part.partition('>')
+                yield tag.strip().upper(), value.strip()
+
+    if '>' in buffer:
+        tag, _, value = buffer.partition('>')
+        yield tag.strip().upper(), value.strip()
+
+
+def read_ofx_records(stream):
+    # yields (transaction_number, {field: text}) for every <STMTTRN> block
+    record = None
+    number = 0
+
+    for tag, value in _ofx_tokens(stream):
+        if tag == 'STMTTRN':
+            record = {}
+        elif tag == '/STMTTRN' and record is not None:
+            number += 1
+            description = record.get('NAME') or record.get('MEMO') or ""
+            if record.get('NAME') and record.get('MEMO') and record['MEMO'] != record['NAME']:
+                description = f"{record['NAME']} - {record['MEMO']}"
+            yield number, {
+                'date': record.get('DTPOSTED', ""),
+                'amount': record.get('TRNAMT', ""),
+                'description': description,
+            }
+            record = None
+        elif record is not None and not tag.startswith('/'):
+            record[tag] = value
+
+
+def _split_date(text, date_order):
+    # "2024-03-05", "05/03/2024", "20240305120000[-5:EST]" -> (year, month, day) ints
+    text = text.strip()
+    compact = _COMPACT_DATE.match(text)
+    if compact:
+        return int(compact.group(1)), int(compact.group(2)), int(compact.group(3))
+
+    parts = _DATE_SEPARATORS.split(text)[:3]
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+
+    values = dict(zip(date_order, (int(part) for part in parts)))
+    return values['y'], values['m'], values['d']
+
+
+def parse_records(records, date_order='ymd'):
+    """
+    Turn raw text records into transaction values using the same rules as the form
+    (validate_amount / validate_date). Yields (line, values, error) where exactly one of
+    values and error is set. The sign of the amount (or a 'type' column) decides income.
+    """
+    for line, record in records:
+        amount_text = record.get('amount', "").strip()
+        # "-12.50", "$-12.50" and "(12.50)" are all outgoing
+        negative = '-' in amount_text or (amount_text.startswith('(') and amount_text.endswith(')'))
+        valid, amount = validate_amount(amount_text.replace('-', '').strip('()+ '))
+        if not valid:
+            yield line, None, amount
+            continue
+
+        date_parts = _split_date(record.get('date', ""), date_order)
+        if not date_parts:
+            yield line, None, "Invalid date"
+            continue
+        valid, date = validate_date(*date_parts)
+        if not valid:
+            yield line, None, date
+            continue
+
+        type_text = record.get('type', "").strip().lower()
+        if type_text in ('income', 'credit', 'cr'):
+            is_income = True
+        elif type_text in ('expense', 'debit', 'dr'):
+            is_income = False
+        else:
+            is_income = not negative
+
+        yield line, {
+            'amount': amount,
+            'date': date,
+            'description': record.get('description', "").strip(),
+            'category': record.get('category', "").strip(),
+            'is_income': is_income,
+        }, None
+
+
+def map_categories(parsed, user_id):
+    # Resolve category names to the user's category ids, falling back to the defaults
+    categories = {}
+    for category in get_categories(user_id):
+        categories[(category.name.lower(), category.is_income)] = category.id
+
+    fallback = {
+        True: categories.get((DEFAULT_INCOME_CATEGORY.lower(), True)),
+        False: categories.get((DEFAULT_EXPENSE_CATEGORY.lower(), False)),
+    }
+
+    for line, values, error in parsed:
+        if error:
+            yield line, None, error
+            continue
+
+        is_income = values['is_income']
+        category_id = categories.get((values['category'].lower(), is_income)) or fallback[is_income]
+        if not category_id:
+            yield line, None, "No matching category"
+            continue
+
+        yield line, {
+            'amount': values['amount'],
+            'date': values['date'],
+            'description': values['description'],
+            'category_id': category_id,
+        }, None
+
+
+def import_statement(user_id, path, file_format=None, date_order='ymd', batch_size=BULK_BATCH_SIZE,
+                     progress=None):
+    """
+    Stream a CSV or OFX statement into the user's transactions.
+
+    progress, if given, is called as progress(bytes_read, total_bytes, rows_imported)
+    after every batch. Returns a dict with 'imported', 'rejected' and 'errors'
+    (the first MAX_REPORTED_ERRORS (line, message) pairs).
+    """
+    file_format = file_format or detect_format(path)
+    if file_format not in ('csv', 'ofx'):
+        raise ImportFileError(f"Unsupported format: {file_format}")
+
+    total_bytes = os.path.getsize(path)
+    imported = 0
+    rejected = 0
+    errors = []
+
+    def reject(line, message):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append((line, message))
+
+    def flush(batch, lines):
+        nonlocal imported
+        saved, batch_errors = add_transactions(user_id, batch, batch_size=len(batch))
+        imported += saved
+        for index, message in batch_errors:
+            reject(lines[index], message)
+        if progress:
+            progress(raw.tell(), total_bytes, imported)
+
+    with open(path, 'rb') as raw:
+        if file_format == 'csv':
+            stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+            records = read_csv_records(stream)
+        else:
+            stream = io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+            records = read_ofx_records(stream)
+
+        batch = []
+        lines = []
+        for line, values, error in map_categories(parse_records(records, date_order), user_id):
+            if error:
+                reject(line, error)
+                continue
+
+            batch.append(values)
+            lines.append(line)
+            if len(batch) >= batch_size:
+                flush(batch, lines)
+                batch = []
+                lines = []
+
+        if batch:
+            flush(batch, lines)
+
+        if progress:
+            progress(total_bytes, total_bytes, imported)
+
+    return {'imported': imported, 'rejected': rejected, 'errors': errors}
+
+
+def _find_user_id(username):
+    from app.database import User, session_scope
+
+    with session_scope() as session:
+        user = session.query(User).filter_by(username=username).first()
+        return user.id if user else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a CSV or OFX bank statement")
+    parser.add_argument('path', help="statement file")
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument('--username')
+    who.add_argument('--user-id', type=int)
+    parser.add_argument('--format', choices=['csv', 'ofx'], help="default: from the file extension")
+    parser.add_argument('--date-order', choices=['ymd', 'dmy', 'mdy'], default='ymd',
+                        help="field order of separated dates in CSV files")
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--pragma-profile', choices=sorted(PRAGMA_PROFILES),
+                        help="SQLite PRAGMA profile for this import, e.g. bulk-load for very large files")
+    args = parser.parse_args(argv)
+
+    if args.pragma_profile:
+        configure(pragma_profile=args.pragma_profile)
+
+    user_id = args.user_id or _find_user_id(args.username)
+    if not user_id:
+        print(f"Unknown user: {args.username}")
+        return 1
+
+    def show_progress(done, total, rows):
+        percent = done * 100 / total if total else 100
+        sys.stderr.write(f"\r{percent:5.1f}%  {done / 1e6:,.1f}/{total / 1e6:,.1f} MB  {rows:,} rows")
+        sys.stderr.flush()
+
+    try:
+        result = import_statement(user_id, args.path, args.format, args.date_order, args.batch_size,
+                                  progress=show_progress)
+    except (ImportFileError, OSError) as e:
+        print(f"Import failed: {str(e)}")
+        return 1
+
+    sys.stderr.write("\n")
+    for line, message in result['errors']:
+        print(f"line {line}: {message}")
+    print(f"Imported {result['imported']} transactions, rejected {result['rejected']} rows")
+    # make them searchable before exiting, else that waits for the next start
+    wait_for_index()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Opt-in query instrumentation: which API call ran which SQL statements, and how long it took.
+
+Turn it on with BUDGET_PROFILE_QUERIES=1, `python main.py --profile-queries` or enable().
+It listens to SQLAlchemy's cursor events and charges every statement to the public API
+functions marked with @track_queries that are running on that thread (nested calls
+count for each level, like cumulative time in a profiler). Write jobs run on the writer
+thread but are charged to the call that queued them when the job is done, also when
+that call has already returned (the *_async writers).
+
+For each function it keeps the number of calls and statements, total and p95 call time
+and the time spent in the database. The same statement run many times within a single
+call is reported as a probable N+1 pattern (a query in a loop that should be one query).
+
+    print(summary())   # also printed at exit, and from the UI's "Query Stats" button
+
+Disabled, @track_queries costs one global lookup per call and no events are registered.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# The same statement this many times within one call is flagged as N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+# Call durations kept per function for the p95
+MAX_SAMPLES = 10000
+
+UNTRACKED = "(untracked)"
+
+_enabled = False
+_exit_hook = False
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}
+_suspects = {}
+
+
+class FunctionStats:
+    def __init__(self):
+        self.calls = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.total_time = 0.0
+        self.durations = deque(maxlen=MAX_SAMPLES)
+
+    def p95(self):
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class _Call:
+    # One running call of a tracked function, or the statements of one write job.
+    # The writer thread adds to calls of other threads, hence the lock.
+    __slots__ = ('name', 'statements', 'db_time', 'seen', 'recorded', 'lock')
+
+    def __init__(self, name):
+        self.name = name
+        self.statements = 0
+        self.db_time = 0.0
+        self.seen = Counter()
+        self.recorded = False
+        self.lock = threading.Lock()
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(report_at_exit=True):
+    global _enabled, _exit_hook
+
+    if not _enabled:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _enabled = True
+
+    if report_at_exit and not _exit_hook:
+        atexit.register(lambda: _enabled and print(summary()))
+        _exit_hook = True
+
+
+def disable():
+    global _enabled
+
+    if _enabled:
+        event.remove(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _enabled = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _suspects.clear()
+
+
+def track_queries(func):
+    # Charge the statements run during func (and its time) to func's name
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        call = _Call(name)
+        stack = _stack()
+        stack.append(call)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+            _record(call, time.perf_counter() - started)
+
+    return wrapper
+
+
+def current_calls():
+    # The tracked calls running on this thread, for handing work to another thread
+    if not _enabled:
+        return None
+    return tuple(_stack()) or None
+
+
+def collector(calls):
+    # Where the statements of a job queued by calls (from current_calls()) are counted
+    # until charge(); None if there is nothing to charge them to
+    if not calls:
+        return None
+    return _Call(None)
+
+
+@contextmanager
+def attributed_to(job):
+    # Count statements run inside the block (on another thread) in job, from collector()
+    if job is None:
+        yield
+        return
+
+    stack = _stack()
+    saved = stack[:]
+    stack[:] = [job]
+    try:
+        yield
+    finally:
+        stack[:] = saved
+
+
+def charge(calls, job):
+    # Add job's statements to calls once it's done: to the call itself while it runs,
+    # to its function's totals if it has returned in the meantime
+    if job is None:
+        return
+
+    for call in calls:
+        with call.lock:
+            if not call.recorded:
+                call.statements += job.statements
+                call.db_time += job.db_time
+                call.seen.update(job.seen)
+                continue
+
+        with _lock:
+            stats = _stats.setdefault(call.name, FunctionStats())
+            stats.statements += job.statements
+            stats.db_time += job.db_time
+            _flag_repeats(call.name, job.seen)
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+
+    stack = _stack()
+    if not stack:
+        with _lock:
+            stats = _stats.setdefault(UNTRACKED, FunctionStats())
+            stats.statements += 1
+            stats.db_time += elapsed
+        return
+
+    for call in stack:
+        with call.lock:
+            call.statements += 1
+            call.db_time += elapsed
+            call.seen[statement] += 1
+
+
+def _record(call, elapsed):
+    # after this, writes still running for call go to the totals (see charge())
+    with call.lock:
+        call.recorded = True
+
+    with _lock:
+        stats = _stats.setdefault(call.name, FunctionStats())
+        stats.calls += 1
+        stats.statements += call.statements
+        stats.db_time += call.db_time
+        stats.total_time += elapsed
+        stats.durations.append(elapsed)
+        _flag_repeats(call.name, call.seen)
+
+
+def _flag_repeats(name, seen):
+    # Called with _lock held
+    for statement, count in seen.items():
+        if count >= N_PLUS_ONE_THRESHOLD:
+            key = (name, statement)
+            _suspects[key] = max(_suspects.get(key, 0), count)
+
+
+def snapshot():
+    # ({function: FunctionStats}, {(function, statement): most repeats in one call}), copies
+    with _lock:
+        stats = {}
+        for name, source in _stats.items():
+            copy = FunctionStats()
+            copy.calls, copy.statements = source.calls, source.statements
+            copy.db_time, copy.total_time = source.db_time, source.total_time
+            copy.durations.extend(source.durations)
+            stats[name] = copy
+        return stats, dict(_suspects)
+
+
+def status_line():
+    # Short form for the status bar
+    stats, suspects = snapshot()
+    statements = sum(s.statements for s in stats.values())
+    db_time = sum(s.db_time for s in stats.values())
+    return f"{statements} SQL statements, {db_time * 1000:.0f} ms in the database, {len(suspects)} probable N+1"
+
+
+def summary():
+    stats, suspects = snapshot()
+    if not stats:
+        return "Query stats: no statements recorded"
+
+    lines = [
+        "Query stats per API function (times in ms, nested calls included in their callers)",
+        f"{'function':<42} {'calls':>6} {'stmts':>7} {'per call':>8} {'total':>9} {'p95':>8} {'db':>9}",
+    ]
+    for name, s in sorted(stats.items(), key=lambda item: -item[1].db_time):
+        if name == UNTRACKED:
+            continue
+        lines.append(f"{name:<42} {s.calls:>6} {s.statements:>7} {s.statements / s.calls:>8.1f} "
+                     f"{s.total_time * 1000:>9.1f} {s.p95() * 1000:>8.1f} {s.db_time * 1000:>9.1f}")
+    if UNTRACKED in stats:
+        s = stats[UNTRACKED]
+        lines.append(f"{UNTRACKED:<42} {'':>6} {s.statements:>7} {'':>8} {'':>9} {'':>8} {s.db_time * 1000:>9.1f}")
+
+    if suspects:
+        lines.append("")
+        lines.append(f"Probable N+1: the same statement {N_PLUS_ONE_THRESHOLD}+ times within one call")
+        for (name, statement), count in sorted(suspects.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name}: {count}x {' '.join(statement.split())[:120]}")
+
+    return "\n".join(lines)
+
+
+if os.environ.get('BUDGET_PROFILE_QUERIES', '').lower() in ('1', 'true', 'yes'):
+    enable()
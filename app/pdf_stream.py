@@ -0,0 +1,346 @@
+"""
+Minimal PDF writer that streams pages to disk as they are finished.
+
+FPDF keeps every page in memory until output(), which is fine for a one-page summary
+but not for a ledger of a million transactions. StreamingPDF writes each page as soon
+as it's done and only keeps the byte offsets of the objects, so memory stays flat
+however many pages there are. It covers what the exports need: Helvetica text, lines,
+shaded rectangles and PNG images. PDFDocument adds top-to-bottom layout on top of it:
+headings, text lines, images and tables whose header row repeats on every page.
+
+The file is written as <path>.part and renamed to path by close(), so an export that
+fails halfway leaves no truncated PDF behind. The standard fonts only have the WinAnsi
+(cp1252) characters: letters outside it lose their accents ("č" -> "c"), anything else
+becomes '?', and close() prints which characters were affected.
+"""
+import codecs
+import io
+import os
+import unicodedata
+import zlib
+from array import array
+
+# A4 in points
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+
+# name in the page resources, PDF base font, key in fpdf's width tables
+FONTS = {
+    False: ('F1', 'Helvetica', 'helvetica'),
+    True: ('F2', 'Helvetica-Bold', 'helveticaB'),
+}
+
+_CATALOG_ID = 1
+_PAGES_ID = 2
+_FONT_IDS = {False: 3, True: 4}
+
+
+def _winansi_fallback(error):
+    # Encoding error handler: letters WinAnsi lacks without their accents, '?' for the rest
+    replacement = []
+    for char in error.object[error.start:error.end]:
+        base = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+        try:
+            base.encode('cp1252')
+        except UnicodeEncodeError:
+            base = '?'
+        replacement.append(base or '?')
+    return ''.join(replacement), error.end
+
+
+codecs.register_error('winansi-fallback', _winansi_fallback)
+
+
+def _encode(text):
+    # Text as the WinAnsi bytes that end up on the page
+    return text.replace('\r', ' ').replace('\n', ' ').encode('cp1252', 'winansi-fallback')
+
+
+def _unencodable(text):
+    # The characters of text WinAnsi can't show as they are
+    missing = set()
+    for char in set(text):
+        try:
+            char.encode('cp1252')
+        except UnicodeEncodeError:
+            missing.add(char)
+    return missing
+
+
+def _escape(data):
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class StreamingPDF:
+    """
+    Page-at-a-time PDF writer. Coordinates are in points from the top-left corner.
+
+        with StreamingPDF(path) as pdf:
+            pdf.text(40, 60, "Hello")
+            pdf.new_page()
+            ...
+    """
+
+    def __init__(self, path, width=PAGE_WIDTH, height=PAGE_HEIGHT):
+        from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+
+        self.width = width
+        self.height = height
+        # glyph widths (1/1000 em) indexed by WinAnsi byte, so measuring text is a sum over its bytes
+        self.widths = {}
+        for bold, (_, _, key) in FONTS.items():
+            char_widths = CORE_FONTS_CHARWIDTHS[key]
+            self.widths[bold] = [char_widths.get(bytes([code]).decode('cp1252', 'replace'), 556)
+                                 for code in range(256)]
+
+        self.path = path
+        self.partial = path + '.part'
+        self.file = open(self.partial, 'wb')
+        # characters shown without accents or as '?', reported by close()
+        self.substituted = set()
+        # byte offset of every object, indexed by object number (0 is the free list head)
+        self.offsets = array('Q', [0] * (max(_FONT_IDS.values()) + 1))
+        self.page_ids = array('L')
+        self.content = []
+        self.images = {}
+
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        for bold, (_, base_font, _) in FONTS.items():
+            self._write_object(_FONT_IDS[bold], f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} "
+                                                f"/Encoding /WinAnsiEncoding >>".encode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.file.closed:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    @property
+    def page_count(self):
+        return len(self.page_ids) + 1
+
+    def text_width(self, text, size, bold=False):
+        return sum(map(self.widths[bold].__getitem__, _encode(text))) * size / 1000
+
+    def fit_text(self, text, width, size, bold=False):
+        # Cut text that doesn't fit in width, ending it with "..."
+        if self.text_width(text, size, bold) <= width:
+            return text
+        while text and self.text_width(text + "...", size, bold) > width:
+            text = text[:-1]
+        return text + "..."
+
+    def text(self, x, y, text, size=10, bold=False):
+        # y is the baseline
+        self.texts([(x, y, text)], size, bold)
+
+    def texts(self, items, size=10, bold=False):
+        # Several (x, y, text) in one font, as a single text object
+        parts = [b"BT /%s %.1f Tf" % (FONTS[bold][0].encode(), size)]
+        for x, y, text in items:
+            if not text.isascii():
+                self.substituted.update(_unencodable(text))
+            parts.append(b" 1 0 0 1 %.2f %.2f Tm (%s) Tj" % (x, self.height - y, _escape(_encode(text))))
+        parts.append(b" ET\n")
+        self.content.append(b"".join(parts))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.content.append(b"%.2f w %.2f %.2f m %.2f %.2f l S\n" % (
+            width, x1, self.height - y1, x2, self.height - y2))
+
+    def rect(self, x, y, w, h, gray=None, border=True):
+        # gray fills the rectangle (0 black .. 1 white)
+        box = b"%.2f %.2f %.2f %.2f re" % (x, self.height - y - h, w, h)
+        if gray is not None:
+            self.content.append(b"q %.2f g %s f Q\n" % (gray, box))
+        if border:
+            self.content.append(b"0.5 w %s S\n" % box)
+
+    def boxes(self, boxes):
+        # Outlines of several (x, y, w, h) rectangles in one path
+        self.content.append(b"0.5 w %s S\n" % b" ".join(
+            b"%.2f %.2f %.2f %.2f re" % (x, self.height - y - h, w, h) for x, y, w, h in boxes))
+
+    def image(self, png, x, y, w, h):
+        from PIL import Image
+
+        picture = Image.open(io.BytesIO(png)).convert('RGB')
+        data = zlib.compress(picture.tobytes())
+
+        object_id = self._new_object()
+        header = (f"<< /Type /XObject /Subtype /Image /Width {picture.width} /Height {picture.height} "
+                  f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>")
+        self._write_object(object_id, header.encode(), data)
+
+        name = f"Im{object_id}"
+        self.images[name] = object_id
+        self.content.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /%s Do Q\n" % (
+            w, h, x, self.height - y - h, name.encode()))
+
+    def new_page(self):
+        # Write out the current page and start an empty one
+        data = zlib.compress(b"".join(self.content))
+        content_id = self._new_object()
+        self._write_object(content_id, f"<< /Filter /FlateDecode /Length {len(data)} >>".encode(), data)
+
+        fonts = " ".join(f"/{name} {_FONT_IDS[bold]} 0 R" for bold, (name, _, _) in FONTS.items())
+        images = " ".join(f"/{name} {object_id} 0 R" for name, object_id in self.images.items())
+        page = (f"<< /Type /Page /Parent {_PAGES_ID} 0 R /MediaBox [0 0 {self.width:.2f} {self.height:.2f}] "
+                f"/Contents {content_id} 0 R /Resources << /Font << {fonts} >> /XObject << {images} >> >> >>")
+        page_id = self._new_object()
+        self._write_object(page_id, page.encode())
+        self.page_ids.append(page_id)
+
+        self.content = []
+        self.images = {}
+
+    def close(self):
+        self.new_page()
+
+        # Page tree, written in slices so the /Kids array is never built in one piece
+        self._start_object(_PAGES_ID)
+        self.file.write(b"<< /Type /Pages /Count %d /Kids [" % len(self.page_ids))
+        for start in range(0, len(self.page_ids), 1000):
+            self.file.write(b"".join(b"%d 0 R " % page_id for page_id in self.page_ids[start:start + 1000]))
+        self.file.write(b"] >>\nendobj\n")
+
+        self._write_object(_CATALOG_ID, f"<< /Type /Catalog /Pages {_PAGES_ID} 0 R >>".encode())
+
+        xref = self.file.tell()
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for start in range(1, len(self.offsets), 1000):
+            self.file.write(b"".join(b"%010d 00000 n \n" % offset for offset in self.offsets[start:start + 1000]))
+        self.file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(self.offsets), _CATALOG_ID, xref))
+        self.file.close()
+        os.replace(self.partial, self.path)
+
+        if self.substituted:
+            print(f"Warning: {self.path}: the PDF font can't show {''.join(sorted(self.substituted))!r}, "
+                  f"shown without accents or as '?'")
+
+    def discard(self):
+        # Stop writing and remove the unfinished file
+        self.file.close()
+        if os.path.exists(self.partial):
+            os.remove(self.partial)
+
+    def _new_object(self):
+        self.offsets.append(0)
+        return len(self.offsets) - 1
+
+    def _start_object(self, object_id):
+        self.offsets[object_id] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % object_id)
+
+    def _write_object(self, object_id, dictionary, stream=None):
+        self._start_object(object_id)
+        self.file.write(dictionary)
+        if stream is not None:
+            self.file.write(b"\nstream\n")
+            self.file.write(stream)
+            self.file.write(b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+
+class PDFDocument:
+    """
+    Flowing layout over StreamingPDF: each call places content below the previous one
+    and starts a new page when it doesn't fit.
+    """
+
+    def __init__(self, pdf, margin=40, footer=None):
+        self.pdf = pdf
+        self.margin = margin
+        self.footer = footer
+        self.y = margin
+        self.width = pdf.width - 2 * margin
+        self.bottom = pdf.height - margin
+
+    def ensure_space(self, height):
+        if self.y + height > self.bottom:
+            self.new_page()
+            return True
+        return False
+
+    def new_page(self):
+        if self.footer:
+            self.pdf.text(self.margin, self.pdf.height - self.margin / 2,
+                          f"{self.footer} - page {self.pdf.page_count}", size=8)
+        self.pdf.new_page()
+        self.y = self.margin
+
+    def close(self):
+        if self.footer:
+            self.pdf.text(self.margin, self.pdf.height - self.margin / 2,
+                          f"{self.footer} - page {self.pdf.page_count}", size=8)
+        self.pdf.close()
+
+    def heading(self, text, size=14):
+        self.ensure_space(size * 2)
+        self.y += size * 1.4
+        self.pdf.text(self.margin, self.y, text, size=size, bold=True)
+        self.y += size * 0.6
+
+    def text_line(self, text, size=11, bold=False):
+        self.ensure_space(size * 1.5)
+        self.y += size * 1.3
+        self.pdf.text(self.margin, self.y, text, size=size, bold=bold)
+        self.y += size * 0.2
+
+    def space(self, height):
+        self.y += height
+
+    def image(self, png, aspect):
+        # full width, height = width * aspect
+        height = self.width * aspect
+        self.ensure_space(height)
+        self.pdf.image(png, self.margin, self.y, self.width, height)
+        self.y += height
+
+    def table(self, columns, rows, row_height=16, size=9, align_right=()):
+        """
+        columns is a list of (heading, width) with widths summing to at most self.width,
+        rows any iterable of value tuples (a generator is fine, nothing is kept).
+        The header row is repeated at the top of every page. Returns the number of rows.
+        """
+        def header():
+            x = self.margin
+            for heading, width in columns:
+                self.pdf.rect(x, self.y, width, row_height, gray=0.85)
+                self.pdf.text(x + 3, self.y + row_height - 4.5, heading, size=size, bold=True)
+                x += width
+            self.y += row_height
+
+        self.ensure_space(row_height * 2)
+        header()
+
+        count = 0
+        for values in rows:
+            if self.ensure_space(row_height):
+                header()
+
+            # one path for the cell borders and one text object for the row
+            x = self.margin
+            baseline = self.y + row_height - 4.5
+            cells = []
+            texts = []
+            for index, ((_, width), value) in enumerate(zip(columns, values)):
+                text = self.pdf.fit_text(str(value), width - 6, size)
+                cells.append((x, self.y, width, row_height))
+                if index in align_right:
+                    texts.append((x + width - 3 - self.pdf.text_width(text, size), baseline, text))
+                else:
+                    texts.append((x + 3, baseline, text))
+                x += width
+            self.pdf.boxes(cells)
+            self.pdf.texts(texts, size)
+            self.y += row_height
+            count += 1
+
+        return count
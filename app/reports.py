@@ -1,18 +1,30 @@
 import os
 import datetime
 import calendar
-import matplotlib.pyplot as plt
-from fpdf import FPDF
-import io
 
-from app.budget import get_transactions, get_monthly_summary, get_categories, get_goals
+from app.cache import report_cache, get_data_version
+from app.instrumentation import track_queries
+from app.budget import (
+    count_transactions, get_transactions_page, get_monthly_summary, get_monthly_totals, get_categories, get_goals
+)
+
+# PDF export: rows per query while streaming transactions, and the ledger columns (points)
+PDF_FETCH_SIZE = 1000
+PDF_TRANSACTION_COLUMNS = [("Date", 65), ("Description", 200), ("Category", 110), ("Type", 60), ("Amount", 80)]
 
 
 class BudgetReport:
     def __init__(self, user_id):
         self.user_id = user_id
 
+    @track_queries
     def generate_monthly_report(self, year, month):
+        version = get_data_version(self.user_id)
+        key = (self.user_id, 'monthly', (year, month), version)
+        cached = report_cache.get(key)
+        if cached is not None:
+            return cached
+
         month_name = calendar.month_name[month]
 
         start_date = datetime.datetime(year, month, 1)
@@ -20,7 +32,8 @@ class BudgetReport:
         _, last_day = calendar.monthrange(year, month)
         end_date = datetime.datetime(year, month, last_day, 23, 59, 59)
 
-        transactions = get_transactions(self.user_id, start_date, end_date)
+        # the transactions themselves are paged from the DB by whoever shows or exports them
+        transaction_count = count_transactions(self.user_id, start_date, end_date)
 
         summary = get_monthly_summary(self.user_id, year, month)
 
@@ -29,25 +42,35 @@ class BudgetReport:
 
         goals = get_goals(self.user_id)
 
-        return {
+        report = {
             'title': f"Monthly Budget Report - {month_name} {year}",
             'period': f"{month_name} {year}",
-            'transactions': transactions,
+            'start_date': start_date,
+            'end_date': end_date,
+            'transaction_count': transaction_count,
             'summary': summary,
             'income_categories': income_categories,
             'expense_categories': expense_categories,
-            'goals': goals
+            'goals': goals,
+            'data_version': version
         }
+        report_cache.put(key, report)
 
+        return report
+
+    @track_queries
     def generate_yearly_report(self, year):
-        # Initialize monthly data
-        monthly_data = []
+        version = get_data_version(self.user_id)
+        key = (self.user_id, 'yearly', year, version)
+        cached = report_cache.get(key)
+        if cached is not None:
+            return cached
 
-        # Get data for each month
-        for month in range(1, 13):
-            summary = get_monthly_summary(self.user_id, year, month)
+        # All twelve months in one query
+        monthly_data = []
+        for summary in get_monthly_totals(self.user_id, year):
             monthly_data.append({
-                'month': calendar.month_name[month],
+                'month': calendar.month_name[summary['month']],
                 'income': summary['total_income'],
                 'expenses': summary['total_expenses'],
                 'net': summary['net']
@@ -60,180 +83,177 @@ class BudgetReport:
 
         goals = get_goals(self.user_id)
 
-        return {
+        report = {
             'title': f"Yearly Budget Report - {year}",
             'period': str(year),
+            'start_date': datetime.datetime(year, 1, 1),
+            'end_date': datetime.datetime(year, 12, 31, 23, 59, 59),
             'monthly_data': monthly_data,
             'yearly_income': yearly_income,
             'yearly_expenses': yearly_expenses,
             'yearly_net': yearly_net,
-            'goals': goals
+            'goals': goals,
+            'data_version': version
         }
+        report_cache.put(key, report)
+
+        return report
+
+    @track_queries
+    def compare_years(self, start_year, end_year):
+        # Per-year totals for a span of years, still a single query
+        yearly = {}
+        for summary in get_monthly_totals(self.user_id, start_year, 1, end_year, 12):
+            totals = yearly.setdefault(summary['year'], {'year': summary['year'], 'income': 0, 'expenses': 0})
+            totals['income'] += summary['total_income']
+            totals['expenses'] += summary['total_expenses']
+
+        for totals in yearly.values():
+            totals['net'] = totals['income'] - totals['expenses']
+
+        return list(yearly.values())
+
+    def export_to_pdf(self, report_data, output_path, progress=None):
+        # The report's summary, charts and goals followed by every transaction of its period
+        return self.export_transactions_pdf(output_path, report_data['start_date'], report_data['end_date'],
+                                            report_data=report_data, progress=progress)
+
+    def _iter_ledger(self, start_date=None, end_date=None):
+        # Oldest first, one keyset page per query; unlike budget.iter_transactions no read
+        # stays open for the whole (possibly long) export
+        after = None
+        while True:
+            rows, after = get_transactions_page(self.user_id, start_date, end_date, limit=PDF_FETCH_SIZE,
+                                                after=after, sort='date', descending=False)
+            yield from rows
+            if after is None:
+                break
+
+    def export_transactions_pdf(self, output_path, start_date=None, end_date=None, report_data=None,
+                                progress=None):
+        """
+        Write every transaction between start_date and end_date (None = open-ended, so
+        no dates is all time) to a PDF table, with the header repeated on each page.
+
+        Pages are written to disk as they fill up and transactions are read
+        PDF_FETCH_SIZE at a time, so memory use doesn't grow with the number of rows.
+        With report_data (a monthly or yearly report) its summary, charts and goals come
+        first. progress, if given, is called as progress(rows_written).
+        """
+        from app.pdf_stream import StreamingPDF, PDFDocument
+
+        if report_data:
+            title = report_data['title']
+            period = report_data['period']
+        else:
+            title = "Transactions"
+            if start_date or end_date:
+                first = start_date.strftime('%Y-%m-%d') if start_date else "start"
+                last = end_date.strftime('%Y-%m-%d') if end_date else "today"
+                period = f"{first} to {last}"
+            else:
+                period = "All time"
 
-    def export_to_pdf(self, report_data, output_path):
         try:
-            # Create PDF object
-            pdf = FPDF()
-            pdf.add_page()
+            with StreamingPDF(output_path) as pdf:
+                doc = PDFDocument(pdf, footer=title if report_data else f"{title} ({period})")
 
-            pdf.set_font("Arial", size=12)
+                doc.heading(title, size=16)
+                doc.text_line(f"Period: {period}", bold=True)
 
-            pdf.set_font("Arial", 'B', 16)
-            pdf.cell(200, 10, txt=report_data['title'], ln=True, align='C')
-            pdf.ln(10)
+                if report_data:
+                    self._write_report_pages(doc, report_data)
 
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(200, 10, txt=f"Period: {report_data['period']}", ln=True)
-            pdf.ln(5)
+                # Transactions
+                doc.heading("Transactions")
+                totals = {'rows': 0, 'income': 0.0, 'expenses': 0.0}
 
-            pdf.set_font("Arial", 'B', 14)
-            pdf.cell(200, 10, txt="Summary", ln=True)
-            pdf.ln(5)
+                def rows():
+                    for transaction in self._iter_ledger(start_date, end_date):
+                        amount = abs(transaction.amount)
+                        totals['income' if transaction.category_is_income else 'expenses'] += amount
+                        totals['rows'] += 1
+                        if progress and totals['rows'] % PDF_FETCH_SIZE == 0:
+                            progress(totals['rows'])
 
-            if 'summary' in report_data:  # Monthly report
-                pdf.set_font("Arial", size=12)
-                pdf.cell(100, 10, txt=f"Total Income: ${report_data['summary']['total_income']:.2f}", ln=True)
-                pdf.cell(100, 10, txt=f"Total Expenses: ${report_data['summary']['total_expenses']:.2f}", ln=True)
-                pdf.cell(100, 10, txt=f"Net: ${report_data['summary']['net']:.2f}", ln=True)
-                pdf.ln(5)
+                        yield (transaction.date.strftime('%Y-%m-%d'), transaction.description or "",
+                               transaction.category_name, "Income" if transaction.category_is_income else "Expense",
+                               f"${amount:.2f}")
 
-                # Transactions
-                if report_data['transactions']:
-                    pdf.set_font("Arial", 'B', 14)
-                    pdf.cell(200, 10, txt="Transactions", ln=True)
-                    pdf.ln(5)
-
-                    # Table header
-                    pdf.set_font("Arial", 'B', 12)
-                    pdf.cell(40, 10, txt="Date", border=1)
-                    pdf.cell(60, 10, txt="Description", border=1)
-                    pdf.cell(50, 10, txt="Category", border=1)
-                    pdf.cell(40, 10, txt="Amount", border=1, ln=True)
-
-                    # Table content
-                    pdf.set_font("Arial", size=10)
-                    for transaction in report_data['transactions'][:20]:  # Limit to 20 transactions
-                        pdf.cell(40, 10, txt=transaction.date.strftime('%Y-%m-%d'), border=1)
-                        pdf.cell(60, 10, txt=transaction.description or "", border=1)
-                        pdf.cell(50, 10, txt=transaction.category_name, border=1)
-                        pdf.cell(40, 10, txt=f"${transaction.amount:.2f}", border=1, ln=True)
-
-                    # Add note if there are more transactions
-                    if len(report_data['transactions']) > 20:
-                        pdf.cell(200, 10, txt="(Showing first 20 transactions)", ln=True, align='C')
-                    pdf.ln(10)
-            else:  # Yearly report
-                pdf.set_font("Arial", size=12)
-                pdf.cell(100, 10, txt=f"Yearly Income: ${report_data['yearly_income']:.2f}", ln=True)
-                pdf.cell(100, 10, txt=f"Yearly Expenses: ${report_data['yearly_expenses']:.2f}", ln=True)
-                pdf.cell(100, 10, txt=f"Yearly Net: ${report_data['yearly_net']:.2f}", ln=True)
-                pdf.ln(5)
-
-                # Monthly breakdown
-                pdf.set_font("Arial", 'B', 14)
-                pdf.cell(200, 10, txt="Monthly Breakdown", ln=True)
-                pdf.ln(5)
-
-                pdf.set_font("Arial", 'B', 12)
-                pdf.cell(50, 10, txt="Month", border=1)
-                pdf.cell(50, 10, txt="Income", border=1)
-                pdf.cell(50, 10, txt="Expenses", border=1)
-                pdf.cell(40, 10, txt="Net", border=1, ln=True)
-
-                pdf.set_font("Arial", size=10)
-                for month_data in report_data['monthly_data']:
-                    pdf.cell(50, 10, txt=month_data['month'], border=1)
-                    pdf.cell(50, 10, txt=f"${month_data['income']:.2f}", border=1)
-                    pdf.cell(50, 10, txt=f"${month_data['expenses']:.2f}", border=1)
-                    pdf.cell(40, 10, txt=f"${month_data['net']:.2f}", border=1, ln=True)
-                pdf.ln(10)
-
-            if report_data['goals']:
-                pdf.set_font("Arial", 'B', 14)
-                pdf.cell(200, 10, txt="Financial Goals", ln=True)
-                pdf.ln(5)
-
-                pdf.set_font("Arial", 'B', 12)
-                pdf.cell(70, 10, txt="Goal", border=1)
-                pdf.cell(40, 10, txt="Current", border=1)
-                pdf.cell(40, 10, txt="Target", border=1)
-                pdf.cell(40, 10, txt="Progress", border=1, ln=True)
-
-                pdf.set_font("Arial", size=10)
-                for goal in report_data['goals']:
-                    progress = (goal.current_amount / goal.target_amount) * 100 if goal.target_amount > 0 else 0
-                    pdf.cell(70, 10, txt=goal.name, border=1)
-                    pdf.cell(40, 10, txt=f"${goal.current_amount:.2f}", border=1)
-                    pdf.cell(40, 10, txt=f"${goal.target_amount:.2f}", border=1)
-                    pdf.cell(40, 10, txt=f"{progress:.1f}%", border=1, ln=True)
-
-            # Save PDF
-            pdf.output(output_path)
+                doc.table(PDF_TRANSACTION_COLUMNS, rows(), align_right=(4,))
 
+                doc.space(10)
+                doc.text_line(f"{totals['rows']} transactions", bold=True)
+                doc.text_line(f"Income: ${totals['income']:.2f}")
+                doc.text_line(f"Expenses: ${totals['expenses']:.2f}")
+                doc.text_line(f"Net: ${totals['income'] - totals['expenses']:.2f}")
+
+                doc.close()
+
+            if progress:
+                progress(totals['rows'])
             return True
 
         except Exception as e:
             print(f"Error exporting PDF: {str(e)}")
             return False
 
-    def generate_charts(self, report_data):
-        plt.figure(figsize=(10, 8))
+    def _write_report_pages(self, doc, report_data):
+        doc.heading("Summary")
 
-        # Income vs Expenses chart
         if 'summary' in report_data:  # Monthly report
-            # Pie chart
-            plt.subplot(2, 1, 1)
-            labels = []
-            sizes = []
-
-            for name, amount in report_data['summary'].get('category_breakdown', {}).items():
-                if amount > 0:
-                    labels.append(name)
-                    sizes.append(amount)
-
-            if sizes:
-                plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-                plt.axis('equal')
-                plt.title('Expense Breakdown')
-
-            # bar chart income vs expenses
-            plt.subplot(2, 1, 2)
-            plt.bar(['Income', 'Expenses'],
-                    [report_data['summary']['total_income'], report_data['summary']['total_expenses']])
-            plt.title('Income vs Expenses')
-            plt.ylabel('Amount ($)')
-
+            doc.text_line(f"Total Income: ${report_data['summary']['total_income']:.2f}")
+            doc.text_line(f"Total Expenses: ${report_data['summary']['total_expenses']:.2f}")
+            doc.text_line(f"Net: ${report_data['summary']['net']:.2f}")
         else:  # Yearly report
-            # Line chart
-            months = [data['month'][:3] for data in report_data['monthly_data']]  # Abbreviate month names
-            income = [data['income'] for data in report_data['monthly_data']]
-            expenses = [data['expenses'] for data in report_data['monthly_data']]
+            doc.text_line(f"Yearly Income: ${report_data['yearly_income']:.2f}")
+            doc.text_line(f"Yearly Expenses: ${report_data['yearly_expenses']:.2f}")
+            doc.text_line(f"Yearly Net: ${report_data['yearly_net']:.2f}")
+
+        # Charts, same figure as the Reports tab
+        from app.charts import REPORT_CHART_SIZE
+
+        doc.space(10)
+        width, height = REPORT_CHART_SIZE
+        doc.image(self.generate_charts(report_data), height / width)
+
+        if 'monthly_data' in report_data:
+            doc.heading("Monthly Breakdown")
+            doc.table([("Month", 130), ("Income", 130), ("Expenses", 130), ("Net", 125)],
+                      ((month_data['month'], f"${month_data['income']:.2f}", f"${month_data['expenses']:.2f}",
+                        f"${month_data['net']:.2f}") for month_data in report_data['monthly_data']),
+                      align_right=(1, 2, 3))
+
+        if report_data['goals']:
+            doc.heading("Financial Goals")
+            rows = []
+            for goal in report_data['goals']:
+                progress = (goal.current_amount / goal.target_amount) * 100 if goal.target_amount > 0 else 0
+                rows.append((goal.name, f"${goal.current_amount:.2f}", f"${goal.target_amount:.2f}",
+                             f"{progress:.1f}%"))
+            doc.table([("Goal", 215), ("Current", 100), ("Target", 100), ("Progress", 100)], rows,
+                      align_right=(1, 2, 3))
+
+        # the ledger starts on a page of its own
+        doc.new_page()
 
-            plt.subplot(2, 1, 1)
-            plt.plot(months, income, label='Income', marker='o')
-            plt.plot(months, expenses, label='Expenses', marker='o')
-            plt.title('Monthly Income and Expenses')
-            plt.legend()
-            plt.grid(True)
-
-            # Bar chart
-            plt.subplot(2, 1, 2)
-            plt.bar(['Income', 'Expenses'],
-                    [report_data['yearly_income'], report_data['yearly_expenses']])
-            plt.title('Yearly Income vs Expenses')
-            plt.ylabel('Amount ($)')
+    def generate_charts(self, report_data):
+        # Charts of a cached report are cached under the same data version
+        key = None
+        if 'data_version' in report_data:
+            key = (self.user_id, 'chart', report_data['title'], report_data['data_version'])
+            cached = report_cache.get(key)
+            if cached is not None:
+                return cached
 
-        plt.tight_layout()
+        from app.charts import render_report_chart
 
-        # Save chart to a bytes buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
+        png = render_report_chart(report_data)
 
-        # Close the plot to free memory
-        plt.close()
+        if key is not None:
+            report_cache.put(key, png)
 
-        return buf.getvalue()
+        return png
 
 
 def generate_documentation():
@@ -243,6 +263,8 @@ def generate_documentation():
     Returns:
         str: Path to the generated PDF
     """
+    from fpdf import FPDF
+
     # Create a PDF with documentation
     pdf = FPDF()
     pdf.add_page()
@@ -0,0 +1,148 @@
+"""
+Maintenance of the monthly_rollups table.
+
+Every write to transactions must call apply_rollup() in the same session so the
+rollup commits (or rolls back) together with the transaction rows. The module can
+also be run to recompute the table from scratch or check it for drift:
+
+    python -m app.rollups --verify [--user USER_ID]
+    python -m app.rollups --rebuild [--user USER_ID]
+"""
+import argparse
+import sys
+
+from sqlalchemy import delete, extract, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import MonthlyRollup, Transaction, get_engine
+
+# Totals are floats, differences below a cent are rounding, not drift
+DRIFT_TOLERANCE = 0.005
+
+
+def apply_rollup(session, user_id, category_id, date, amount, count=1):
+    """Add amount/count to a month's rollup row, inside the caller's transaction.
+
+    Pass negative values to back out a deleted or edited transaction.
+    """
+    apply_rollups(session, {(user_id, date.year, date.month, category_id): (amount, count)})
+
+
+def apply_rollups(session, deltas):
+    # deltas: {(user_id, year, month, category_id): (amount, count)}
+    if not deltas:
+        return
+
+    rows = [
+        {'user_id': user_id, 'year': year, 'month': month, 'category_id': category_id,
+         'total': amount, 'count': count}
+        for (user_id, year, month, category_id), (amount, count) in deltas.items()
+    ]
+
+    stmt = sqlite_insert(MonthlyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'year', 'month', 'category_id'],
+        set_={
+            'total': MonthlyRollup.total + stmt.excluded.total,
+            'count': MonthlyRollup.count + stmt.excluded.count,
+        }
+    )
+    session.execute(stmt, rows)
+
+
+def _aggregate_transactions(user_id=None):
+    # Rollup rows as they should be, computed straight from transactions
+    year_col = extract('year', Transaction.date)
+    month_col = extract('month', Transaction.date)
+
+    query = select(
+        Transaction.user_id,
+        year_col.label('year'),
+        month_col.label('month'),
+        Transaction.category_id,
+        func.sum(Transaction.amount).label('total'),
+        func.count(Transaction.id).label('count')
+    ).group_by(Transaction.user_id, year_col, month_col, Transaction.category_id)
+
+    if user_id is not None:
+        query = query.where(Transaction.user_id == user_id)
+
+    return query
+
+
+def rebuild_rollups(user_id=None, engine=None):
+    """Recompute rollups from transactions (for one user or everyone). Returns rows written."""
+    engine = engine or get_engine()
+
+    with engine.begin() as conn:
+        clear = delete(MonthlyRollup)
+        if user_id is not None:
+            clear = clear.where(MonthlyRollup.user_id == user_id)
+        conn.execute(clear)
+
+        source = _aggregate_transactions(user_id)
+        result = conn.execute(
+            insert(MonthlyRollup).from_select(
+                ['user_id', 'year', 'month', 'category_id', 'total', 'count'], source)
+        )
+
+    return result.rowcount
+
+
+def verify_rollups(user_id=None, engine=None):
+    """Compare rollups with a fresh aggregation. Returns a list of drift dicts (empty if in sync)."""
+    engine = engine or get_engine()
+
+    with engine.connect() as conn:
+        expected = {
+            (row.user_id, int(row.year), int(row.month), row.category_id): (row.total, row.count)
+            for row in conn.execute(_aggregate_transactions(user_id))
+        }
+
+        stored_query = select(MonthlyRollup)
+        if user_id is not None:
+            stored_query = stored_query.where(MonthlyRollup.user_id == user_id)
+        stored = {
+            (row.user_id, row.year, row.month, row.category_id): (row.total, row.count)
+            for row in conn.execute(stored_query)
+        }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        exp_total, exp_count = expected.get(key, (0.0, 0))
+        got_total, got_count = stored.get(key, (0.0, 0))
+        if exp_count != got_count or abs(exp_total - got_total) > DRIFT_TOLERANCE:
+            user, year, month, category = key
+            drift.append({
+                'user_id': user, 'year': year, 'month': month, 'category_id': category,
+                'expected_total': exp_total, 'stored_total': got_total,
+                'expected_count': exp_count, 'stored_count': got_count,
+            })
+
+    return drift
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or verify the monthly rollup table")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--verify', action='store_true', help="report drift without changing anything")
+    mode.add_argument('--rebuild', action='store_true', help="recompute rollups from transactions")
+    parser.add_argument('--user', type=int, help="limit to one user id")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        written = rebuild_rollups(args.user)
+        print(f"Rebuilt {written} rollup rows")
+        return 0
+
+    drift = verify_rollups(args.user)
+    for row in drift:
+        print(f"user={row['user_id']} {row['year']}-{row['month']:02d} category={row['category_id']}: "
+              f"stored {row['stored_total']:.2f} ({row['stored_count']}) "
+              f"expected {row['expected_total']:.2f} ({row['expected_count']})")
+    print(f"{len(drift)} rollup row(s) out of sync")
+    return 1 if drift else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
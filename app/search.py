@@ -0,0 +1,377 @@
+"""
+Maintenance of the transactions_fts full-text index over transaction descriptions.
+
+Descriptions are stored encrypted (app/encryption.py), so the index must not hold their
+words either. Each word is indexed as keyed tokens instead: a BLAKE2b MAC, under a key
+derived from the encryption key, of its 2, 3 and 4 character prefixes and of the whole
+word. "Groceries" becomes the tokens of "gr", "gro", "groc" and "groceries"; a search
+for "gro" looks up the token of "gro", one for "groceries" the token of the whole word.
+Without the key the index only shows which rows share a word or a short prefix, never
+the words themselves. Words are compared lowercased and without diacritics, so "cafe"
+finds "Café". Each row also carries an "owner" token (u<user_id>) so a search only
+walks the posting lists of one user's rows.
+
+The app computes the tokens. A single transaction is indexed by the write job that
+inserts it. Bulk loads (budget.add_transactions) leave it to the indexer thread, which
+indexes the new rows a page at a time once the load is done, so those rows become
+searchable a little after the load returns; wait_for_index() waits for that. The same
+catch-up runs at startup whenever the index has fewer rows than transactions, e.g.
+after rows were inserted by another tool or the app was closed mid-way. Deleting a
+transaction or moving it to another user is handled by plain SQL triggers, so that
+works from any SQLite tool too. After a change of encryption key, searches look for the
+tokens of the current and the retired keys until app.encryption --reencrypt has rebuilt
+the index with the current key.
+
+    python -m app.search --verify
+    python -m app.search --rebuild
+"""
+import argparse
+import hashlib
+import queue
+import re
+import sys
+import threading
+import unicodedata
+
+from sqlalchemy import select, text
+
+from app.database import Transaction, get_engine
+from app.encryption import decrypt_many, get_cipher, raw
+
+FTS_TABLE = 'transactions_fts'
+# FTS5's own table with one row per indexed rowid, much cheaper to count and probe
+# than the virtual table
+INDEXED_TABLE = f'{FTS_TABLE}_docsize'
+
+# words are indexed by their prefixes up to this length and as a whole
+PREFIX_LENGTH = 4
+TOKEN_SIZE = 6
+# words whose tokens are kept in memory per key, most descriptions reuse a few words
+TOKEN_CACHE_SIZE = 100000
+# rows read and indexed at a time when filling the index from existing transactions
+FILL_BATCH_SIZE = 5000
+
+# the table stores the tokens, not the descriptions, so it can keep its own copy and
+# the triggers can remove rows without the app
+_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(description, owner, tokenize='ascii')",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS transactions_fts_owner AFTER UPDATE OF user_id ON transactions BEGIN
+        UPDATE {FTS_TABLE} SET owner = 'u' || new.user_id WHERE rowid = old.id;
+    END""",
+]
+
+# earlier versions of the index: the words themselves (and triggers needing an SQL
+# function only the app registered), then prefixes up to 8 characters without
+# positions; both are dropped and indexed again
+_LEGACY_MARKS = ["content=''", "detail='column'"]
+_DROP_LEGACY = [
+    "DROP TRIGGER IF EXISTS transactions_fts_delete",
+    "DROP TRIGGER IF EXISTS transactions_fts_owner",
+    f"DROP TABLE {FTS_TABLE}",
+]
+
+_INDEX_SQL = f"INSERT INTO {FTS_TABLE} (rowid, description, owner) VALUES (?, ?, ?)"
+
+# transactions in (after, up_to] the index lacks, in id order
+_MISSING_SQL = (f"SELECT id, description FROM transactions "
+                f"WHERE id > ? AND id <= ? AND NOT EXISTS (SELECT 1 FROM {INDEXED_TABLE} WHERE id = transactions.id) "
+                f"ORDER BY id LIMIT ?")
+
+# of the rows read for indexing, those still there and not indexed yet, with their owner as of now
+_UNINDEXED_SQL = (f"SELECT id, user_id FROM transactions "
+                  f"WHERE id >= ? AND id <= ? AND NOT EXISTS (SELECT 1 FROM {INDEXED_TABLE} WHERE id = transactions.id)")
+
+
+def words(text):
+    # lowercased words without diacritics, the way they are indexed
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return re.findall(r'\w+', text)
+
+
+class SearchTokens:
+    """Index tokens of words under one encryption key."""
+
+    def __init__(self, key):
+        # a key of its own, so the index says nothing about the encryption keystream
+        key = hashlib.blake2b(key, digest_size=32, person=b'budget-search').digest()
+        self._hash = hashlib.blake2b(digest_size=TOKEN_SIZE, key=key)
+        self._words = {}
+
+    def token(self, text):
+        hash_ = self._hash.copy()
+        hash_.update(text.encode('utf-8'))
+        return hash_.digest().hex()
+
+    def word_tokens(self, word):
+        # the tokens of word's short prefixes and of the word itself, space separated
+        tokens = self._words.get(word)
+        if tokens is None:
+            if len(self._words) >= TOKEN_CACHE_SIZE:
+                self._words.clear()
+            # one hash fed a prefix at a time, with a digest after each
+            start = min(2, len(word))
+            hash_ = self._hash.copy()
+            hash_.update(word[:start].encode('utf-8'))
+            digests = [hash_.digest()]
+            for char in word[start:PREFIX_LENGTH]:
+                hash_.update(char.encode('utf-8'))
+                digests.append(hash_.digest())
+            if len(word) > PREFIX_LENGTH:
+                hash_.update(word[PREFIX_LENGTH:].encode('utf-8'))
+                digests.append(hash_.digest())
+            tokens = self._words[word] = ' '.join([digest.hex() for digest in digests])
+        return tokens
+
+    def document(self, description):
+        return ' '.join([self.word_tokens(word) for word in words(description or "")])
+
+    def terms(self, word, unfinished=False):
+        # tokens a typed word is looked up by: short words are prefixes, longer ones whole
+        # words, unless unfinished (the word being typed) where its first letters also count
+        terms = [self.token(word)]
+        if unfinished and len(word) > PREFIX_LENGTH:
+            terms.append(self.token(word[:PREFIX_LENGTH]))
+        return terms
+
+
+_tokens = (None, [])
+
+
+def _token_sets():
+    # SearchTokens of the current key, then of the retired ones
+    global _tokens
+    cipher = get_cipher()
+    if _tokens[0] is not cipher:
+        keys = dict.fromkeys([cipher.key] + cipher.retired_keys)
+        _tokens = (cipher, [SearchTokens(key) for key in keys])
+    return _tokens[1]
+
+
+def tokenize(descriptions):
+    """What the index stores for each plaintext description, with the current key."""
+    tokens = _token_sets()[0]
+    return [tokens.document(description) for description in descriptions]
+
+
+def search_query(text):
+    """
+    FTS5 MATCH expression for what a user typed: every word must appear. Words of up
+    to four letters match as prefixes ("gro" finds "Groceries"), longer ones as whole
+    words ("grocer" doesn't), except the last word, which may still be being typed and
+    also matches words starting with its first four letters, below the whole-word
+    matches. None if there are no words to look for.
+    """
+    typed = words(text)
+    if not typed:
+        return None
+    token_sets = _token_sets()
+    terms = []
+    for position, word in enumerate(typed):
+        unfinished = position == len(typed) - 1
+        alternatives = dict.fromkeys(term for tokens in token_sets for term in tokens.terms(word, unfinished))
+        terms.append('(' + ' OR '.join(f'"{token}"' for token in alternatives) + ')')
+    return ' AND '.join(terms)
+
+
+def index_transactions(session, rows):
+    """Add (transaction_id, plaintext_description, user_id) rows to the index, inside the inserting transaction."""
+    documents = tokenize([description for _, description, _ in rows])
+    session.connection().exec_driver_sql(
+        _INDEX_SQL, [(row[0], document, f"u{row[2]}") for row, document in zip(rows, documents)])
+
+
+def index_missing(after=0, up_to=None, page_size=FILL_BATCH_SIZE):
+    """
+    Index the transactions with after < id <= up_to (all of them by default) that the
+    index lacks. Pages are read and tokenized here and written by the writer thread one
+    at a time, so other writes wait for one page at most. Returns the number of rows indexed.
+    """
+    from app.writer import submit_write
+
+    if up_to is None:
+        with get_engine().connect() as conn:
+            up_to = conn.exec_driver_sql("SELECT max(id) FROM transactions").scalar() or 0
+
+    indexed = 0
+    while True:
+        with get_engine().connect() as conn:
+            rows = conn.exec_driver_sql(_MISSING_SQL, (after, up_to, page_size)).all()
+        if not rows:
+            return indexed
+        after = rows[-1][0]
+        documents = tokenize(decrypt_many([description for _, description in rows]))
+        indexed += submit_write(_catch_up, {row[0]: document for row, document in zip(rows, documents)}).result()
+
+
+def _catch_up(session, documents):
+    # documents: {transaction_id: tokens}, read before the write lock was taken, so rows
+    # deleted, moved or indexed since are checked again here
+    connection = session.connection()
+    owners = connection.exec_driver_sql(_UNINDEXED_SQL, (min(documents), max(documents))).all()
+    params = [(row_id, documents[row_id], f"u{user_id}") for row_id, user_id in owners if row_id in documents]
+    if params:
+        connection.exec_driver_sql(_INDEX_SQL, params)
+    return len(params)
+
+
+class SearchIndexer:
+    """Background thread running index_missing() for queued id ranges, in order."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="budget-indexer", daemon=True)
+        self._thread.start()
+
+    def submit(self, after=0, up_to=None):
+        self._queue.put((after, up_to))
+
+    def wait(self):
+        self._queue.join()
+
+    def close(self):
+        # Finish what's queued, then stop
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is None:
+                    return
+                index_missing(*entry)
+            except Exception as e:
+                # the rows stay unindexed until the next startup's check
+                print(f"Error indexing transactions for search: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+
+_indexer = None
+_indexer_lock = threading.Lock()
+
+
+def index_later(after=0, up_to=None):
+    """Queue the transactions with after < id <= up_to for indexing on the indexer thread."""
+    global _indexer
+
+    with _indexer_lock:
+        if _indexer is None:
+            _indexer = SearchIndexer()
+        _indexer.submit(after, up_to)
+
+
+def wait_for_index():
+    """Block until everything queued by index_later() is searchable."""
+    indexer = _indexer
+    if indexer is not None:
+        indexer.wait()
+
+
+def close_indexer():
+    # Called by database.dispose_engine() before the writer closes
+    global _indexer
+
+    with _indexer_lock:
+        indexer, _indexer = _indexer, None
+    if indexer is not None:
+        indexer.close()
+
+
+def _fill(conn):
+    # index every transaction, a page at a time; returns the number of rows indexed
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Transaction.id, raw(Transaction.description), Transaction.user_id)
+            .where(Transaction.id > last_id).order_by(Transaction.id).limit(FILL_BATCH_SIZE)).all()
+        if not rows:
+            return indexed
+        last_id = rows[-1][0]
+        documents = tokenize(decrypt_many([row[1] for row in rows]))
+        conn.exec_driver_sql(_INDEX_SQL, [(row[0], document, f"u{row[2]}") for row, document in zip(rows, documents)])
+        indexed += len(rows)
+
+
+def _counts(conn):
+    # (transactions, indexed rows)
+    return (conn.exec_driver_sql("SELECT count(*) FROM transactions").scalar(),
+            conn.exec_driver_sql(f"SELECT count(*) FROM {INDEXED_TABLE}").scalar())
+
+
+def create_search_index(engine):
+    """
+    Create the index and its triggers if missing. If it has fewer rows than there are
+    transactions (a new index, rows inserted behind the app's back, a bulk load cut
+    short), the missing ones are queued for the indexer thread.
+    """
+    with engine.begin() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}).scalar()
+        if sql is not None and any(mark in sql for mark in _LEGACY_MARKS):
+            for statement in _DROP_LEGACY:
+                conn.exec_driver_sql(statement)
+        for statement in _SCHEMA:
+            conn.exec_driver_sql(statement)
+        transactions, indexed = _counts(conn)
+
+    if indexed < transactions:
+        index_later()
+
+
+def verify_search_index(engine=None):
+    """{'missing': transactions not in the index, 'extra': index rows without a transaction}."""
+    engine = engine or get_engine()
+
+    with engine.connect() as conn:
+        missing = conn.exec_driver_sql(
+            f"SELECT count(*) FROM transactions "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {INDEXED_TABLE} WHERE id = transactions.id)").scalar()
+        extra = conn.exec_driver_sql(
+            f"SELECT count(*) FROM {INDEXED_TABLE} "
+            f"WHERE NOT EXISTS (SELECT 1 FROM transactions WHERE id = {INDEXED_TABLE}.id)").scalar()
+
+    return {'missing': missing, 'extra': extra}
+
+
+def rebuild_search_index(engine=None):
+    """Index every transaction again from scratch with the current key. Returns the number of rows indexed."""
+    engine = engine or get_engine()
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+        indexed = _fill(conn)
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    return indexed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or rebuild the transaction search index")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--verify', action='store_true', help="count transactions missing from the index and stale rows")
+    mode.add_argument('--rebuild', action='store_true',
+                      help="index every transaction again, e.g. after editing the database by hand")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        print(f"Indexed {rebuild_search_index()} transactions")
+        return 0
+
+    # opening the database queues any missing rows, let that finish first; run with -m
+    # this module is __main__, the indexer is app.search's
+    from app.search import wait_for_index as wait_for_startup_index
+    get_engine()
+    wait_for_startup_index()
+    drift = verify_search_index()
+    print(f"{drift['missing']} transaction(s) missing from the search index, {drift['extra']} stale index row(s)")
+    return 1 if drift['missing'] or drift['extra'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
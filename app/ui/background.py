@@ -0,0 +1,110 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+# How often the Tk thread checks for finished jobs (ms)
+POLL_INTERVAL = 50
+
+
+class BackgroundLoader:
+    """
+    Runs slow work (DB queries, chart rendering, PDF building) on worker threads.
+
+    Workers never touch Tk: they put their result on a queue, and the Tk thread drains
+    it with after() and calls the job's callback. Jobs are submitted under a key; a new
+    submit for the same key makes the older one stale, and its result is thrown away.
+    """
+
+    def __init__(self, widget, max_workers=2, on_busy_change=None):
+        self.widget = widget
+        self.on_busy_change = on_busy_change
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="budget-loader")
+        self._results = queue.Queue()
+        self._latest = {}
+        self._futures = {}
+        self._pending = 0
+        self._after_id = None
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, on_done, on_error=None):
+        # Call from the Tk thread only
+        with self._lock:
+            generation = self._latest.get(key, 0) + 1
+            self._latest[key] = generation
+
+        previous = self._futures.get(key)
+        if previous is not None and previous.cancel():
+            # never started, so it won't report back
+            self._set_pending(self._pending - 1)
+
+        def run():
+            try:
+                result, error = func(), None
+            except Exception as e:
+                result, error = None, e
+            self._results.put((key, generation, result, error, on_done, on_error))
+
+        self._set_pending(self._pending + 1)
+        self._futures[key] = self._executor.submit(run)
+        self._schedule()
+
+    def cancel(self, key):
+        # Drop whatever is in flight for key
+        with self._lock:
+            self._latest[key] = self._latest.get(key, 0) + 1
+
+        future = self._futures.pop(key, None)
+        if future is not None and future.cancel():
+            self._set_pending(self._pending - 1)
+
+    def is_busy(self):
+        return self._pending > 0
+
+    def shutdown(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._after_id = self.widget.after(POLL_INTERVAL, self._drain)
+
+    def _drain(self):
+        self._after_id = None
+
+        while True:
+            try:
+                key, generation, result, error, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            self._set_pending(self._pending - 1)
+
+            with self._lock:
+                stale = generation != self._latest.get(key)
+            if stale:
+                continue
+
+            self._futures.pop(key, None)
+            try:
+                if error is not None:
+                    if on_error:
+                        on_error(error)
+                    else:
+                        messagebox.showerror("Error", f"An error occurred: {str(error)}")
+                else:
+                    on_done(result)
+            except Exception as e:
+                # one failing callback (e.g. its widget is gone) must not stop the rest being delivered
+                print(f"Error in background callback for {key}: {str(e)}")
+
+        if self._pending > 0:
+            self._schedule()
+
+    def _set_pending(self, count):
+        was_busy = self._pending > 0
+        self._pending = max(count, 0)
+        if self.on_busy_change and was_busy != (self._pending > 0):
+            self.on_busy_change(self._pending > 0)
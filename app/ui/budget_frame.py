@@ -1,24 +1,42 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import datetime
+import calendar
 
 from app.budget import (
-    get_categories, add_category, add_transaction, get_transactions,
-    add_goal, update_goal, get_goals
+    get_categories, add_category_async, add_transaction_async, count_transactions, get_transactions_page,
+    transaction_sort_key, add_goal_async, update_goal_async, get_goals, get_monthly_summary, search_transactions
 )
 from app.utils import (
     format_currency, validate_amount, validate_date,
     create_expense_pie_chart, create_income_expense_bar_chart
 )
+from app.ui.background import BackgroundLoader
+from app.ui.virtual_list import VirtualTreeview
+
+# ms to wait after the last keystroke before searching
+SEARCH_DELAY = 250
+SEARCH_RESULTS = 200
 
 
 class BudgetFrame(ttk.Frame):
 
-    def __init__(self, parent, user):
+    def __init__(self, parent, user, loader=None):
         super().__init__(parent)
         self.parent = parent
         self.user = user
 
+        # DB work runs on worker threads, results come back on the Tk thread
+        self.loader = loader or BackgroundLoader(self)
+        self.income_categories = {}
+        self.expense_categories = {}
+        self.goal_items = {}
+        self.stats = None
+        self.save_count = 0
+        # the window the transaction list shows, set before its first load so a transaction
+        # added meanwhile can be placed
+        self.set_transaction_window()
+
         #  the grid
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=1)
@@ -89,33 +107,58 @@ class BudgetFrame(ttk.Frame):
         add_button = ttk.Button(form_frame, text="Add Transaction", command=self.add_transaction)
         add_button.grid(row=5, column=0, columnspan=2, padx=5, pady=10)
 
-        # Transaction list
-        ttk.Label(left_frame, text="Recent Transactions:").grid(row=1, column=0, padx=5, pady=5, sticky="nw")
+        # Import button
+        import_button = ttk.Button(form_frame, text="Import Statement", command=self.import_statement)
+        import_button.grid(row=5, column=2, padx=5, pady=10)
 
-        # Treeview
-        self.transaction_tree = ttk.Treeview(left_frame, columns=("date", "type", "category", "amount", "description"))
-
-        # columns
-        self.transaction_tree.heading("#0", text="ID")
-        self.transaction_tree.heading("date", text="Date")
-        self.transaction_tree.heading("type", text="Type")
-        self.transaction_tree.heading("category", text="Category")
-        self.transaction_tree.heading("amount", text="Amount")
-        self.transaction_tree.heading("description", text="Description")
-
-        self.transaction_tree.column("#0", width=50)
-        self.transaction_tree.column("date", width=100)
-        self.transaction_tree.column("type", width=80)
-        self.transaction_tree.column("category", width=120)
-        self.transaction_tree.column("amount", width=100)
-        self.transaction_tree.column("description", width=150)
-
-        self.transaction_tree.grid(row=2, column=0, padx=5, pady=5, sticky="nsew")
-
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(left_frame, orient="vertical", command=self.transaction_tree.yview)
-        scrollbar.grid(row=2, column=1, sticky="ns")
-        self.transaction_tree.configure(yscrollcommand=scrollbar.set)
+        # Transaction list
+        self.list_label = ttk.Label(left_frame, text="Recent Transactions:")
+        self.list_label.grid(row=1, column=0, padx=5, pady=5, sticky="nw")
+
+        # Search over all transactions; results replace the list while there is a query
+        search_frame = ttk.Frame(left_frame)
+        search_frame.grid(row=1, column=1, padx=5, pady=5, sticky="ne")
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.search_var, width=25).pack(side=tk.LEFT, padx=5)
+        self.search_var.trace_add("write", self.on_search_change)
+        self.search_after_id = None
+
+        # Only the visible rows are loaded, pages come from the DB as the list scrolls
+        self.transaction_list = VirtualTreeview(
+            left_frame,
+            columns=[
+                ("#0", "ID", 50, None),
+                ("date", "Date", 100, "date"),
+                ("type", "Type", 80, "type"),
+                ("category", "Category", 120, "category"),
+                ("amount", "Amount", 100, "amount"),
+                ("description", "Description", 150, None),
+            ],
+            fetch_page=self.fetch_transaction_page,
+            count_rows=self.count_recent_transactions,
+            format_row=self.format_transaction_row,
+            sort="date",
+            sort_key=transaction_sort_key,
+            loader=self.loader
+        )
+        self.transaction_list.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
+
+        # search results, shown in place of the list
+        self.search_frame = ttk.Frame(left_frame)
+        self.search_tree = ttk.Treeview(self.search_frame, columns=("date", "type", "category", "amount", "description"))
+        self.search_tree.heading("#0", text="ID")
+        self.search_tree.column("#0", width=50)
+        for column_id, heading, width in [("date", "Date", 100), ("type", "Type", 80), ("category", "Category", 120),
+                                          ("amount", "Amount", 100), ("description", "Description", 150)]:
+            self.search_tree.heading(column_id, text=heading)
+            self.search_tree.column(column_id, width=width)
+        search_scrollbar = ttk.Scrollbar(self.search_frame, orient=tk.VERTICAL, command=self.search_tree.yview)
+        self.search_tree.configure(yscrollcommand=search_scrollbar.set)
+        self.search_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        search_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.search_frame.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
+        self.search_frame.grid_remove()
 
         # Right frame - goals and charts
         right_frame = ttk.Frame(self)
@@ -185,21 +228,35 @@ class BudgetFrame(ttk.Frame):
         refresh_button.grid(row=1, column=0, padx=5, pady=5)
 
     def load_data(self):
-        self.load_categories()
+        user_id = self.user.id
 
-        self.load_transactions()
+        def fetch():
+            return {
+                'categories': self.fetch_categories(user_id),
+                'goals': get_goals(user_id),
+                'summary': self.fetch_stats(user_id)
+            }
 
-        self.load_goals()
+        def show(data):
+            self.show_categories(data['categories'])
+            self.load_transactions()
+            self.show_goals(data['goals'])
+            self.show_stats(data['summary'])
 
-        self.update_stats()
+        self.loader.submit('budget_data', fetch, show)
+
+    @staticmethod
+    def fetch_categories(user_id):
+        # worker thread: income and expense categories
+        return get_categories(user_id, is_income=True), get_categories(user_id, is_income=False)
 
     def load_categories(self):
-        # Get income categories
-        income_categories = get_categories(self.user.id, is_income=True)
-        self.income_categories = {cat.name: cat.id for cat in income_categories}
+        user_id = self.user.id
+        self.loader.submit('categories', lambda: self.fetch_categories(user_id), self.show_categories)
 
-        # Get expense categories
-        expense_categories = get_categories(self.user.id, is_income=False)
+    def show_categories(self, categories):
+        income_categories, expense_categories = categories
+        self.income_categories = {cat.name: cat.id for cat in income_categories}
         self.expense_categories = {cat.name: cat.id for cat in expense_categories}
 
         # Update combobox values
@@ -255,17 +312,22 @@ class BudgetFrame(ttk.Frame):
                 messagebox.showerror("Error", "Category name is required", parent=dialog)
                 return
 
-            # Add category
-            success, message = add_category(self.user.id, name, is_income)
+            def on_saved(message, change):
+                if dialog.winfo_exists():
+                    messagebox.showinfo("Success", message, parent=dialog)
+                    dialog.destroy()
 
-            if success:
-                messagebox.showinfo("Success", message, parent=dialog)
-                dialog.destroy()
+                # Add to the category lists
+                category = change.record
+                if category.is_income:
+                    self.income_categories[category.name] = category.id
+                else:
+                    self.expense_categories[category.name] = category.id
+                self.update_category_combobox()
 
-                # Reload categories
-                self.load_categories()
-            else:
-                messagebox.showerror("Error", message, parent=dialog)
+            # Add category
+            user_id = self.user.id
+            self.save(lambda: add_category_async(user_id, name, is_income), on_saved, dialog)
 
         ttk.Button(dialog, text="Add Category", command=submit).pack(padx=10, pady=10)
 
@@ -317,63 +379,183 @@ class BudgetFrame(ttk.Frame):
         # original amount (always positive)
         original_amount = abs(amount)
 
-        # Add transaction with positive amount - the category determines if it's income or expense
-        success, message = add_transaction(
-            self.user.id, original_amount, description, category_id, date
-        )
-
-        if success:
+        def on_saved(message, change):
             messagebox.showinfo("Success", message)
 
             # Clear form
             self.amount_var.set("")
             self.description_var.set("")
 
-            # Force reload of all data
-            print(f"Transaction added successfully. Reloading data...")
-            self.load_data()  # Use load_data to reload everything
-        else:
-            messagebox.showerror("Error", message)
+            # Patch the list and the stats with the new row instead of reloading everything
+            self.show_new_transaction(change)
 
-    def load_transactions(self):
-        print(f"Loading transactions for user {self.user.id}...")
+        # Add transaction with positive amount - the category determines if it's income or expense
+        user_id = self.user.id
+        self.save(lambda: add_transaction_async(user_id, original_amount, description, category_id, date),
+                  on_saved)
 
-        # Clear treeview
-        for item in self.transaction_tree.get_children():
-            self.transaction_tree.delete(item)
+    def save(self, write, on_saved, dialog=None):
+        # write() queues one of the *_async writers; it runs on a loader thread so the Tk
+        # thread doesn't wait for the writer, and on_saved(message, change) gets the result
+        self.save_count += 1
 
-        # Get transactions (last 30 days)
-        end_date = datetime.datetime.now()
-        start_date = end_date - datetime.timedelta(days=30)
+        def on_done(result):
+            success, message, change = result
+            if success:
+                on_saved(message, change)
+            elif dialog is not None and dialog.winfo_exists():
+                messagebox.showerror("Error", message, parent=dialog)
+            else:
+                messagebox.showerror("Error", message)
 
-        print(f"Date range: {start_date} to {end_date}")
+        # a key per save, so a second save doesn't make the first one's result stale
+        self.loader.submit(f"save-{self.save_count}", lambda: write().result(), on_done)
 
-        transactions = get_transactions(self.user.id, start_date, end_date)
+    def import_statement(self):
+        from app.importer import import_statement
 
-        print(f"Found {len(transactions)} transactions")
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("CSV Files", "*.csv"), ("OFX Files", "*.ofx *.qfx")],
+            title="Import Bank Statement"
+        )
 
-        # Add to treeview
-        for transaction in transactions:
-            if transaction.category_is_income:
-                type_str = "Income"
-            else:
-                type_str = "Expense"
+        if not file_path:
+            return
+
+        # Progress dialog
+        dialog = tk.Toplevel(self)
+        dialog.title("Importing")
+        dialog.geometry("350x100")
+        dialog.resizable(False, False)
+        dialog.transient(self)
+        dialog.grab_set()
 
-            print(
-                f"Adding transaction: {transaction.id}, {type_str}, {transaction.category_name}, {transaction.amount}")
+        progress_var = tk.DoubleVar(value=0)
+        status_var = tk.StringVar(value="Starting import...")
+        ttk.Label(dialog, textvariable=status_var).pack(padx=10, pady=10, anchor="w")
+        ttk.Progressbar(dialog, variable=progress_var, maximum=100).pack(padx=10, pady=5, fill="x")
 
-            self.transaction_tree.insert(
-                "", "end", text=str(transaction.id),
-                values=(
-                    transaction.date.strftime("%Y-%m-%d"),
-                    type_str,
-                    transaction.category_name,
-                    format_currency(abs(transaction.amount)),
-                    transaction.description or ""
-                )
-            )
+        # the worker only writes numbers here, the dialog polls them from the Tk thread
+        progress = {'done': 0, 'total': 0, 'rows': 0}
 
-        print(f"Transactions loaded successfully")
+        def record_progress(done, total, rows):
+            progress.update(done=done, total=total, rows=rows)
+
+        def show_progress():
+            if not dialog.winfo_exists():
+                return
+            total = progress['total']
+            progress_var.set(progress['done'] * 100 / total if total else 0)
+            status_var.set(f"Imported {progress['rows']:,} transactions "
+                           f"({progress['done'] / 1e6:,.1f} of {total / 1e6:,.1f} MB)")
+            dialog.after(200, show_progress)
+
+        def on_done(result):
+            dialog.destroy()
+
+            message = f"Imported {result['imported']} transactions."
+            if result['rejected']:
+                message += f"\n{result['rejected']} rows were skipped:"
+                for line, error in result['errors'][:10]:
+                    message += f"\n  line {line}: {error}"
+            messagebox.showinfo("Import Finished", message)
+
+            self.load_data()
+
+        def on_error(error):
+            dialog.destroy()
+            messagebox.showerror("Error", f"Import failed: {str(error)}")
+
+        user_id = self.user.id
+        self.loader.submit('import', lambda: import_statement(user_id, file_path, progress=record_progress),
+                           on_done, on_error)
+        show_progress()
+
+    def set_transaction_window(self):
+        # transactions of the last 30 days, the window is fixed until the next reload
+        self.transactions_end = datetime.datetime.now()
+        self.transactions_start = self.transactions_end - datetime.timedelta(days=30)
+
+    def load_transactions(self):
+        self.set_transaction_window()
+        self.transaction_list.refresh()
+
+    def count_recent_transactions(self):
+        # worker thread
+        return count_transactions(self.user.id, self.transactions_start, self.transactions_end)
+
+    def fetch_transaction_page(self, limit, after, offset, sort, descending):
+        # worker thread
+        return get_transactions_page(self.user.id, self.transactions_start, self.transactions_end, limit=limit,
+                                     after=after, offset=offset, sort=sort, descending=descending)
+
+    def on_search_change(self, *args):
+        # search once typing pauses, not on every keystroke
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(SEARCH_DELAY, self.run_search)
+
+    def run_search(self):
+        self.search_after_id = None
+        query = self.search_var.get().strip()
+
+        if not query:
+            self.loader.cancel('search')
+            self.search_frame.grid_remove()
+            self.transaction_list.grid()
+            self.list_label.configure(text="Recent Transactions:")
+            return
+
+        user_id = self.user.id
+        self.loader.submit('search', lambda: search_transactions(user_id, query, limit=SEARCH_RESULTS),
+                           lambda results: self.show_search_results(query, results))
+
+    def show_search_results(self, query, results):
+        self.search_tree.delete(*self.search_tree.get_children())
+        for transaction in results:
+            text, values = self.format_transaction_row(transaction)
+            self.search_tree.insert("", "end", text=text, values=values)
+
+        more = "+" if len(results) >= SEARCH_RESULTS else ""
+        self.list_label.configure(text=f'{len(results)}{more} matches for "{query}", best first:')
+        self.transaction_list.grid_remove()
+        self.search_frame.grid()
+
+    def destroy(self):
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        super().destroy()
+
+    @staticmethod
+    def format_transaction_row(transaction):
+        type_str = "Income" if transaction.category_is_income else "Expense"
+        return str(transaction.id), (
+            transaction.date.strftime("%Y-%m-%d"),
+            type_str,
+            transaction.category_name,
+            format_currency(abs(transaction.amount)),
+            transaction.description or ""
+        )
+
+    def show_new_transaction(self, change):
+        transaction = change.record
+
+        if self.transactions_start <= transaction.date <= self.transactions_end:
+            self.transaction_list.insert_record(transaction)
+
+        if self.search_var.get().strip():
+            # the new transaction may match
+            self.run_search()
+
+        if self.stats:
+            current_year, current_month, summary = self.stats
+            delta = change.summary_delta
+            if (delta.year, delta.month) == (current_year, current_month):
+                summary = dict(summary)
+                summary['total_income'] += delta.income
+                summary['total_expenses'] += delta.expenses
+                summary['net'] = summary['total_income'] - summary['total_expenses']
+                self.show_stats((current_year, current_month, summary))
 
     def add_goal(self):
         # Get values
@@ -395,47 +577,52 @@ class BudgetFrame(ttk.Frame):
             messagebox.showerror("Error", target)
             return
 
-        # Add goal
-        success, message = add_goal(self.user.id, name, target)
-
-        if success:
+        def on_saved(message, change):
             messagebox.showinfo("Success", message)
 
             # Clear form
             self.goal_name_var.set("")
             self.goal_target_var.set("")
 
-            # Reload goals
-            self.load_goals()
-        else:
-            messagebox.showerror("Error", message)
+            self.show_goal(change.record)
+
+        # Add goal
+        user_id = self.user.id
+        self.save(lambda: add_goal_async(user_id, name, target), on_saved)
 
     def load_goals(self):
+        user_id = self.user.id
+        self.loader.submit('goals', lambda: get_goals(user_id), self.show_goals)
+
+    def show_goals(self, goals):
         # Clear treeview
         for item in self.goals_tree.get_children():
             self.goals_tree.delete(item)
-
-        # Get goals
-        goals = get_goals(self.user.id)
+        self.goal_items = {}
 
         # Add to treeview
         for goal in goals:
-            # Calculate progress
-            if goal.target_amount > 0:
-                progress = (goal.current_amount / goal.target_amount) * 100
-            else:
-                progress = 0
-
-            # Add to treeview
-            self.goals_tree.insert(
-                "", "end", text=str(goal.id),
-                values=(
-                    goal.name,
-                    format_currency(goal.current_amount),
-                    format_currency(goal.target_amount),
-                    f"{progress:.1f}%"
-                )
-            )
+            self.show_goal(goal)
+
+    def show_goal(self, goal):
+        # Add a goal row, or update it in place if it's already listed
+        if goal.target_amount > 0:
+            progress = (goal.current_amount / goal.target_amount) * 100
+        else:
+            progress = 0
+
+        values = (
+            goal.name,
+            format_currency(goal.current_amount),
+            format_currency(goal.target_amount),
+            f"{progress:.1f}%"
+        )
+
+        item = self.goal_items.get(goal.id)
+        if item is not None:
+            self.goals_tree.item(item, values=values)
+        else:
+            self.goal_items[goal.id] = self.goals_tree.insert("", "end", text=str(goal.id), values=values)
 
     def show_update_goal_dialog(self):
         # Get selected goal
@@ -485,38 +672,40 @@ class BudgetFrame(ttk.Frame):
                 messagebox.showerror("Error", current, parent=dialog)
                 return
 
-            # Update goal
-            success, message = update_goal(goal_id, self.user.id, current_amount=current)
+            def on_saved(message, change):
+                if dialog.winfo_exists():
+                    messagebox.showinfo("Success", message, parent=dialog)
+                    dialog.destroy()
 
-            if success:
-                messagebox.showinfo("Success", message, parent=dialog)
-                dialog.destroy()
+                self.show_goal(change.record)
 
-                # Reload goals
-                self.load_goals()
-            else:
-                messagebox.showerror("Error", message, parent=dialog)
+            # Update goal
+            user_id = self.user.id
+            self.save(lambda: update_goal_async(goal_id, user_id, current_amount=current), on_saved, dialog)
 
         ttk.Button(dialog, text="Update Goal", command=submit).pack(padx=10, pady=10)
 
         # Cancel button
         ttk.Button(dialog, text="Cancel", command=dialog.destroy).pack(padx=10, pady=5)
 
-    def update_stats(self):
-        # Get current month and year
+    @staticmethod
+    def fetch_stats(user_id):
+        # worker thread: current month summary
         now = datetime.datetime.now()
-        current_month = now.month
-        current_year = now.year
+        return now.year, now.month, get_monthly_summary(user_id, now.year, now.month)
+
+    def update_stats(self):
+        user_id = self.user.id
+        self.loader.submit('stats', lambda: self.fetch_stats(user_id), self.show_stats)
 
-        # Get monthly summary
-        from app.budget import get_monthly_summary
-        summary = get_monthly_summary(self.user.id, current_year, current_month)
+    def show_stats(self, stats):
+        current_year, current_month, summary = stats
+        self.stats = stats
 
         # Update text widget
         self.stats_text.config(state=tk.NORMAL)
         self.stats_text.delete(1.0, tk.END)
 
-        import calendar
         month_name = calendar.month_name[current_month]
 
         stats_text = f"{month_name} {current_year} Summary:\n"
@@ -0,0 +1,65 @@
+from tkinter import ttk
+
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+from app.charts import REPORT_CHARTS, report_kind
+
+
+class ChartView(ttk.Frame):
+    """
+    Report charts drawn on an embedded matplotlib canvas.
+
+    The figure stays alive between reports. Showing another period only updates the
+    data artists (bars, lines, pie wedges), which are marked animated: they are drawn
+    over a saved copy of the static parts (axes, ticks, titles) and blitted. Axes,
+    ticks and labels are only drawn again when the axis limits change or the canvas
+    is resized; limits are kept while the new data still fills at least half the range.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.kind = None
+        self.chart = None
+        self.canvas = None
+        self.background = None
+
+    def show(self, report_data):
+        kind = report_kind(report_data)
+        if kind != self.kind:
+            self._build(kind)
+
+        limits = self.chart.view_limits()
+        self.chart.update(report_data, sticky_limits=True)
+        for artist in self.chart.data_artists():
+            artist.set_animated(True)
+
+        if self.background is None or self.chart.view_limits() != limits:
+            # full redraw, on_draw saves the new background and adds the data artists
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self._draw_data_artists()
+            self.canvas.blit(self.chart.figure.bbox)
+
+    def _build(self, kind):
+        # Monthly and yearly reports have different figures; switching type swaps the canvas
+        if self.canvas is not None:
+            self.canvas.get_tk_widget().destroy()
+
+        self.kind = kind
+        self.chart = REPORT_CHARTS[kind]()
+        self.background = None
+
+        self.canvas = FigureCanvasTkAgg(self.chart.figure, master=self)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def on_draw(self, event):
+        # After every full draw (first show, new limits, resize) keep the static parts
+        self.background = self.canvas.copy_from_bbox(self.chart.figure.bbox)
+        self._draw_data_artists()
+
+    def _draw_data_artists(self):
+        figure = self.chart.figure
+        for artist in sorted(self.chart.data_artists(), key=lambda a: a.get_zorder()):
+            figure.draw_artist(artist)
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 
 from app.auth import register_user, login_user
+from app.ui.background import BackgroundLoader
 
 
 class LoginFrame(ttk.Frame):
@@ -11,6 +12,9 @@ class LoginFrame(ttk.Frame):
         self.parent = parent
         self.login_callback = login_callback
 
+        # password hashing takes a few hundred ms, it runs here instead of on the Tk thread
+        self.loader = BackgroundLoader(self, max_workers=1, on_busy_change=self.set_busy)
+
         # grid
         self.grid_columnconfigure(0, weight=1)
 
@@ -38,8 +42,8 @@ class LoginFrame(ttk.Frame):
                                                                               sticky="ew")
 
         # Login button
-        login_button = ttk.Button(login_frame, text="Login", command=self.login)
-        login_button.grid(row=2, column=0, columnspan=2, padx=5, pady=10)
+        self.login_button = ttk.Button(login_frame, text="Login", command=self.login)
+        self.login_button.grid(row=2, column=0, columnspan=2, padx=5, pady=10)
 
         # Register section
         register_frame = ttk.LabelFrame(self, text="Register")
@@ -67,8 +71,8 @@ class LoginFrame(ttk.Frame):
                                                                                              pady=5, sticky="ew")
 
         # Register button
-        register_button = ttk.Button(register_frame, text="Register", command=self.register)
-        register_button.grid(row=3, column=0, columnspan=2, padx=5, pady=10)
+        self.register_button = ttk.Button(register_frame, text="Register", command=self.register)
+        self.register_button.grid(row=3, column=0, columnspan=2, padx=5, pady=10)
 
         # title
         title_label = ttk.Label(self, text="Budget Planner", font=("Arial", 18, "bold"))
@@ -77,6 +81,17 @@ class LoginFrame(ttk.Frame):
         desc_label = ttk.Label(self, text="Track your finances, set goals, and plan your budget.")
         desc_label.grid(row=3, column=0, padx=20, pady=5)
 
+        self.status_label = ttk.Label(self, text="")
+        self.status_label.grid(row=4, column=0, padx=20, pady=5)
+
+    def set_busy(self, busy):
+        # one login or registration at a time
+        state = "disabled" if busy else "normal"
+        self.login_button.configure(state=state)
+        self.register_button.configure(state=state)
+        if not busy:
+            self.status_label.configure(text="")
+
     def login(self):
         username = self.username_var.get().strip()
         password = self.password_var.get().strip()
@@ -87,7 +102,11 @@ class LoginFrame(ttk.Frame):
             return
 
         # Authenticate user
-        success, result = login_user(username, password)
+        self.status_label.configure(text="Logging in...")
+        self.loader.submit('auth', lambda: login_user(username, password), self.on_login_done)
+
+    def on_login_done(self, outcome):
+        success, result = outcome
 
         if success:
             self.login_callback(result)
@@ -113,7 +132,11 @@ class LoginFrame(ttk.Frame):
             return
 
         # Register user
-        success, message = register_user(username, password)
+        self.status_label.configure(text="Creating account...")
+        self.loader.submit('auth', lambda: register_user(username, password), self.on_register_done)
+
+    def on_register_done(self, outcome):
+        success, message = outcome
 
         if success:
             messagebox.showinfo("Success", message)
@@ -121,4 +144,8 @@ class LoginFrame(ttk.Frame):
             self.reg_password_var.set("")
             self.reg_confirm_password_var.set("")
         else:
-            messagebox.showerror("Registration Failed", message)
\ No newline at end of file
+            messagebox.showerror("Registration Failed", message)
+
+    def destroy(self):
+        self.loader.shutdown()
+        super().destroy()
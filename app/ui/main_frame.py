@@ -1,8 +1,9 @@
 import tkinter as tk
 from tkinter import ttk
 
+from app import instrumentation
 from app.ui.budget_frame import BudgetFrame
-from app.ui.report_frame import ReportFrame
+from app.ui.background import BackgroundLoader
 
 
 class MainFrame(ttk.Frame):
@@ -17,6 +18,9 @@ class MainFrame(ttk.Frame):
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
 
+        # Shared by both tabs so the status bar shows all background work
+        self.loader = BackgroundLoader(self, on_busy_change=self.set_busy)
+
         self.create_widgets()
 
         self.show_frame("budget")
@@ -41,18 +45,6 @@ class MainFrame(ttk.Frame):
         logout_button = ttk.Button(header_frame, text="Logout", command=self.logout_callback)
         logout_button.grid(row=0, column=2, padx=5, pady=5, sticky="e")
 
-        # Tab control
-        self.tab_control = ttk.Notebook(self)
-        self.tab_control.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
-
-        # Budget
-        self.budget_frame = BudgetFrame(self.tab_control, self.user)
-        self.tab_control.add(self.budget_frame, text="Budget")
-
-        # Reports
-        self.report_frame = ReportFrame(self.tab_control, self.user)
-        self.tab_control.add(self.report_frame, text="Reports")
-
         # Footer
         footer_frame = ttk.Frame(self)
         footer_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=5)
@@ -63,6 +55,41 @@ class MainFrame(ttk.Frame):
         status_bar = ttk.Label(footer_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
+        # Busy indicator, shown while background jobs are running
+        self.busy_bar = ttk.Progressbar(footer_frame, mode="indeterminate", length=120)
+
+        # Query stats, only when started with --profile-queries
+        if instrumentation.is_enabled():
+            stats_button = ttk.Button(footer_frame, text="Query Stats", command=self.show_query_stats)
+            stats_button.pack(side=tk.RIGHT, padx=5)
+
+        # Tab control
+        self.tab_control = ttk.Notebook(self)
+        self.tab_control.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
+
+        # Budget
+        self.budget_frame = BudgetFrame(self.tab_control, self.user, self.loader)
+        self.tab_control.add(self.budget_frame, text="Budget")
+
+        # Reports - built the first time the tab is opened
+        self.report_tab = ttk.Frame(self.tab_control)
+        self.report_tab.grid_columnconfigure(0, weight=1)
+        self.report_tab.grid_rowconfigure(0, weight=1)
+        self.tab_control.add(self.report_tab, text="Reports")
+        self.report_frame = None
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    def on_tab_changed(self, event=None):
+        if self.report_frame is None and self.tab_control.select() == str(self.report_tab):
+            self.build_report_frame()
+
+    def build_report_frame(self):
+        # Pulls in the reporting modules (matplotlib, fpdf, PIL) on first use
+        from app.ui.report_frame import ReportFrame
+
+        self.report_frame = ReportFrame(self.report_tab, self.user, self.loader)
+        self.report_frame.grid(row=0, column=0, sticky="nsew")
+
     def show_frame(self, frame_name):
         if frame_name == "budget":
             self.tab_control.select(0)
@@ -70,4 +97,30 @@ class MainFrame(ttk.Frame):
             self.tab_control.select(1)
 
     def set_status(self, message):
-        self.status_var.set(message)
\ No newline at end of file
+        self.status_var.set(message)
+
+    def set_busy(self, busy):
+        if busy:
+            self.set_status("Loading...")
+            self.busy_bar.pack(side=tk.RIGHT, padx=5)
+            self.busy_bar.start(10)
+        else:
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+            self.set_status("Ready")
+
+    def show_query_stats(self):
+        summary = instrumentation.summary()
+        print(summary)
+        self.set_status(instrumentation.status_line())
+
+        window = tk.Toplevel(self)
+        window.title("Query Stats")
+        text = tk.Text(window, wrap="none", font=("Courier", 10), width=110, height=30)
+        text.insert("1.0", summary)
+        text.configure(state="disabled")
+        text.pack(fill="both", expand=True)
+
+    def destroy(self):
+        self.loader.shutdown()
+        super().destroy()
\ No newline at end of file
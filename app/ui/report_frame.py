@@ -1,22 +1,26 @@
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
-import io
 import datetime
 import calendar
 
+from app.budget import count_transactions, get_transactions_page
 from app.reports import BudgetReport, generate_documentation
 from app.utils import get_month_year_range
+from app.ui.background import BackgroundLoader
+from app.ui.virtual_list import VirtualTreeview
 
 
 class ReportFrame(ttk.Frame):
 
-    def __init__(self, parent, user):
+    def __init__(self, parent, user, loader=None):
         super().__init__(parent)
         self.parent = parent
         self.user = user
 
+        # Report building runs on worker threads, results come back on the Tk thread
+        self.loader = loader or BackgroundLoader(self)
+
         # grid
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
@@ -60,9 +64,14 @@ class ReportFrame(ttk.Frame):
         export_button = ttk.Button(controls_frame, text="Export to PDF", command=self.export_report)
         export_button.grid(row=4, column=0, columnspan=2, padx=5, pady=5)
 
+        # Every transaction ever recorded, however many pages that takes
+        export_all_button = ttk.Button(controls_frame, text="Export All Transactions",
+                                       command=self.export_all_transactions)
+        export_all_button.grid(row=5, column=0, columnspan=2, padx=5, pady=5)
+
         # Documentation button
         doc_button = ttk.Button(controls_frame, text="Generate Documentation", command=self.generate_doc)
-        doc_button.grid(row=5, column=0, columnspan=2, padx=5, pady=5)
+        doc_button.grid(row=6, column=0, columnspan=2, padx=5, pady=5)
 
         # Report display
         report_frame = ttk.LabelFrame(self, text="Report Preview")
@@ -99,7 +108,7 @@ class ReportFrame(ttk.Frame):
 
         # Initialize report data
         self.report_data = None
-        self.chart_image = None
+        self.chart_view = None
 
     def on_report_type_change(self, event=None):
         # Enable/disable month combobox based on report type
@@ -116,15 +125,20 @@ class ReportFrame(ttk.Frame):
         year = self.year_var.get()
         month = self.month_var.get()
 
-        try:
-            # Generate report based on type
+        if report_type == "Monthly":
+            title = f"Monthly Report - {calendar.month_name[month]} {year}"
+        else:  # Yearly
+            title = f"Yearly Report - {year}"
+
+        def build():
+            # worker thread: queries only, no Tk calls; charts are drawn on the embedded canvas
             if report_type == "Monthly":
-                self.report_data = report.generate_monthly_report(year, month)
-                month_name = calendar.month_name[month]
-                self.report_title_var.set(f"Monthly Report - {month_name} {year}")
-            else:  # Yearly
-                self.report_data = report.generate_yearly_report(year)
-                self.report_title_var.set(f"Yearly Report - {year}")
+                return report.generate_monthly_report(year, month)
+            return report.generate_yearly_report(year)
+
+        def show(report_data):
+            self.report_data = report_data
+            self.report_title_var.set(title)
 
             # Update report display
             self.update_report_display()
@@ -132,8 +146,9 @@ class ReportFrame(ttk.Frame):
             # Show the report notebook
             self.report_notebook.select(0)  # Show summary tab
 
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+        # a newer click replaces a report that is still being built
+        self.report_title_var.set(f"{title} (loading...)")
+        self.loader.submit('report', build, show)
 
     def update_report_display(self):
         if not self.report_data:
@@ -146,9 +161,6 @@ class ReportFrame(ttk.Frame):
         for widget in self.transactions_frame.winfo_children():
             widget.destroy()
 
-        for widget in self.charts_frame.winfo_children():
-            widget.destroy()
-
         for widget in self.goals_frame.winfo_children():
             widget.destroy()
 
@@ -156,7 +168,7 @@ class ReportFrame(ttk.Frame):
         self.update_summary_tab()
 
         # Update transactions tab (only for monthly reports)
-        if 'transactions' in self.report_data:
+        if 'summary' in self.report_data:
             self.update_transactions_tab()
 
         # Update charts tab
@@ -253,25 +265,16 @@ class ReportFrame(ttk.Frame):
         transactions_content = ttk.Frame(self.transactions_frame)
         transactions_content.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
-        # treeview for transactions
-        tree = ttk.Treeview(transactions_content, columns=("date", "category", "amount", "description"))
-        tree.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
-
-        # columns
-        tree.heading("#0", text="ID")
-        tree.heading("date", text="Date")
-        tree.heading("category", text="Category")
-        tree.heading("amount", text="Amount")
-        tree.heading("description", text="Description")
+        # treeview for transactions, paged from the DB instead of holding the whole month
+        user_id = self.user.id
+        start_date = self.report_data['start_date']
+        end_date = self.report_data['end_date']
 
-        tree.column("#0", width=50)
-        tree.column("date", width=100)
-        tree.column("category", width=150)
-        tree.column("amount", width=100)
-        tree.column("description", width=200)
+        def fetch_page(limit, after, offset, sort, descending):
+            return get_transactions_page(user_id, start_date, end_date, limit=limit, after=after, offset=offset,
+                                         sort=sort, descending=descending)
 
-        # Add data
-        for transaction in self.report_data['transactions']:
+        def format_row(transaction):
             # Determine if it's income or expense based on category type
             amount_display = f"${abs(transaction.amount):.2f}"
             if transaction.category_is_income:
@@ -279,32 +282,41 @@ class ReportFrame(ttk.Frame):
             else:
                 amount_display += " (Expense)"
 
-            tree.insert(
-                "", "end", text=str(transaction.id),
-                values=(
-                    transaction.date.strftime("%Y-%m-%d"),
-                    transaction.category_name,
-                    amount_display,
-                    transaction.description or ""
-                )
+            return str(transaction.id), (
+                transaction.date.strftime("%Y-%m-%d"),
+                transaction.category_name,
+                amount_display,
+                transaction.description or ""
             )
 
-    def update_charts_tab(self):
-        # frame for charts
-        charts_content = ttk.Frame(self.charts_frame)
-        charts_content.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        tree = VirtualTreeview(
+            transactions_content,
+            columns=[
+                ("#0", "ID", 50, None),
+                ("date", "Date", 100, "date"),
+                ("category", "Category", 150, "category"),
+                ("amount", "Amount", 100, "amount"),
+                ("description", "Description", 200, None),
+            ],
+            fetch_page=fetch_page,
+            count_rows=lambda: count_transactions(user_id, start_date, end_date),
+            format_row=format_row,
+            sort="date",
+            descending=False,
+            loader=self.loader
+        )
+        tree.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
+        tree.refresh()
 
-        # Generate chart
-        report = BudgetReport(self.user.id)
-        chart_data = report.generate_charts(self.report_data)
+    def update_charts_tab(self):
+        # The canvas is kept between reports, a new period only redraws the changed artists
+        if self.chart_view is None:
+            from app.ui.chart_view import ChartView
 
-        # Convert bytes to image
-        img = Image.open(io.BytesIO(chart_data))
-        self.chart_image = ImageTk.PhotoImage(img)
+            self.chart_view = ChartView(self.charts_frame)
+            self.chart_view.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
-        # Display image
-        chart_label = ttk.Label(charts_content, image=self.chart_image)
-        chart_label.pack(padx=5, pady=5)
+        self.chart_view.show(self.report_data)
 
     def update_goals_tab(self):
         goals_content = ttk.Frame(self.goals_frame)
@@ -354,26 +366,41 @@ class ReportFrame(ttk.Frame):
         if not file_path:
             return
 
-        try:
-            # Create a BudgetReport instance
-            report = BudgetReport(self.user.id)
-
-            # Export to PDF
-            success = report.export_to_pdf(self.report_data, file_path)
+        # Create a BudgetReport instance
+        report = BudgetReport(self.user.id)
+        report_data = self.report_data
 
+        def on_done(success):
             if success:
                 messagebox.showinfo("Success", f"Report exported to {file_path}")
             else:
                 messagebox.showerror("Error", "Failed to export report")
 
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+        # Export to PDF
+        self.loader.submit('export', lambda: report.export_to_pdf(report_data, file_path), on_done)
 
-    def generate_doc(self):
-        try:
-            doc_path = generate_documentation()
+    def export_all_transactions(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            filetypes=[("PDF Files", "*.pdf")],
+            title="Save Transactions As"
+        )
+
+        if not file_path:
+            return
 
+        report = BudgetReport(self.user.id)
+
+        def on_done(success):
+            if success:
+                messagebox.showinfo("Success", f"Transactions exported to {file_path}")
+            else:
+                messagebox.showerror("Error", "Failed to export transactions")
+
+        self.loader.submit('export', lambda: report.export_transactions_pdf(file_path), on_done)
+
+    def generate_doc(self):
+        def on_done(doc_path):
             messagebox.showinfo("Success", f"Documentation generated at {doc_path}")
 
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
\ No newline at end of file
+        self.loader.submit('documentation', generate_documentation, on_done)
\ No newline at end of file
@@ -0,0 +1,299 @@
+from tkinter import ttk, messagebox
+from collections import OrderedDict
+
+# Fallback when the theme doesn't report a Treeview row height (pixels)
+DEFAULT_ROW_HEIGHT = 20
+HEADER_HEIGHT = 25
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    Treeview for lists too long to load at once.
+
+    Only the rows on screen exist as Treeview items; records are fetched a page at a
+    time as the user scrolls and a few pages are kept around as a buffer. Sorting is
+    done by the query, not in Tk.
+
+    columns:    list of (column_id, heading, width, sort_key); "#0" is the tree column,
+                sort_key is passed to fetch_page (None = column not sortable)
+    fetch_page: fetch_page(limit, after, offset, sort, descending) -> (records, next_cursor)
+    count_rows: count_rows() -> total number of records
+    format_row: format_row(record) -> (text, values) for one Treeview item
+    sort_key:   sort_key(record, sort) -> the record's (value, id) cursor in that order;
+                needed for insert_record, without it an insert refreshes the list
+    loader:     optional BackgroundLoader, queries then run off the Tk thread
+    """
+
+    def __init__(self, parent, columns, fetch_page, count_rows, format_row, page_size=100, cached_pages=10,
+                 sort=None, descending=True, sort_key=None, loader=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.fetch_page = fetch_page
+        self.count_rows = count_rows
+        self.format_row = format_row
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.sort = sort
+        self.descending = descending
+        self.sort_key = sort_key
+        self.loader = loader
+
+        self.total = 0
+        self.first = 0
+        self.visible = 10
+        self._pages = OrderedDict()
+        self._cursors = {}
+        self._loading = set()
+        self._counting = False
+        self._generation = 0
+        self._jobs = set()
+        self._items = []
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.create_widgets()
+
+    def create_widgets(self):
+        data_columns = [column_id for column_id, _, _, _ in self.columns if column_id != "#0"]
+        has_tree_column = any(column_id == "#0" for column_id, _, _, _ in self.columns)
+
+        self.tree = ttk.Treeview(self, columns=data_columns, show="tree headings" if has_tree_column else "headings",
+                                 selectmode="browse")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+
+        for column_id, heading, width, sort_key in self.columns:
+            command = (lambda key=sort_key: self.sort_by(key)) if sort_key else ""
+            self.tree.heading(column_id, text=heading, command=command)
+            self.tree.column(column_id, width=width)
+        self.update_headings()
+
+        # The scrollbar tracks the position in the whole list, not in the Treeview
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_rows(-self.visible))
+        self.tree.bind("<Next>", lambda event: self.scroll_rows(self.visible))
+
+    def refresh(self):
+        # Drop everything cached and count again, e.g. after a write or a new filter
+        self._generation += 1
+        self._pages.clear()
+        self._cursors.clear()
+        self._loading.clear()
+
+        generation = self._generation
+        self._counting = True
+
+        def on_count(total):
+            if generation != self._generation or not self.winfo_exists():
+                return
+            self._counting = False
+            self.total = total
+            self.first = max(0, min(self.first, self.total - self.visible))
+            self.render()
+
+        self._run("count", self.count_rows, on_count)
+
+    def insert_record(self, record):
+        """
+        Show a record that was just written without reloading the list.
+
+        The record goes into its cached page; pages after it have all shifted by one
+        row, so they are dropped and fetched again only if the user scrolls to them.
+        """
+        if self.sort_key is None or self._counting:
+            # no way to place it, or a reload is already under way
+            self.refresh()
+            return
+
+        # fetches already in flight may have read the list before this write
+        self._generation += 1
+        self._loading.clear()
+        self.total += 1
+
+        key = self.sort_key(record, self.sort)
+
+        # the last cached page that the record sorts after entirely
+        previous = -1
+        for page in sorted(self._pages):
+            rows = self._pages[page]
+            if page != previous + 1 or len(rows) < self.page_size:
+                break
+            if self._sorts_before(key, self.sort_key(rows[-1], self.sort)):
+                break
+            previous = page
+
+        if previous >= 0 and self._cursors.get(previous) is None:
+            # it was the last page, now there is a row after it
+            self._cursors[previous] = self.sort_key(self._pages[previous][-1], self.sort)
+
+        page = previous + 1
+        rows = self._pages.get(page)
+        if rows is not None:
+            position = 0
+            while position < len(rows) and not self._sorts_before(key, self.sort_key(rows[position], self.sort)):
+                position += 1
+            rows = rows[:position] + [record] + rows[position:]
+            if len(rows) > self.page_size:
+                rows.pop()
+                self._cursors[page] = self.sort_key(rows[-1], self.sort)
+            self._pages[page] = rows
+            page += 1
+
+        for stale in [p for p in self._pages if p >= page]:
+            del self._pages[stale]
+        for stale in [p for p in self._cursors if p >= page]:
+            del self._cursors[stale]
+
+        self.render()
+
+    def _sorts_before(self, key, other):
+        return key > other if self.descending else key < other
+
+    def sort_by(self, sort_key):
+        if sort_key == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort = sort_key
+            self.descending = sort_key == "date"
+
+        self.first = 0
+        self.update_headings()
+        self.refresh()
+
+    def update_headings(self):
+        for column_id, heading, _, sort_key in self.columns:
+            if sort_key and sort_key == self.sort:
+                heading += " ▼" if self.descending else " ▲"
+            self.tree.heading(column_id, text=heading)
+
+    def record_at(self, index):
+        rows = self._pages.get(index // self.page_size)
+        if rows is None:
+            return None
+        self._pages.move_to_end(index // self.page_size)
+        offset = index % self.page_size
+        return rows[offset] if offset < len(rows) else None
+
+    def selected_record(self):
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return self.record_at(self.first + self._items.index(selection[0]))
+
+    def render(self):
+        # Match the number of items to what's on screen, then fill them from the page cache
+        wanted = max(0, min(self.visible, self.total - self.first))
+        while len(self._items) < wanted:
+            self._items.append(self.tree.insert("", "end"))
+        while len(self._items) > wanted:
+            self.tree.delete(self._items.pop())
+
+        for position, item in enumerate(self._items):
+            record = self.record_at(self.first + position)
+            if record is None:
+                self.tree.item(item, text="", values=("Loading...",))
+            else:
+                text, values = self.format_row(record)
+                self.tree.item(item, text=text, values=values)
+
+        # Fetch the pages under the window plus one page either side
+        first_page = max(0, self.first // self.page_size - 1)
+        last_page = (self.first + self.visible) // self.page_size + 1
+        for page in range(first_page, last_page + 1):
+            if page * self.page_size < self.total:
+                self.request_page(page)
+
+        if self.total:
+            self.scrollbar.set(self.first / self.total, min(1.0, (self.first + self.visible) / self.total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def request_page(self, page):
+        if page in self._pages or page in self._loading:
+            return
+
+        # Continue from the previous page's cursor when we have it, otherwise jump by offset
+        after = self._cursors.get(page - 1) if page > 0 else None
+        offset = page * self.page_size if page > 0 and after is None else None
+        sort, descending, generation = self.sort, self.descending, self._generation
+
+        def fetch():
+            return self.fetch_page(self.page_size, after, offset, sort, descending)
+
+        def on_page(result):
+            if generation != self._generation or not self.winfo_exists():
+                return
+            rows, next_cursor = result
+            self._loading.discard(page)
+            self._pages[page] = rows
+            self._cursors[page] = next_cursor
+            while len(self._pages) > self.cached_pages:
+                self._pages.popitem(last=False)
+            self.render()
+
+        self._loading.add(page)
+        self._run(f"page-{page}", fetch, on_page)
+
+    def _run(self, job, func, on_done):
+        if self.loader is None:
+            on_done(func())
+            return
+
+        key = f"virtual-list-{id(self)}-{job}"
+
+        def on_result(result):
+            self._jobs.discard(key)
+            on_done(result)
+
+        def on_error(error):
+            self._jobs.discard(key)
+            self._loading.clear()
+            self._counting = False
+            messagebox.showerror("Error", f"An error occurred: {str(error)}")
+
+        # only keys still in flight, for destroy() to cancel; the loader calls back for
+        # the latest submit of a key only, so that one removes it
+        self._jobs.add(key)
+        self.loader.submit(key, func, on_result, on_error)
+
+    def destroy(self):
+        # Queries still running must not call back into the destroyed Treeview
+        self._generation += 1
+        if self.loader is not None:
+            for key in self._jobs:
+                self.loader.cancel(key)
+        self._jobs.clear()
+        super().destroy()
+
+    def yview(self, *args):
+        # Scrollbar command: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * self.total)
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.first += int(args[1]) * step
+        self.scroll_rows(0)
+
+    def scroll_rows(self, count):
+        first = max(0, min(self.first + count, self.total - self.visible))
+        if first != self.first or count == 0:
+            self.first = first
+            self.tree.selection_remove(self.tree.selection())
+            self.render()
+
+    def on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT
+        visible = max(1, (event.height - HEADER_HEIGHT) // int(row_height))
+        if visible != self.visible:
+            self.visible = visible
+            self.first = max(0, min(self.first, self.total - self.visible))
+            self.render()
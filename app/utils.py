@@ -1,10 +1,5 @@
 import os
 import datetime
-import matplotlib
-
-matplotlib.use('Agg')  # backend to non-interactive
-import matplotlib.pyplot as plt
-import io
 
 
 def get_month_year_range():
@@ -51,49 +46,46 @@ def validate_date(year, month, day):
         return False, "Invalid date"
 
 
-def create_chart_image(plt_func, *args, **kwargs):
-    plt.figure(figsize=(8, 5))
-
-    # Call the plotting function
-    plt_func(*args, **kwargs)
+def create_chart_image(plot_func, *args, **kwargs):
+    # matplotlib is only imported the first time a chart is drawn
+    from app.charts import new_figure, figure_png
 
-    plt.grid(True, linestyle='--', alpha=0.7)
+    figure = new_figure((8, 5))
+    ax = figure.add_subplot()
 
-    plt.tight_layout()
+    # Call the plotting function with the axes to draw on
+    plot_func(ax, *args, **kwargs)
 
-    # Save to a bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
+    ax.grid(True, linestyle='--', alpha=0.7)
 
-    # Close the plot to free memory
-    plt.close()
+    figure.tight_layout()
 
-    return buf.getvalue()
+    # PNG bytes; the figure isn't registered with pyplot, so nothing to close
+    return figure_png(figure)
 
 
 def create_expense_pie_chart(categories, amounts):
-    def plot_func():
-        plt.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90)
-        plt.axis('equal')
-        plt.title('Expenses by Category')
+    def plot_func(ax):
+        ax.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')
+        ax.set_title('Expenses by Category')
 
     return create_chart_image(plot_func)
 
 
 def create_income_expense_bar_chart(periods, incomes, expenses):
-    def plot_func():
+    def plot_func(ax):
         x = range(len(periods))
         width = 0.35
 
-        plt.bar([i - width / 2 for i in x], incomes, width, label='Income')
-        plt.bar([i + width / 2 for i in x], expenses, width, label='Expenses')
+        ax.bar([i - width / 2 for i in x], incomes, width, label='Income')
+        ax.bar([i + width / 2 for i in x], expenses, width, label='Expenses')
 
-        plt.xlabel('Period')
-        plt.ylabel('Amount ($)')
-        plt.title('Income vs Expenses')
-        plt.xticks(x, periods)
-        plt.legend()
+        ax.set_xlabel('Period')
+        ax.set_ylabel('Amount ($)')
+        ax.set_title('Income vs Expenses')
+        ax.set_xticks(list(x), periods)
+        ax.legend()
 
     return create_chart_image(plot_func)
 
@@ -0,0 +1,189 @@
+"""
+Single writer thread for database writes.
+
+SQLite lets one connection write at a time; with several threads (or the importer, the
+UI and a batch job) writing through pooled connections, the losers get "database is
+locked". Every write in app/budget.py and app/auth.py is therefore a job queued to one
+WriteQueue thread, which owns the process's only write connection:
+
+    future = submit_write(job, *args)   # runs job(session, *args) on the writer thread
+    result = future.result()
+
+Jobs that queue up while a transaction is running are committed together in the next
+one, each inside its own SAVEPOINT so a failing job doesn't undo the others. Each
+transaction starts with BEGIN IMMEDIATE, so waiting for another process's write lock
+happens up front (busy_timeout) instead of failing halfway through a job.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import database, instrumentation
+
+# Jobs committed in one transaction at most
+MAX_GROUP_SIZE = 200
+
+# When another process holds the write lock for longer than busy_timeout
+LOCK_RETRIES = 2
+LOCK_RETRY_DELAY = 0.2
+
+
+class WriteQueue:
+    """Runs write jobs on a dedicated thread with its own connection, see the module docstring."""
+
+    def __init__(self, engine, max_group_size=MAX_GROUP_SIZE):
+        self.engine = engine
+        self.max_group_size = max_group_size
+        self.jobs = 0
+        self.transactions = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="budget-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, job, *args, on_error=None):
+        """
+        Queue job(session, *args), returns a Future of its return value. The job must not
+        commit. If it raises, its changes are rolled back and the Future gets the
+        exception, or on_error(exception) as its result when on_error is given.
+        """
+        if threading.current_thread() is self._thread:
+            # the job would wait for itself
+            raise RuntimeError("Write jobs can't submit other write jobs")
+
+        future = Future()
+        self._queue.put((future, job, args, on_error, instrumentation.current_calls()))
+        return future
+
+    def close(self):
+        # Finish what's queued, then release the connection
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            connection = self.engine.connect()
+        except Exception as e:
+            # no connection, no writes: answer every job with the error
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    return
+                self._finish([entry], [(False, e)])
+
+        # pysqlite starts transactions on its own and breaks SAVEPOINTs; turn that off
+        # and BEGIN by hand (this connection is thrown away at the end, not pooled)
+        connection.connection.dbapi_connection.isolation_level = None
+
+        try:
+            stopping = False
+            while not stopping:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+
+                group = [entry]
+                while len(group) < self.max_group_size:
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is None:
+                        stopping = True
+                        break
+                    group.append(entry)
+
+                group = [entry for entry in group if entry[0].set_running_or_notify_cancel()]
+                if group:
+                    self._commit_group(connection, group)
+        finally:
+            connection.invalidate()
+            connection.close()
+
+    def _commit_group(self, connection, group):
+        # each job's statements (retries included) count for the calls that queued it
+        jobs = [instrumentation.collector(calls) for _, _, _, _, calls in group]
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                outcomes = self._run_group(connection, group, jobs)
+                break
+            except OperationalError as e:
+                if 'locked' in str(e) and attempt < LOCK_RETRIES:
+                    time.sleep(LOCK_RETRY_DELAY * (attempt + 1))
+                    continue
+                outcomes = [(False, e)] * len(group)
+                break
+            except Exception as e:
+                outcomes = [(False, e)] * len(group)
+                break
+
+        self.jobs += len(group)
+        self.transactions += 1
+        self._finish(group, outcomes, jobs)
+
+    def _finish(self, group, outcomes, jobs=None):
+        # only now is everything committed (or not)
+        for index, ((future, _, _, on_error, calls), (success, value)) in enumerate(zip(group, outcomes)):
+            if jobs:
+                # before the future resolves, so a caller waiting for it sees the statements
+                instrumentation.charge(calls, jobs[index])
+            if success:
+                future.set_result(value)
+            elif on_error is not None:
+                future.set_result(on_error(value))
+            else:
+                future.set_exception(value)
+
+    def _run_group(self, connection, group, jobs):
+        outcomes = []
+        with connection.begin():
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            session = Session(bind=connection, expire_on_commit=False)
+            try:
+                for (_, job, args, _, _), statements in zip(group, jobs):
+                    try:
+                        # statements count for the call that queued the job (if instrumented)
+                        with instrumentation.attributed_to(statements), session.begin_nested():
+                            outcomes.append((True, job(session, *args)))
+                    except OperationalError as e:
+                        if 'locked' in str(e):
+                            raise
+                        outcomes.append((False, e))
+                    except Exception as e:
+                        outcomes.append((False, e))
+            finally:
+                session.close()
+        return outcomes
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process's WriteQueue, started on first use"""
+    global _writer
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteQueue(database.get_engine())
+
+    return _writer
+
+
+def submit_write(job, *args, on_error=None):
+    return get_writer().submit(job, *args, on_error=on_error)
+
+
+def close_writer():
+    # Called by database.dispose_engine(), the next write starts a new writer
+    global _writer
+
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
@@ -0,0 +1 @@
+"""Performance benchmarks for the Budget Planner, run with `python -m benchmarks.<name>`"""
@@ -0,0 +1,82 @@
+"""
+Rows per second loaded through add_transactions() compared with add_transaction() in a loop,
+and how much longer the loaded rows take to become searchable.
+
+With the defaults on one core, add_transactions loaded ~93k rows/s when it was added.
+Every description is now encrypted first (~0.65 s per 200k rows), which with SQLite's
+own ~1.1 s for the rows and their two indexes leaves ~68k rows/s; there the load is CPU
+bound, and the next batch is prepared while the writer thread inserts the previous one
+only helps on more cores. The rows are indexed for search afterwards by app.search's
+indexer thread, ~5.5 s more for these all-different descriptions ("row 123"), less with
+the repetitive vocabulary of real statements.
+
+    python -m benchmarks.bench_bulk_insert [--rows N] [--batch-size N]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import tempfile
+import time
+
+from app import database
+from app.auth import register_user, login_user
+from app.budget import get_categories, add_transaction, add_transactions, BULK_BATCH_SIZE
+from app.rollups import verify_rollups
+from app.search import wait_for_index
+
+
+def make_rows(count, category_ids, seed=42):
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1)
+    for i in range(count):
+        yield {
+            'amount': round(rng.uniform(1, 500), 2),
+            'description': f"row {i}",
+            'category_id': rng.choice(category_ids),
+            'date': start + datetime.timedelta(minutes=rng.randrange(0, 60 * 24 * 365 * 4)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument('--single-rows', type=int, default=500, help="rows for the add_transaction loop")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(db_url=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        register_user('bench', 'benchpass')
+        _, user = login_user('bench', 'benchpass')
+        category_ids = [cat.id for cat in get_categories(user.id)]
+
+        rows = list(make_rows(args.single_rows, category_ids, seed=1))
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for row in rows:
+                add_transaction(user.id, row['amount'], row['description'], row['category_id'], row['date'])
+        single_rate = args.single_rows / (time.perf_counter() - start)
+        print(f"{'add_transaction loop':<30} {single_rate:>12,.0f} rows/s")
+
+        rows = list(make_rows(args.rows, category_ids))
+        start = time.perf_counter()
+        inserted, errors = add_transactions(user.id, rows, batch_size=args.batch_size)
+        bulk_rate = inserted / (time.perf_counter() - start)
+        print(f"{'add_transactions':<30} {bulk_rate:>12,.0f} rows/s "
+              f"({inserted} rows, batch size {args.batch_size}, {len(errors)} errors)")
+        print(f"{'speedup':<30} {bulk_rate / single_rate:>12.1f}x")
+
+        # the rows are indexed for search after add_transactions returns
+        start = time.perf_counter()
+        wait_for_index()
+        print(f"{'searchable after':<30} {time.perf_counter() - start:>12.2f} s more")
+        print(f"rollup drift after load: {len(verify_rollups(user.id))} rows")
+
+        database.dispose_engine()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Report charts per second: pyplot state machine with a lock (old) vs reused Figure + Agg renderers,
+single-threaded and in a thread pool.
+
+    python -m benchmarks.bench_charts [--charts N] [--workers N]
+"""
+import argparse
+import calendar
+import io
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from app.charts import render_report_chart
+
+_pyplot_lock = threading.Lock()
+
+
+def legacy_render(report_data):
+    # BudgetReport.generate_charts as it was: a new pyplot figure per chart, one thread at a time
+    with _pyplot_lock:
+        plt.figure(figsize=(10, 8))
+        if 'summary' in report_data:
+            plt.subplot(2, 1, 1)
+            breakdown = report_data['summary']['category_breakdown']
+            plt.pie(list(breakdown.values()), labels=list(breakdown), autopct='%1.1f%%', startangle=90)
+            plt.axis('equal')
+            plt.title('Expense Breakdown')
+            plt.subplot(2, 1, 2)
+            plt.bar(['Income', 'Expenses'],
+                    [report_data['summary']['total_income'], report_data['summary']['total_expenses']])
+            plt.title('Income vs Expenses')
+            plt.ylabel('Amount ($)')
+        else:
+            months = [data['month'][:3] for data in report_data['monthly_data']]
+            plt.subplot(2, 1, 1)
+            plt.plot(months, [data['income'] for data in report_data['monthly_data']], label='Income', marker='o')
+            plt.plot(months, [data['expenses'] for data in report_data['monthly_data']], label='Expenses', marker='o')
+            plt.title('Monthly Income and Expenses')
+            plt.legend()
+            plt.grid(True)
+            plt.subplot(2, 1, 2)
+            plt.bar(['Income', 'Expenses'], [report_data['yearly_income'], report_data['yearly_expenses']])
+            plt.title('Yearly Income vs Expenses')
+            plt.ylabel('Amount ($)')
+        plt.tight_layout()
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png')
+        plt.close()
+        return buf.getvalue()
+
+
+def monthly_report(rng):
+    names = ["Housing", "Food", "Transportation", "Utilities", "Healthcare", "Entertainment", "Shopping"]
+    breakdown = {name: round(rng.uniform(50, 1500), 2) for name in rng.sample(names, rng.randint(3, len(names)))}
+    income = round(rng.uniform(2000, 6000), 2)
+    expenses = sum(breakdown.values())
+    return {'summary': {'total_income': income, 'total_expenses': expenses, 'net': income - expenses,
+                        'category_breakdown': breakdown}}
+
+
+def yearly_report(rng):
+    monthly_data = [{'month': calendar.month_name[month], 'income': rng.uniform(2000, 6000),
+                     'expenses': rng.uniform(1500, 5000)} for month in range(1, 13)]
+    return {'monthly_data': monthly_data,
+            'yearly_income': sum(data['income'] for data in monthly_data),
+            'yearly_expenses': sum(data['expenses'] for data in monthly_data)}
+
+
+def measure(label, render, reports, workers=1):
+    start = time.perf_counter()
+    if workers == 1:
+        for report_data in reports:
+            render(report_data)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render, reports))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {len(reports) / elapsed:>8.1f} charts/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--charts', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    for kind, make_report in (('monthly', monthly_report), ('yearly', yearly_report)):
+        reports = [make_report(rng) for _ in range(args.charts)]
+
+        # warm up font caches etc. so the first variant isn't penalised
+        legacy_render(reports[0])
+        render_report_chart(reports[0])
+
+        print(f"{kind} reports, {args.charts} charts")
+        measure("  pyplot, new figure per chart (old)", legacy_render, reports)
+        measure(f"  pyplot, {args.workers} threads (serialised by lock)", legacy_render, reports, args.workers)
+        measure("  reused Figure + Agg, 1 thread", render_report_chart, reports)
+        measure(f"  reused Figure + Agg, {args.workers} threads", render_report_chart, reports, args.workers)
+
+
+if __name__ == '__main__':
+    main()
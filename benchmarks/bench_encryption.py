@@ -0,0 +1,73 @@
+"""
+Field encryption throughput: the old byte-at-a-time XOR loop against the whole-buffer
+transform, value by value (the column type) and batched (bulk inserts, pages of rows).
+
+    python -m benchmarks.bench_encryption [--values N] [--length CHARS]
+"""
+import argparse
+import random
+import string
+import time
+
+from app.auth import ENCRYPTION_KEY, decrypt_data, encrypt_data
+from app.encryption import get_cipher
+
+
+def legacy_encrypt(data):
+    # the loop auth.encrypt_data used to run, minus the base64 step
+    data_bytes = data.encode('utf-8')
+    encrypted = bytearray()
+    for i, byte in enumerate(data_bytes):
+        encrypted.append(byte ^ ENCRYPTION_KEY[i % len(ENCRYPTION_KEY)])
+    return bytes(encrypted)
+
+
+def timed(func, count):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{func.__name__:<32} {count / elapsed:>12,.0f} values/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--values', type=int, default=100000)
+    parser.add_argument('--length', type=int, default=40, help="characters per value")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    alphabet = string.ascii_letters + " "
+    values = ["".join(rng.choices(alphabet, k=args.length)) for _ in range(args.values)]
+    cipher = get_cipher()
+    stored = cipher.encrypt_many(values)
+
+    def byte_loop_xor():
+        for value in values:
+            legacy_encrypt(value)
+
+    def whole_buffer_xor():
+        for value in values:
+            decrypt_data(encrypt_data(value))
+
+    def encrypt_per_value():
+        for value in values:
+            cipher.encrypt(value)
+
+    def encrypt_many():
+        cipher.encrypt_many(values)
+
+    def decrypt_per_value():
+        for value in stored:
+            cipher.decrypt(value)
+
+    def decrypt_many():
+        cipher.decrypt_many(stored)
+
+    print(f"{args.values:,} values of {args.length} characters")
+    for func in (byte_loop_xor, whole_buffer_xor, encrypt_per_value, encrypt_many, decrypt_per_value, decrypt_many):
+        timed(func, args.values)
+    print("whole_buffer_xor is auth.encrypt_data + decrypt_data (two transforms per value)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Mixed read/write throughput under each SQLite pragma profile, against SQLite's defaults.
+
+Each profile gets a fresh database: a bulk load first, then reader threads (a month of
+transactions + its summary, like the report and budget views) run next to writer
+threads (add_transaction) for a fixed time.
+
+    python -m benchmarks.bench_pragmas [--rows N] [--seconds S] [--readers N] [--writers N]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app import database
+from app.auth import register_user, login_user
+from app.budget import add_transaction, add_transactions, get_categories, get_monthly_summary, get_transactions_page
+from app.search import wait_for_index
+from benchmarks.bench_bulk_insert import make_rows
+
+# None = no PRAGMAs at all (rollback journal, synchronous=FULL), as before the profiles
+PROFILES = [None, 'safe', 'fast', 'bulk-load']
+
+
+def p95(latencies):
+    if not latencies:
+        return 0.0
+    return sorted(latencies)[int(len(latencies) * 0.95)] * 1000
+
+
+def mixed_workload(user_id, category_ids, seconds, readers, writers):
+    # {'read'/'write': [latency, ...]} plus the number of failed operations
+    stop = threading.Event()
+    latencies = {'read': [], 'write': []}
+    errors = []
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            year, month = rng.randint(2020, 2023), rng.randint(1, 12)
+            start = datetime.datetime(year, month, 1)
+            started = time.perf_counter()
+            try:
+                get_transactions_page(user_id, start, start + datetime.timedelta(days=28), limit=50)
+                get_monthly_summary(user_id, year, month)
+            except Exception as e:
+                errors.append(e)
+                continue
+            latencies['read'].append(time.perf_counter() - started)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            started = time.perf_counter()
+            success, _, _ = add_transaction(user_id, round(rng.uniform(1, 500), 2), "bench",
+                                            rng.choice(category_ids), datetime.datetime(2023, 6, 15))
+            if not success:
+                errors.append(success)
+                continue
+            latencies['write'].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(100 + i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return latencies, len(errors)
+
+
+def run_profile(tmp, profile, args):
+    name = profile or 'sqlite defaults'
+    database.configure(db_url=f"sqlite:///{os.path.join(tmp, f'{name}.db')}", pragma_profile=profile,
+                       pool_size=args.readers + args.writers, max_overflow=0)
+    register_user('bench', 'benchpass')
+    _, user = login_user('bench', 'benchpass')
+    category_ids = [cat.id for cat in get_categories(user.id)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        inserted, _ = add_transactions(user.id, make_rows(args.rows, category_ids))
+        load_rate = inserted / (time.perf_counter() - start)
+        # indexing for search would otherwise run during the mixed workload
+        wait_for_index()
+
+        latencies, errors = mixed_workload(user.id, category_ids, args.seconds, args.readers, args.writers)
+
+    database.dispose_engine()
+
+    reads, writes = latencies['read'], latencies['write']
+    print(f"{name:<16} {load_rate:>10,.0f} {len(reads) / args.seconds:>9.1f} {p95(reads):>9.1f} "
+          f"{len(writes) / args.seconds:>9.1f} {p95(writes):>9.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help="transactions bulk loaded before the mixed run")
+    parser.add_argument('--seconds', type=float, default=5.0, help="length of the mixed run per profile")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows loaded, then {args.readers} reader(s) + {args.writers} writer(s) for {args.seconds}s")
+    print(f"{'profile':<16} {'load rows/s':>10} {'reads/s':>9} {'read p95':>9} {'writes/s':>9} {'write p95':>9} "
+          f"{'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in PROFILES:
+            run_profile(tmp, profile, args)
+    print("p95 latencies in ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-row time and memory of get_transactions: ORM hydration + per-call class (old) vs Core rows into records (new).
+
+    python -m benchmarks.bench_row_records [--rows N]
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.orm import joinedload
+
+from app import database
+from app.auth import register_user, login_user
+from app.budget import add_transactions, get_categories, get_transactions, iter_transactions
+from app.database import Transaction, session_scope
+from app.search import wait_for_index
+
+
+def legacy_get_transactions(user_id):
+    # get_transactions as it was: ORM objects with joinedload, copied into a class defined per call
+    with session_scope() as session:
+        transactions = session.query(Transaction).options(joinedload(Transaction.category)).filter_by(
+            user_id=user_id).order_by(Transaction.date.desc()).all()
+
+    class TransactionData:
+        def __init__(self, trans, cat):
+            self.id = trans.id
+            self.amount = trans.amount
+            self.description = trans.description
+            self.date = trans.date
+            self.category_id = trans.category_id
+            self.user_id = trans.user_id
+            self.category_name = cat.name
+            self.category_is_income = cat.is_income
+
+    return [TransactionData(transaction, transaction.category) for transaction in transactions]
+
+
+def streamed(user_id):
+    # consume iter_transactions without keeping the rows
+    count = 0
+    for _ in iter_transactions(user_id, chunk_size=5000):
+        count += 1
+    return count
+
+
+def measure(label, func, rows):
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+
+    print(f"{label:<34} {elapsed:>8.2f} s {elapsed / rows * 1e6:>8.2f} us/row "
+          f"{peak / 1e6:>9.1f} MB peak {peak / rows:>7.0f} B/row")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(db_url=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        register_user('bench', 'benchpass')
+        _, user = login_user('bench', 'benchpass')
+        category_ids = [cat.id for cat in get_categories(user.id)]
+
+        rng = random.Random(7)
+        start = datetime.datetime(2015, 1, 1)
+        rows = ({'amount': round(rng.uniform(1, 500), 2), 'description': f"transaction {i}",
+                 'category_id': rng.choice(category_ids),
+                 'date': start + datetime.timedelta(minutes=rng.randrange(0, 60 * 24 * 365 * 10))}
+                for i in range(args.rows))
+        with contextlib.redirect_stdout(io.StringIO()):
+            add_transactions(user.id, rows)
+        # indexing for search would otherwise run during the measurements
+        wait_for_index()
+
+        print(f"{args.rows:,} rows")
+        measure("ORM + per-call class (old)", lambda: legacy_get_transactions(user.id), args.rows)
+        measure("Core select + records", lambda: get_transactions(user.id), args.rows)
+        measure("iter_transactions (streamed)", lambda: streamed(user.id), args.rows)
+
+        database.dispose_engine()
+
+
+if __name__ == '__main__':
+    main()
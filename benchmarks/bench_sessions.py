@@ -0,0 +1,75 @@
+"""
+Calls per second of the budget API with the old per-call engine setup vs the pooled session factory.
+
+    python -m benchmarks.bench_sessions [--calls N]
+"""
+import argparse
+import os
+import tempfile
+import time
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.auth import register_user, login_user
+from app.budget import get_categories, get_goals
+
+
+def legacy_session_scope():
+    # what get_session() did before: makedirs + new engine + create_all on every call
+    from contextlib import contextmanager
+
+    @contextmanager
+    def scope():
+        db_url = database.ENGINE_OPTIONS['db_url']
+        os.makedirs(os.path.dirname(db_url[len('sqlite:///'):]), exist_ok=True)
+        engine = create_engine(db_url)
+        database.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+            engine.dispose()
+
+    return scope
+
+
+def run(label, func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {calls / elapsed:>10.1f} calls/s")
+    return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(db_url=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        register_user('bench', 'benchpass')
+        _, user = login_user('bench', 'benchpass')
+
+        workloads = [
+            ('get_categories', lambda: get_categories(user.id)),
+            ('get_goals', lambda: get_goals(user.id)),
+        ]
+
+        for name, func in workloads:
+            with mock.patch('app.budget.session_scope', legacy_session_scope()):
+                before = run(f"{name} (engine per call)", func, args.calls)
+            after = run(f"{name} (pooled session_scope)", func, args.calls)
+            print(f"{'speedup':<40} {after / before:>10.1f}x")
+
+        database.dispose_engine()
+
+
+if __name__ == '__main__':
+    main()
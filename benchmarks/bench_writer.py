@@ -0,0 +1,106 @@
+"""
+add_transaction from several threads at once: a pooled connection per writing thread
+(how writes were done before) vs the single writer queue that groups queued writes.
+With --importer another process bulk loads transactions meanwhile, like the importer CLI.
+
+    python -m benchmarks.bench_writer [--threads N] [--writes N] [--importer] [--pragma-profile NAME]
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from app import database
+from app.auth import register_user, login_user
+from app.budget import _add_transaction, add_transaction, add_transactions, get_categories
+from app.writer import get_writer
+from benchmarks.bench_bulk_insert import make_rows
+
+
+def legacy_add_transaction(user_id, amount, description, category_id, date=None):
+    # the same write in a session of the calling thread, as add_transaction used to do
+    try:
+        with database.session_scope() as session:
+            return _add_transaction(session, user_id, amount, description, category_id, date)
+    except Exception as e:
+        return False, f"An error occurred: {str(e)}", None
+
+
+def import_loop(db_url, profile, user_id, category_ids, stop):
+    # Other process: 5000-row bulk loads back to back until stopped
+    database.configure(db_url=db_url, pragma_profile=profile)
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not stop.is_set():
+            add_transactions(user_id, make_rows(5000, category_ids), batch_size=5000)
+    database.dispose_engine()
+
+
+def run(label, write, user_id, category_id, threads, writes):
+    failures = []
+
+    def worker():
+        for i in range(writes):
+            success, message, _ = write(user_id, i + 1, "bench", category_id)
+            if not success:
+                failures.append(message)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * writes
+    print(f"{label:<24} {(total - len(failures)) / elapsed:>10.1f} writes/s  {len(failures):>5} failed")
+    if failures:
+        print(f"{'':<24} e.g. {failures[0].splitlines()[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help="writes per thread")
+    parser.add_argument('--importer', action='store_true', help="bulk load from another process meanwhile")
+    parser.add_argument('--pragma-profile', default='safe', help="PRAGMA profile, 'none' for SQLite's defaults")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profile = None if args.pragma_profile == 'none' else args.pragma_profile
+        database.configure(db_url=f"sqlite:///{os.path.join(tmp, 'bench.db')}", pool_size=args.threads,
+                           pragma_profile=profile)
+        register_user('bench', 'benchpass')
+        _, user = login_user('bench', 'benchpass')
+        category_ids = [cat.id for cat in get_categories(user.id)]
+
+        importer = None
+        if args.importer:
+            stop = multiprocessing.Event()
+            importer = multiprocessing.Process(target=import_loop, args=(
+                database.ENGINE_OPTIONS['db_url'], profile, user.id, category_ids, stop))
+            importer.start()
+            time.sleep(1)
+
+        print(f"{args.threads} threads x {args.writes} add_transaction calls, {args.pragma_profile} PRAGMAs"
+              f"{', bulk import running in another process' if importer else ''}")
+        run("connection per thread", legacy_add_transaction, user.id, category_ids[0], args.threads, args.writes)
+
+        writer = get_writer()
+        jobs, transactions = writer.jobs, writer.transactions
+        run("single writer queue", add_transaction, user.id, category_ids[0], args.threads, args.writes)
+        print(f"{'':<24} {writer.jobs - jobs} writes in {writer.transactions - transactions} transactions")
+
+        if importer:
+            stop.set()
+            importer.join()
+        database.dispose_engine()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Seeded synthetic data: users with the default categories, transactions and goals.
+
+The same seed and sizes always give the same database contents, so benchmark runs on
+different commits measure the same data. Transactions are streamed into
+add_transactions, so 10M rows need no more memory than 1k.
+
+    python -m benchmarks.datagen --db data/bench.db --users 100 --rows 1000000 [--seed 42]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import time
+
+from app import database
+from app.auth import register_user, login_user
+from app.budget import add_goal, add_transactions, get_categories, update_goal
+from app.search import wait_for_index
+
+PASSWORD = "benchpass"
+
+# name: (relative frequency, amount range, descriptions); names match the default categories
+CATEGORY_PROFILES = {
+    "Salary": (3, (1800, 6500), ["Monthly salary", "Payroll", "Bonus"]),
+    "Investments": (1, (20, 900), ["Dividends", "Interest", "Fund sale"]),
+    "Gifts": (1, (20, 400), ["Birthday gift", "Holiday gift"]),
+    "Other Income": (1, (10, 600), ["Refund", "Side job", "Sold item"]),
+    "Housing": (3, (600, 2200), ["Rent", "Mortgage", "Home repair"]),
+    "Food": (30, (3, 150), ["Groceries", "Restaurant", "Coffee", "Lunch", "Bakery", "Takeaway"]),
+    "Transportation": (12, (2, 90), ["Fuel", "Bus ticket", "Taxi", "Parking", "Train"]),
+    "Utilities": (4, (30, 260), ["Electricity", "Water", "Internet", "Phone", "Gas"]),
+    "Healthcare": (2, (10, 450), ["Pharmacy", "Doctor", "Dentist"]),
+    "Entertainment": (9, (5, 160), ["Cinema", "Streaming", "Concert", "Games", "Books"]),
+    "Education": (1, (15, 900), ["Course", "Textbooks", "Tuition"]),
+    "Shopping": (12, (5, 400), ["Clothes", "Electronics", "Household", "Online order"]),
+    "Savings": (2, (50, 1000), ["Savings transfer"]),
+    "Debt Payments": (2, (50, 800), ["Loan payment", "Credit card"]),
+    "Miscellaneous": (4, (1, 200), ["Cash withdrawal", "Fees", "Other"]),
+}
+
+GOAL_NAMES = ["Emergency fund", "Vacation", "New car", "Laptop", "House deposit", "Wedding", "Retirement"]
+
+
+def username(index):
+    return f"bench{index:05d}"
+
+
+def user_rows(rng, category_ids, count, start, days):
+    # count transactions for one user, dated at random within [start, start + days)
+    names = list(category_ids)
+    weights = [CATEGORY_PROFILES[name][0] for name in names]
+    seconds = days * 24 * 3600
+
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        _, (low, high), descriptions = CATEGORY_PROFILES[name]
+        # most purchases are small: skew amounts towards the low end of the range
+        amount = low + (high - low) * rng.random() ** 2
+        yield {
+            'amount': round(amount, 2),
+            'description': rng.choice(descriptions),
+            'category_id': category_ids[name],
+            'date': start + datetime.timedelta(seconds=rng.randrange(seconds)),
+        }
+
+
+def generate(users, rows, seed=42, goals_per_user=3, start_year=2021, years=3, progress=None):
+    """
+    Create users bench00000.. (password "benchpass") sharing rows transactions between
+    them, with goals_per_user goals each, dated over years calendar years from
+    start_year. Writes to the currently configured database. Returns a description of
+    the dataset (what generate was called with plus row counts and timing).
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(start_year, 1, 1)
+    days = (datetime.datetime(start_year + years, 1, 1) - start).days
+
+    started = time.perf_counter()
+    inserted = 0
+    for index in range(users):
+        name = username(index)
+        register_user(name, PASSWORD)
+        _, user = login_user(name, PASSWORD)
+        category_ids = {category.name: category.id for category in get_categories(user.id)
+                        if category.name in CATEGORY_PROFILES}
+
+        # rows split evenly, the first users take the remainder
+        count = rows // users + (1 if index < rows % users else 0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            inserted += add_transactions(user.id, user_rows(rng, category_ids, count, start, days))[0]
+
+        for goal_name in rng.sample(GOAL_NAMES, min(goals_per_user, len(GOAL_NAMES))):
+            target = round(rng.uniform(500, 20000), -1)
+            _, _, change = add_goal(user.id, goal_name, target,
+                                    start + datetime.timedelta(days=days + rng.randrange(30, 720)))
+            update_goal(change.record.id, user.id, current_amount=round(target * rng.random(), 2))
+
+        if progress:
+            progress(index + 1, users, inserted)
+
+    # the loads are indexed for search in the background, benchmarks expect it done
+    wait_for_index()
+    return {
+        'users': users, 'rows': inserted, 'seed': seed, 'goals_per_user': goals_per_user,
+        'start_year': start_year, 'years': years, 'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def dataset_path(db_path):
+    # Description of the data in a generated database, kept next to it
+    return db_path + '.dataset.json'
+
+
+def open_dataset(db_path, users, rows, seed=42, progress=None):
+    """
+    Point the app at db_path and make sure it holds the dataset for (users, rows, seed),
+    generating it if the file is missing or was made with other settings. Returns the
+    dataset description.
+    """
+    wanted = {'users': users, 'rows': rows, 'seed': seed}
+    if os.path.exists(db_path) and os.path.exists(dataset_path(db_path)):
+        with open(dataset_path(db_path)) as f:
+            dataset = json.load(f)
+        if all(dataset.get(key) == value for key, value in wanted.items()):
+            database.configure(db_url=f"sqlite:///{db_path}")
+            return dataset
+
+    for path in (db_path, db_path + '-wal', db_path + '-shm', dataset_path(db_path)):
+        if os.path.exists(path):
+            os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    database.configure(db_url=f"sqlite:///{db_path}")
+    dataset = generate(users, rows, seed, progress=progress)
+    with open(dataset_path(db_path), 'w') as f:
+        json.dump(dataset, f, indent=2)
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', required=True, help="SQLite file, reused if it already holds this dataset")
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=100000, help="transactions in total")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    def show_progress(done, total, rows):
+        print(f"\r{done}/{total} users, {rows:,} transactions", end="", flush=True)
+
+    dataset = open_dataset(args.db, args.users, args.rows, args.seed, progress=show_progress)
+    print(f"\n{json.dumps(dataset)}")
+    database.dispose_engine()
+
+
+if __name__ == '__main__':
+    main()
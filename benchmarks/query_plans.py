@@ -0,0 +1,95 @@
+"""
+Run every query in app/budget.py through EXPLAIN QUERY PLAN and fail on full table scans.
+
+    python -m benchmarks.query_plans
+
+Exits with status 1 if any statement scans a table instead of searching an index.
+"""
+import datetime
+import os
+import sys
+import tempfile
+
+from sqlalchemy import event
+
+from app import database
+from app import budget
+from app.auth import register_user, login_user
+
+
+def capture_statements(engine, calls):
+    # Record every SELECT the given calls send to the database
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for call in calls:
+            call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return captured
+
+
+def full_scans(engine, statement, parameters):
+    # Plan steps that walk a whole table (or a whole index) rather than seek into it
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+
+    details = [row[-1] for row in plan]
+    # an FTS5 MATCH shows up as a SCAN of the virtual table, but it is an index lookup
+    return details, [d for d in details if d.startswith('SCAN ') and 'CONSTANT ROW' not in d
+                     and 'VIRTUAL TABLE INDEX 0:M' not in d]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure(db_url=f"sqlite:///{os.path.join(tmp, 'plans.db')}")
+        engine = database.get_engine()
+
+        register_user('plans', 'planspass')
+        _, user = login_user('plans', 'planspass')
+        category = budget.get_categories(user.id, is_income=False)[0]
+        budget.add_transaction(user.id, 10, 'sample', category.id, datetime.datetime(2024, 5, 1))
+        budget.add_goal(user.id, 'sample', 100)
+
+        now = datetime.datetime.now()
+        calls = [
+            lambda: budget.get_categories(user.id),
+            lambda: budget.get_categories(user.id, is_income=True),
+            lambda: budget.get_transactions(user.id),
+            lambda: budget.get_transactions(user.id, now - datetime.timedelta(days=30), now),
+            lambda: budget.get_transactions(user.id, category_id=category.id),
+            lambda: budget.get_transactions_page(user.id, limit=20),
+            lambda: budget.get_transactions_page(user.id, limit=20, after=(now, 10**9)),
+            lambda: budget.get_transactions_page(user.id, limit=20, offset=40, sort='amount', descending=False),
+            lambda: budget.count_transactions(user.id, now - datetime.timedelta(days=30), now),
+            lambda: list(budget.iter_transactions(user.id, chunk_size=100)),
+            lambda: budget.get_monthly_summary(user.id, 2024, 5),
+            lambda: budget.get_monthly_totals(user.id, 2023, 1, 2024, 12),
+            lambda: budget.get_goals(user.id),
+            lambda: budget.search_transactions(user.id, 'sam'),
+            lambda: budget.search_transactions(user.id, 'sample', {'start_date': now - datetime.timedelta(days=30)}),
+        ]
+
+        failures = 0
+        for statement, parameters in capture_statements(engine, calls):
+            details, scans = full_scans(engine, statement, parameters)
+            status = 'FAIL' if scans else 'ok'
+            failures += bool(scans)
+            print(f"[{status}] {' '.join(statement.split())[:100]}")
+            for detail in details:
+                print(f"        {detail}")
+
+        database.dispose_engine()
+
+    print(f"\n{failures} statement(s) with full scans")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
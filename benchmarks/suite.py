@@ -0,0 +1,240 @@
+"""
+Timed scenarios for the main API calls on a seeded dataset, with results saved as JSON.
+
+The dataset comes from benchmarks.datagen, so the same --users/--rows/--seed give the
+same data on every commit; pass --db to keep it between runs instead of regenerating it.
+Each scenario runs --repeat times on (user, month) picks drawn from the seed, with the
+report cache cleared first so every run does the full work.
+
+    python -m benchmarks.suite [--users 10] [--rows 100000] [--seed 42] [--repeat 20]
+                               [--db data/bench.db] [--only NAME ...]
+                               [--output results.json] [--compare previous.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import sqlalchemy
+from sqlalchemy import select
+
+from app import database
+from app.auth import login_user
+from app.budget import get_monthly_summary, get_transactions, search_transactions
+from app.cache import report_cache
+from app.database import MonthlyRollup, User
+from app.reports import BudgetReport
+from benchmarks.datagen import PASSWORD, open_dataset
+
+
+def _periods():
+    # {user_id: (username, [(year, month), ...])} for every month with transactions
+    query = (select(User.id, User.username, MonthlyRollup.year, MonthlyRollup.month)
+             .join(MonthlyRollup, MonthlyRollup.user_id == User.id)
+             .where(MonthlyRollup.count > 0)
+             .distinct()
+             .order_by(User.id, MonthlyRollup.year, MonthlyRollup.month))
+    periods = {}
+    with database.get_engine().connect() as conn:
+        for user_id, username, year, month in conn.execute(query):
+            periods.setdefault(user_id, (username, []))[1].append((year, month))
+    return periods
+
+
+def _month_range(year, month):
+    start = datetime.datetime(year, month, 1)
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(microseconds=1)
+    return start, end
+
+
+# Each scenario gets (user_id, username, year, month) and the temporary directory
+def _login(user_id, username, year, month, tmp):
+    success, _ = login_user(username, PASSWORD)
+    assert success, f"login failed for {username}"
+
+
+def _get_transactions(user_id, username, year, month, tmp):
+    get_transactions(user_id, *_month_range(year, month))
+
+
+def _get_monthly_summary(user_id, username, year, month, tmp):
+    get_monthly_summary(user_id, year, month)
+
+
+def _monthly_report(user_id, username, year, month, tmp):
+    report_cache.clear()
+    BudgetReport(user_id).generate_monthly_report(year, month)
+
+
+def _yearly_report(user_id, username, year, month, tmp):
+    report_cache.clear()
+    BudgetReport(user_id).generate_yearly_report(year)
+
+
+def _charts(user_id, username, year, month, tmp):
+    report = BudgetReport(user_id)
+    report_data = report.generate_monthly_report(year, month)
+    report_cache.clear()
+    started = time.perf_counter()
+    report.generate_charts(report_data)
+    # only the chart counts
+    return time.perf_counter() - started
+
+
+def _export_pdf(user_id, username, year, month, tmp):
+    report = BudgetReport(user_id)
+    report_data = report.generate_monthly_report(year, month)
+    path = os.path.join(tmp, 'report.pdf')
+    started = time.perf_counter()
+    assert report.export_to_pdf(report_data, path), "export failed"
+    return time.perf_counter() - started
+
+
+# words people type into the search box, partly typed
+SEARCH_TERMS = ["groc", "coffee", "rent", "tax", "online order", "sal", "elec"]
+
+
+def _search(user_id, username, year, month, tmp):
+    search_transactions(user_id, SEARCH_TERMS[month % len(SEARCH_TERMS)])
+
+
+SCENARIOS = {
+    'login': _login,
+    'get_transactions': _get_transactions,
+    'get_monthly_summary': _get_monthly_summary,
+    'search_transactions': _search,
+    'generate_monthly_report': _monthly_report,
+    'generate_yearly_report': _yearly_report,
+    'generate_charts': _charts,
+    'export_to_pdf': _export_pdf,
+}
+
+
+def run_scenario(name, periods, repeat, seed, tmp):
+    """
+    Time one scenario repeat times (after an untimed warm-up run). Returns its
+    statistics in ms. Scenarios that need setup return their own timing.
+    """
+    scenario = SCENARIOS[name]
+    # picks depend on the seed and the scenario only, not on which scenarios ran before
+    rng = random.Random(f"{seed}:{name}")
+    user_ids = sorted(periods)
+    picks = []
+    for _ in range(repeat + 1):
+        user_id = rng.choice(user_ids)
+        username, months = periods[user_id]
+        picks.append((user_id, username) + rng.choice(months))
+
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index, pick in enumerate(picks):
+            started = time.perf_counter()
+            measured = scenario(*pick, tmp)
+            elapsed = time.perf_counter() - started if measured is None else measured
+            if index:
+                timings.append(elapsed * 1000)
+
+    ordered = sorted(timings)
+    return {
+        'runs': len(timings),
+        'min': round(ordered[0], 3),
+        'median': round(statistics.median(ordered), 3),
+        'mean': round(statistics.fmean(ordered), 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+
+    return {
+        'commit': commit or None,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pragma_profile': database.ENGINE_OPTIONS['pragma_profile'],
+    }
+
+
+def compare(results, previous):
+    # median of each scenario against an earlier results file, negative is faster
+    print(f"\nAgainst {(previous['environment'].get('commit') or 'unknown')[:12]} "
+          f"({previous['environment'].get('timestamp')})")
+    if previous.get('dataset', {}).get('rows') != results['dataset']['rows']:
+        print("Warning: the datasets differ, the numbers aren't comparable")
+
+    print(f"{'scenario':<26} {'before':>10} {'after':>10} {'change':>8}")
+    for name, stats in results['scenarios'].items():
+        before = previous['scenarios'].get(name)
+        if not before:
+            print(f"{name:<26} {'-':>10} {stats['median']:>10.2f} {'new':>8}")
+            continue
+        change = (stats['median'] - before['median']) / before['median'] * 100 if before['median'] else 0.0
+        print(f"{name:<26} {before['median']:>10.2f} {stats['median']:>10.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=100000, help="transactions in total")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per scenario")
+    parser.add_argument('--db', help="keep the dataset in this SQLite file (default: a temporary one)")
+    parser.add_argument('--only', action='append', choices=list(SCENARIOS), metavar='SCENARIO',
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', metavar='JSON', help="show the change against an earlier results file")
+    args = parser.parse_args()
+
+    def show_progress(done, total, rows):
+        sys.stderr.write(f"\rGenerating: {done}/{total} users, {rows:,} transactions")
+        sys.stderr.flush()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'bench.db')
+        dataset = open_dataset(db_path, args.users, args.rows, args.seed, progress=show_progress)
+        sys.stderr.write("\n")
+        periods = _periods()
+
+        results = {'environment': environment(), 'dataset': dataset, 'repeat': args.repeat, 'scenarios': {}}
+        print(f"{dataset['users']} users, {dataset['rows']:,} transactions, seed {dataset['seed']}, "
+              f"{args.repeat} runs each (ms)")
+        print(f"{'scenario':<26} {'min':>9} {'median':>9} {'mean':>9} {'p95':>9} {'max':>9}")
+        for name in args.only or SCENARIOS:
+            stats = run_scenario(name, periods, args.repeat, args.seed, tmp)
+            results['scenarios'][name] = stats
+            print(f"{name:<26} {stats['min']:>9.2f} {stats['median']:>9.2f} {stats['mean']:>9.2f} "
+                  f"{stats['p95']:>9.2f} {stats['max']:>9.2f}")
+
+        database.dispose_engine()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,74 @@
+import time
+
+_started = time.perf_counter()
+
 import os
 import sys
 import tkinter as tk
 from tkinter import messagebox
 
+
+class StartupProfile:
+    """
+    Time spent between launch and the first paint, printed with --profile-startup.
+    For a per-module import breakdown run: python -X importtime main.py
+    """
+
+    # Optional heavy modules that shouldn't be loaded before the main window
+    HEAVY_MODULES = ['matplotlib', 'numpy', 'PIL', 'fpdf']
+
+    def __init__(self, enabled, started):
+        self.enabled = enabled
+        self.last = started
+        self.started = started
+        self.steps = []
+
+    def restart(self):
+        self.started = self.last = time.perf_counter()
+        self.steps = []
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.steps.append((label, now - self.last))
+        self.last = now
+
+    def report(self, title):
+        if not self.enabled:
+            return
+        print(f"\n{title}")
+        for label, seconds in self.steps:
+            print(f"  {label:<32} {seconds * 1000:8.1f} ms")
+        print(f"  {'total':<32} {(self.last - self.started) * 1000:8.1f} ms")
+        loaded = [name for name in self.HEAVY_MODULES if name in sys.modules]
+        print(f"  modules loaded: {len(sys.modules)}, heavy: {', '.join(loaded) or 'none'}")
+        self.restart()
+
+
+profile = StartupProfile('--profile-startup' in sys.argv, _started)
+profile.mark("python + tkinter imports")
+
 # Add the current directory to path to ensure imports work
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
+# Only what the login screen needs; the main window (matplotlib, PIL, fpdf) is imported after login
 from app.database import init_db
 from app.ui.login_frame import LoginFrame
-from app.ui.main_frame import MainFrame
+
+if '--profile-queries' in sys.argv:
+    # SQL statement counts and timings per API function, printed at exit
+    from app.instrumentation import enable
+    enable()
+
+profile.mark("app imports (database, login)")
 
 
 class BudgetPlannerApp(tk.Tk):
 
     def __init__(self):
         super().__init__()
+        profile.mark("Tk root window")
 
         self.title("Budget Planner")
         self.geometry("900x600")
@@ -24,6 +76,7 @@ class BudgetPlannerApp(tk.Tk):
 
         # Initialize database
         init_db()
+        profile.mark("database init")
 
         # grid
         self.grid_columnconfigure(0, weight=1)
@@ -37,6 +90,7 @@ class BudgetPlannerApp(tk.Tk):
 
         # Show login frame
         self.show_login_frame()
+        profile.mark("login frame")
 
     def show_login_frame(self):
         if 'login' in self.frames:
@@ -46,14 +100,22 @@ class BudgetPlannerApp(tk.Tk):
         self.frames['login'].grid(row=0, column=0, sticky="nsew")
 
     def show_main_frame(self):
+        from app.ui.main_frame import MainFrame
+        profile.mark("main window imports")
+
         if 'main' in self.frames:
             self.frames['main'].destroy()
 
         self.frames['main'] = MainFrame(self, self.current_user, self.logout_callback)
         self.frames['main'].grid(row=0, column=0, sticky="nsew")
 
+        self.update_idletasks()
+        profile.mark("main window first paint")
+        profile.report("Main window profile")
+
     def login_callback(self, user):
         # Callback function for successful login
+        profile.restart()
         self.current_user = user
         self.show_main_frame()
 
@@ -70,4 +132,11 @@ class BudgetPlannerApp(tk.Tk):
 if __name__ == "__main__":
     app = BudgetPlannerApp()
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
-    app.mainloop()
\ No newline at end of file
+
+    def first_paint():
+        app.update_idletasks()
+        profile.mark("first paint")
+        profile.report("Startup profile (launch to login screen)")
+
+    app.after(0, first_paint)
+    app.mainloop()